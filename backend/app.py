@@ -1,15 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from functools import wraps
+from functools import lru_cache, wraps
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
-from sqlalchemy import inspect, text
+from sqlalchemy import inspect, or_, text, update
+import atexit
 import json
 import os
+import re
 import io
+import itertools
 import sys
+import threading
+import time
 from dotenv import load_dotenv, find_dotenv
+import click
 
 # Ensure sibling modules (level2_logic, knowledge_base) are importable on Vercel
 sys.path.insert(0, os.path.dirname(__file__))
@@ -49,10 +55,47 @@ except ImportError:
         def get_context():
             return ""
 
-# NOTE: further lazy imports are still used in handlers for extra safety
-
-
-db = SQLAlchemy()
+try:
+    from job_queue import JobQueue, PermanentJobError, default_jobs_db_path
+    from gemini_client import GeminiUnavailable, get_gateway
+    from chat_events import notifier as chat_notifier
+    import chat_summary
+    import chat_codec
+    import metrics
+    from archive import archive_stats, archived_records_for_user, find_archived_record, decode_rows, rebuild_record
+    from quantiles import KLLSketch, percentile_from_table, percentile_table
+    import trends
+    import export as data_export
+    import telemetry
+    import scoring
+    import http_cache
+    from group_commit import GroupCommitter
+    import replica
+    import sharding
+    import report_renderer
+except ImportError:
+    from backend.job_queue import JobQueue, PermanentJobError, default_jobs_db_path
+    from backend.gemini_client import GeminiUnavailable, get_gateway
+    from backend.chat_events import notifier as chat_notifier
+    from backend import chat_summary, chat_codec, metrics
+    from backend.archive import archive_stats, archived_records_for_user, find_archived_record, decode_rows, rebuild_record
+    from backend.quantiles import KLLSketch, percentile_from_table, percentile_table
+    from backend import trends
+    from backend import export as data_export
+    from backend import telemetry
+    from backend import scoring
+    from backend import http_cache
+    from backend.group_commit import GroupCommitter
+    from backend import replica
+    from backend import sharding
+    from backend import report_renderer
+
+# The modules above only need the standard library and SQLAlchemy.  numpy, pyarrow,
+# reportlab and google.genai load on first use (_model_serving, _directory,
+# export._pyarrow, report_renderer.templates, gemini_client); test_startup.py checks it.
+
+
+db = SQLAlchemy(session_options={"class_": sharding.ShardedSession})
 
 def create_app():
     app = Flask(__name__)
@@ -68,36 +111,220 @@ def create_app():
         else:
             db_path = os.path.join(os.path.dirname(__file__), "assessments.db")
         app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    # Optional read replica for the read-only endpoints (see replica.py)
+    if os.getenv("REPLICA_DATABASE_URL"):
+        app.config["SQLALCHEMY_BINDS"] = {"replica": os.getenv("REPLICA_DATABASE_URL")}
+    # Optional sharded storage of the per-user tables (SHARD_COUNT; see sharding.py)
+    shard_paths = sharding.configure(app)
 
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "cogniwise-secret-key")
     app.config["ADMIN_EMAIL"] = os.getenv("ADMIN_EMAIL", "admin@cogniwise.ai")
     app.config["ADMIN_PASSWORD"] = os.getenv("ADMIN_PASSWORD", "Admin@123")
     app.config["ADMIN_TOKEN_EXPIRES_IN"] = int(os.getenv("ADMIN_TOKEN_EXPIRES_IN", "28800"))  # 8 hours
+    app.config["JOBS_DB_PATH"] = default_jobs_db_path()
+    app.config["JOB_WORKERS"] = int(os.getenv("JOB_WORKERS", "4"))
+    app.config["JOBS_RETENTION_SECONDS"] = float(os.getenv("JOBS_RETENTION_SECONDS", "86400"))
+    # Level-2 telemetry is buffered and flushed by a background thread; serverless
+    # instances can be frozen between requests, so they write each batch inline.
+    default_flush = "sync" if (os.getenv("VERCEL") or os.getenv("VERCEL_ENV")) else "background"
+    app.config["TELEMETRY_FLUSH"] = os.getenv("TELEMETRY_FLUSH", default_flush)
+    app.config["TELEMETRY_FLUSH_INTERVAL"] = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "1.0"))
+    app.config["TELEMETRY_MAX_BUFFERED"] = int(os.getenv("TELEMETRY_MAX_BUFFERED", "2000000"))  # events
+    app.config["TELEMETRY_MAX_BODY"] = int(os.getenv("TELEMETRY_MAX_BODY", str(8 * 1024 * 1024)))  # bytes
+    # Opt-in: route submission/chat writes through one writer thread that commits them in batches
+    app.config["GROUP_COMMIT"] = os.getenv("GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+    app.config["GROUP_COMMIT_WAIT_MS"] = float(os.getenv("GROUP_COMMIT_WAIT_MS", "1"))
+    app.config["GROUP_COMMIT_MAX_BATCH"] = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "128"))
     
-    # Configure Gemini using new google.genai SDK
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    if GEMINI_API_KEY:
-        try:
-            from google import genai
-            print("Gemini API key found. Client will be initialized in routes.")
-        except Exception as e:
-            print(f"Error importing google.genai: {e}")
+    # PDF reports render in a pool of warm worker processes; 0 renders on the request thread
+    # (serverless default: no long-lived processes to keep warm)
+    default_report_workers = 0 if (os.getenv("VERCEL") or os.getenv("VERCEL_ENV")) else (os.cpu_count() or 1)
+    app.config["REPORT_WORKERS"] = int(os.getenv("REPORT_WORKERS", str(default_report_workers)))
+    app.config["REPORT_QUEUE_LIMIT"] = int(os.getenv("REPORT_QUEUE_LIMIT", "0")) or None  # default 4 per worker
+    app.config["REPORT_TIMEOUT"] = float(os.getenv("REPORT_TIMEOUT", "30"))
+
+    # Level-1 scoring: "heuristic" (calculate_risk) or "model" (model_serving.py on the shipped scalers)
+    app.config["LEVEL1_SCORER"] = os.getenv("LEVEL1_SCORER", "heuristic")
+    
+    # Schema setup: "eager" runs at import (local default), "lazy" on the first
+    # request (Vercel default, keeps it out of cold start), "skip" when the
+    # schema was prepared at build/deploy time with `flask --app backend.app init-db`.
+    default_db_init = "lazy" if (os.getenv("VERCEL") or os.getenv("VERCEL_ENV")) else "eager"
+    app.config["DB_INIT"] = os.getenv("DB_INIT", default_db_init)
+
+    # Only check for the key here; google.genai is imported by the gateway on
+    # the first chat turn (importing it costs well over half a second).
+    if os.getenv("GEMINI_API_KEY"):
+        print("Gemini API key found. Client will be initialized in routes.")
     else:
         print("WARNING: GEMINI_API_KEY not found in environment variables. Chat features will fail.")
 
 
     # Allow all origins for all routes with support for credentials
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+    http_cache.init_app(app)
     db.init_app(app)
-
-    with app.app_context():
-        db.create_all()
-        ensure_schema()
+    replica.init_app(app)
+    sharding.init_app(app, db, shard_paths)
+
+    if app.config["DB_INIT"] == "eager":
+        init_db(app)
+    elif app.config["DB_INIT"] == "lazy":
+        @app.before_request
+        def lazy_init_db():
+            init_db(app)
+
+    replica_sync = app.extensions.get("replica_sync")
+    if replica_sync is not None:
+        replica_sync.start()
+        atexit.register(replica_sync.stop)
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create tables and apply schema migrations."""
+        init_db(app)
+        print("Database schema is up to date.")
+
+    @app.cli.command("replica-sync")
+    @click.option("--interval", type=float, default=0.0, help="Keep refreshing every N seconds (0: once).")
+    def replica_sync_command(interval):
+        """Refresh the SQLite read replica (REPLICA_DATABASE_URL) from the primary."""
+        primary = replica.sqlite_path(app.config["SQLALCHEMY_DATABASE_URI"])
+        target = replica.sqlite_path(app.config.get("SQLALCHEMY_BINDS", {}).get("replica"))
+        if not primary or not target:
+            raise click.ClickException("replica-sync needs SQLite files for both DATABASE_URL and REPLICA_DATABASE_URL")
+        while True:
+            started = time.perf_counter()
+            replica.sqlite_backup(primary, target)
+            print(f"Replica refreshed in {time.perf_counter() - started:.2f}s")
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    @app.cli.command("shard-rebalance")
+    @click.option("--batch-users", default=500, show_default=True, help="users moved per transaction")
+    @click.option("--dry-run", is_flag=True, help="count the rows that would move without writing")
+    def shard_rebalance_command(batch_users, dry_run):
+        """Move per-user rows to the shard they belong to under the current SHARD_COUNT."""
+        if "shards" not in app.extensions:
+            raise click.ClickException("set SHARD_COUNT to the shard count to rebalance to")
+        primary = replica.sqlite_path(app.config["SQLALCHEMY_DATABASE_URI"])
+        if not primary:
+            raise click.ClickException("sharded storage needs a SQLite DATABASE_URL")
+        init_db(app)
+        stats = sharding.rebalance(primary, app.config["SHARD_DIR"], app.extensions["shards"].count,
+                                   batch_users=batch_users, dry_run=dry_run)
+        print(json.dumps(stats, indent=2))
+
+    @app.cli.command("rebuild-norms")
+    def rebuild_norms_command():
+        """Recompute the population percentile sketches from all stored results."""
+        init_db(app)
+        with app.app_context():
+            rebuilt = rebuild_population_norms()
+        print(f"Rebuilt {len(rebuilt)} population sketches from {sum(rebuilt.values())} scores.")
+
+    @app.cli.command("rebuild-trends")
+    def rebuild_trends_command():
+        """Recompute every user's trend aggregates from their full result history."""
+        init_db(app)
+        with app.app_context():
+            user_ids = set()
+            for _ in sharding.each_shard():
+                for model in (AssessmentResult, Level2Result):
+                    user_ids.update(u for (u,) in db.session.query(model.user_id).distinct() if u)
+            archived = db.session.query(ArchivedRecord.user_id).filter(
+                ArchivedRecord.table_name.in_(["assessment_results", "level2_results"])).distinct()
+            user_ids.update(u for (u,) in archived if u)
+            series = 0
+            for user_id in sorted(user_ids):
+                with sharding.for_user(user_id):
+                    series += rebuild_user_trends(user_id)
+        print(f"Rebuilt {series} trend series for {len(user_ids)} users.")
+
+    @app.cli.command("backfill-level2-metrics")
+    def backfill_level2_metrics_command():
+        """Fill level2_metrics from the raw_metrics JSON of existing Level-2 results."""
+        init_db(app)
+        with app.app_context():
+            written = backfill_level2_metrics()
+        print(f"Wrote {written} Level-2 metric rows.")
+
+    @app.cli.command("rescore")
+    @click.option("--dry-run", is_flag=True, help="count what would change without writing")
+    def rescore_command(dry_run):
+        """Re-score stored results that were scored by an older scoring spec version."""
+        init_db(app)
+        with app.app_context():
+            stats = rescore_results(dry_run=dry_run)
+        print(json.dumps(stats, indent=2))
+
+    @app.cli.command("chat-compress")
+    @click.option("--batch-size", default=500, show_default=True, help="messages per transaction")
+    @click.option("--dry-run", is_flag=True, help="measure the savings without writing")
+    def chat_compress_command(batch_size, dry_run):
+        """Compress stored chat messages over CHAT_COMPRESS_MIN_CHARS (safe to rerun)."""
+        init_db(app)
+        with app.app_context():
+            stats = compress_chat_messages(batch_size=batch_size, dry_run=dry_run)
+        print(json.dumps(stats, indent=2))
+
+    @app.cli.command("chat-train-dict")
+    @click.option("--out", required=True, type=click.Path(dir_okay=False), help="dictionary file to write")
+    @click.option("--samples", default=5000, show_default=True, help="most recent messages to train on")
+    @click.option("--size", default=64 * 1024, show_default=True, help="dictionary size in bytes")
+    def chat_train_dict_command(out, samples, size):
+        """Train a zstd dictionary on stored chat messages (use with CHAT_CODEC=zstd CHAT_ZSTD_DICT=...)."""
+        init_db(app)
+        bodies = []
+        with app.app_context():
+            for _ in sharding.each_shard():
+                bodies += [c for (c,) in db.session.query(ChatMessage.content).order_by(ChatMessage.id.desc()).limit(samples)]
+        with open(out, "wb") as f:
+            f.write(chat_codec.train_dictionary(bodies, size))
+        print(f"Wrote a {size}-byte dictionary trained on {len(bodies)} messages to {out}.")
+
+    if os.getenv("SCORING_AUTO_RESCORE", "1") != "0":
+        @scoring.on_reload
+        def queue_rescore(old_version, spec):
+            # idempotent, so one job per worker that notices the change is harmless
+            get_job_queue(app).enqueue("rescore", {"from_version": old_version, "to_version": spec.version})
+
+    @app.cli.command("extract-level2-features")
+    @click.option("--batch-size", default=500, show_default=True, help="sessions per vectorized pass")
+    @click.option("--out", type=click.File("w"), default="-", help="JSON lines output (default: stdout)")
+    def extract_level2_features_command(batch_size, out):
+        """Recompute Level-2 metrics from the stored telemetry of every submitted session."""
+        init_db(app)
+        done = 0
+        with app.app_context():
+            query = (
+                db.session.query(TelemetrySession.session_id, TelemetrySession.user_id, TelemetrySession.age_group)
+                .filter(TelemetrySession.age_group.isnot(None))
+                .order_by(TelemetrySession.session_id)
+            )
+            batch = []
+            for row in query.yield_per(batch_size):
+                batch.append(row)
+                if len(batch) == batch_size:
+                    done += write_session_metrics(batch, out)
+                    batch = []
+            if batch:
+                done += write_session_metrics(batch, out)
+        print(f"Extracted Level-2 metrics for {done} telemetry sessions.", file=sys.stderr)
+
+    if app.config["LEVEL1_SCORER"] == "model":
+        # Loaded before any worker fork so the arrays are shared copy-on-write
+        try:
+            _model_serving().preload()
+        except Exception as e:
+            print(f"WARNING: Level-1 models not loaded, falling back to the heuristic: {e}")
 
     serializer = URLSafeTimedSerializer(app.config["SECRET_KEY"])
     register_routes(app, serializer)
 
+    @lru_cache(maxsize=None)
     def _get_git_revision():
         # Helper returns the current commit hash if the .git directory is available.
         try:
@@ -140,6 +367,7 @@ def create_app():
 
 class AssessmentResult(db.Model):
     __tablename__ = "assessment_results"
+    __table_args__ = (db.Index("ix_assessment_results_user_id", "user_id"),)
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(255), nullable=True)
@@ -157,6 +385,7 @@ class AssessmentResult(db.Model):
     gender = db.Column(db.String(20), nullable=True)
     address = db.Column(db.Text, nullable=True)
     admin_notes = db.Column(db.Text, nullable=True)
+    scoring_spec_version = db.Column(db.String(32), nullable=True)  # scoring_spec.json version that scored it
     assessed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     def to_dict(self):
@@ -177,6 +406,7 @@ class AssessmentResult(db.Model):
             "risk_label": self.risk_label,
             "requires_level2": self.requires_level2,
             "admin_notes": self.admin_notes,
+            "scoring_spec_version": self.scoring_spec_version,
             "assessed_at": self.assessed_at.isoformat(),
         }
 
@@ -207,6 +437,7 @@ class UserLevelProgress(db.Model):
 
 class Level2Result(db.Model):
     __tablename__ = "level2_results"
+    __table_args__ = (db.Index("ix_level2_results_user_id", "user_id"),)
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(255), nullable=False)
@@ -215,6 +446,7 @@ class Level2Result(db.Model):
     domain_scores = db.Column(db.Text, nullable=False) # JSON
     final_risk_score = db.Column(db.Float, nullable=False)
     final_risk_percent = db.Column(db.Float, nullable=False)
+    scoring_spec_version = db.Column(db.String(32), nullable=True)
     assessed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     def to_dict(self):
@@ -226,16 +458,90 @@ class Level2Result(db.Model):
             "domain_scores": json.loads(self.domain_scores),
             "final_risk_score": self.final_risk_score,
             "final_risk_percent": self.final_risk_percent,
+            "scoring_spec_version": self.scoring_spec_version,
             "assessed_at": self.assessed_at.isoformat(),
         }
 
+class Level2Metric(db.Model):
+    """One numeric Level-2 game metric per row, so cohort aggregates run as indexed SQL."""
+    __tablename__ = "level2_metrics"
+    __table_args__ = (
+        db.Index("ix_level2_metrics_cohort", "age_group", "metric", "assessed_at"),
+        db.Index("ix_level2_metrics_result_id", "result_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, nullable=False)  # level2_results.id
+    user_id = db.Column(db.String(255), nullable=False)
+    age_group = db.Column(db.String(50), nullable=False)
+    metric = db.Column(db.String(64), nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    assessed_at = db.Column(db.DateTime, nullable=False)
+
+
+class PopulationSketch(db.Model):
+    """KLL sketch of one score distribution per (age_group, domain); see quantiles.py."""
+    __tablename__ = "population_sketches"
+
+    age_group = db.Column(db.String(50), primary_key=True)
+    domain = db.Column(db.String(64), primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    sketch = db.Column(db.LargeBinary, nullable=False)
+    percentiles = db.Column(db.Text, nullable=False)  # JSON: 101 breakpoints (0th..100th percentile)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class UserTrend(db.Model):
+    """Incremental trend state for one user and score series (see trends.py)."""
+    __tablename__ = "user_trends"
+
+    user_id = db.Column(db.String(255), primary_key=True)
+    series = db.Column(db.String(80), primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    last_at = db.Column(db.DateTime, nullable=True)
+    state = db.Column(db.Text, nullable=False)  # JSON
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TelemetrySession(db.Model):
+    """Running totals for one Level-2 telemetry session; the events live in TelemetryChunk."""
+    __tablename__ = "telemetry_sessions"
+
+    session_id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.String(255), nullable=False, index=True)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)
+    stored_bytes = db.Column(db.Integer, nullable=False, default=0)
+    t_min = db.Column(db.Integer, nullable=True)  # ms since session start
+    t_max = db.Column(db.Integer, nullable=True)
+    age_group = db.Column(db.String(50), nullable=True)  # set when the session is submitted for scoring
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TelemetryChunk(db.Model):
+    """A compressed columnar block of telemetry events (see telemetry.py); append-only."""
+    __tablename__ = "telemetry_chunks"
+    __table_args__ = (db.Index("ix_telemetry_chunks_session_id", "session_id", "id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.String(255), nullable=False)
+    event_count = db.Column(db.Integer, nullable=False)
+    t_min = db.Column(db.Integer, nullable=False)
+    t_max = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
 class ChatMessage(db.Model):
     __tablename__ = "chat_messages"
+    __table_args__ = (db.Index("ix_chat_messages_user_id_id", "user_id", "id"),)
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False) # 'user' or 'assistant'
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(chat_codec.CompressedText, nullable=False)  # large bodies stored compressed
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     def to_dict(self):
@@ -246,6 +552,677 @@ class ChatMessage(db.Model):
             "created_at": self.created_at.isoformat()
         }
 
+class ChatSummary(db.Model):
+    __tablename__ = "chat_summaries"
+
+    user_id = db.Column(db.String(255), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default="")
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)  # last ChatMessage.id folded in
+    summarized_messages = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "summary": self.summary,
+            "summary_chars": len(self.summary or ""),
+            "summarized_through_id": self.summarized_through_id,
+            "summarized_messages": self.summarized_messages,
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+
+class ArchiveBatch(db.Model):
+    """Compressed batch of archived rows from one hot table for one user (see archive.py)."""
+    __tablename__ = "archive_batches"
+    __table_args__ = (db.Index("ix_archive_batches_table_user", "table_name", "user_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.String(255), nullable=True)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    oldest_at = db.Column(db.DateTime, nullable=False)
+    newest_at = db.Column(db.DateTime, nullable=False)
+    codec = db.Column(db.String(16), nullable=False, default="zlib")
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ArchivedRecord(db.Model):
+    """Maps an archived row id to the batch holding it, so single records stay addressable."""
+    __tablename__ = "archived_records"
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    record_id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.String(255), nullable=True)
+
+
+REPORT_MODELS = {"level1": AssessmentResult, "level2": Level2Result, "level3": Level2Result}
+
+
+def merge_archived(model, user_id: str, hot_records: list, time_attr: str = "assessed_at") -> list:
+    """Append the user's archived rows to ``hot_records`` (newest first)."""
+    archived = archived_records_for_user(db.session, ArchiveBatch, model, user_id)
+    if not archived:
+        return hot_records
+    hot_ids = {r.id for r in hot_records}  # an interrupted archive run can leave a row in both
+    archived = [r for r in archived if r.id not in hot_ids]
+    return sorted(hot_records + archived, key=lambda r: (getattr(r, time_attr), r.id), reverse=True)
+
+
+def across_shards(fn) -> list:
+    """
+    ``fn(session)`` once per shard, in parallel (see sharding.py), or once
+    on ``db.session`` when storage is not sharded; returns the results as a list.
+    """
+    shards = current_app.extensions.get("shards")
+    return shards.map(fn) if shards is not None else [fn(db.session)]
+
+
+def find_record(model, record_id):
+    """A hot row by id, on whichever shard holds it."""
+    if current_app.extensions.get("shards") is None:
+        return db.session.get(model, record_id)
+    return next((r for r in across_shards(lambda session: session.get(model, record_id)) if r is not None), None)
+
+
+def get_record(model, record_id):
+    """Look a row up in the hot table, falling back to the archive."""
+    record = find_record(model, record_id)
+    if record is None:
+        record = find_archived_record(db.session, ArchiveBatch, ArchivedRecord, model, record_id)
+    return record
+
+
+OVERVIEW_SECTIONS = ("level1", "level2", "progress", "level3", "chat")
+OVERVIEW_TABLES = {"level1": AssessmentResult, "level2": Level2Result}
+
+
+def parse_overview_args(include: str, fields: str) -> tuple:
+    """
+    ``(sections, projection)`` from the overview's query arguments:
+    ``include=level1,chat`` picks sections (default all) and
+    ``fields=level1.risk_score,level2.domain_scores`` limits the columns
+    returned per result table.  Raises ValueError on unknown names.
+    """
+    sections = [s for s in (include or "").split(",") if s] or list(OVERVIEW_SECTIONS)
+    unknown = sorted(set(sections) - set(OVERVIEW_SECTIONS))
+    if unknown:
+        raise ValueError(f"Unknown section: {', '.join(unknown)}")
+    projection = {}
+    for item in (f for f in (fields or "").split(",") if f):
+        section, _, column = item.partition(".")
+        model = OVERVIEW_TABLES.get(section)
+        if model is None or column not in model.__table__.columns:
+            raise ValueError(f"Unknown field: {item}")
+        projection.setdefault(section, []).append(column)
+    return sections, projection
+
+
+def _column_values(model, values: dict) -> dict:
+    """Column values as ``to_dict`` renders them (JSON columns parsed, datetimes in ISO format)."""
+    json_columns = data_export.JSON_COLUMNS.get(model.__tablename__, ())
+    out = {}
+    for name, value in values.items():
+        if name in json_columns and value is not None:
+            value = json.loads(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        out[name] = value
+    return out
+
+
+def user_overview(user_id: str, sections=OVERVIEW_SECTIONS, projection: dict = None) -> dict:
+    """
+    Everything the admin user view shows, in one pass: Level-1 and Level-2
+    results (hot and archived, newest first), progress, Level-3 status and
+    chat stats.  One query per table plus one over the user's archive
+    batches, whatever the number of results; ``projection`` limits the
+    result columns read and returned (see ``parse_overview_args``).
+    """
+    projection = projection or {}
+    tables = {section: OVERVIEW_TABLES[section] for section in sections if section in OVERVIEW_TABLES}
+    archived_tables = [model.__tablename__ for model in tables.values()]
+    if "chat" in sections:
+        archived_tables.append(ChatMessage.__tablename__)
+    batches = {}
+    if archived_tables:
+        rows = (
+            db.session.query(
+                ArchiveBatch.table_name, ArchiveBatch.row_count, ArchiveBatch.newest_at, ArchiveBatch.codec,
+                # chat batches are only counted, so their payloads are not even read
+                db.case((ArchiveBatch.table_name != ChatMessage.__tablename__, ArchiveBatch.payload)),
+            )
+            .filter(ArchiveBatch.user_id == user_id, ArchiveBatch.table_name.in_(archived_tables))
+            .order_by(ArchiveBatch.first_id)
+            .all()
+        )
+        for row in rows:
+            batches.setdefault(row[0], []).append(row)
+
+    overview = {"user_id": user_id}
+    for section, model in tables.items():
+        wanted = projection.get(section)
+        order = (model.assessed_at.desc(), model.id.desc())
+        if wanted:
+            columns = list(dict.fromkeys(["id", "assessed_at"] + wanted))  # the sort keys are always read
+            query = db.session.query(*(getattr(model, c) for c in columns)).filter(model.user_id == user_id)
+            records = [_column_values(model, row._asdict()) for row in query.order_by(*order)]
+        else:
+            records = [r.to_dict() for r in model.query.filter_by(user_id=user_id).order_by(*order)]
+        archived = [
+            rebuild_record(model, values).to_dict()
+            for _, _, _, codec, payload in batches.get(model.__tablename__, ())
+            for values in decode_rows(payload, codec)
+        ]
+        if archived:
+            records = sorted(records + archived, key=lambda r: (r["assessed_at"], r["id"]), reverse=True)
+        if wanted:
+            records = [{c: r[c] for c in wanted} for r in records]
+        overview[section] = records
+
+    if "progress" in sections or "level3" in sections:
+        progress = db.session.get(UserLevelProgress, user_id)
+        progress = progress.to_dict() if progress else default_progress_dict(user_id)
+        if "progress" in sections:
+            overview["progress"] = progress
+        if "level3" in sections:
+            overview["level3"] = {"unlocked": progress["level3_unlocked"],
+                                  "conditions": progress["level3_conditions"]}
+
+    if "chat" in sections:
+        count, last_at = (
+            db.session.query(db.func.count(ChatMessage.id), db.func.max(ChatMessage.created_at))
+            .filter(ChatMessage.user_id == user_id)
+            .one()
+        )
+        for _, row_count, newest_at, _, _ in batches.get(ChatMessage.__tablename__, ()):
+            count += row_count
+            last_at = max(last_at, newest_at) if last_at else newest_at
+        overview["chat"] = {"count": count, "last_message_at": last_at.isoformat() if last_at else None}
+    return overview
+
+
+def level2_metric_rows(result: "Level2Result", metrics: dict = None) -> list:
+    """Typed ``Level2Metric`` rows for the numeric entries of a result's raw metrics."""
+    if metrics is None:
+        metrics = json.loads(result.raw_metrics or "{}")
+    rows = []
+    for name, value in metrics.items():
+        # Flags such as is_real_data are not measurements.
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        rows.append(Level2Metric(
+            result_id=result.id,
+            user_id=result.user_id,
+            age_group=result.age_group,
+            metric=name,
+            value=float(value),
+            assessed_at=result.assessed_at,
+        ))
+    return rows
+
+
+def backfill_level2_metrics(batch_size: int = 500) -> int:
+    """Populate ``level2_metrics`` for results stored before the table existed; returns rows written."""
+    written = 0
+    for _ in sharding.each_shard():
+        last_id = 0
+        while True:
+            # results and metric rows can live in different databases (sharding.py), so no join
+            results = Level2Result.query.filter(Level2Result.id > last_id).order_by(Level2Result.id).limit(batch_size).all()
+            if not results:
+                break
+            done = {rid for (rid,) in db.session.query(Level2Metric.result_id).filter(
+                Level2Metric.result_id.in_([r.id for r in results])).distinct()}
+            for result in results:
+                if result.id in done:
+                    continue
+                try:
+                    rows = level2_metric_rows(result)
+                except ValueError:
+                    print(f"Skipping Level-2 result {result.id}: raw_metrics is not valid JSON")
+                    continue
+                db.session.add_all(rows)
+                written += len(rows)
+            last_id = results[-1].id
+            db.session.commit()
+    return written
+
+
+LEVEL2_METRIC_BUCKETS = {
+    # bucket -> (SQLite strftime format, PostgreSQL to_char format)
+    "day": ("%Y-%m-%d", "YYYY-MM-DD"),
+    "month": ("%Y-%m", "YYYY-MM"),
+    "year": ("%Y", "YYYY"),
+}
+
+
+def level2_metric_aggregate(metric: str, age_group: str = None, bucket: str = "month",
+                            since: datetime = None, until: datetime = None) -> list:
+    """Count/mean/min/max of one metric per time bucket, computed in the database."""
+    sqlite_fmt, postgres_fmt = LEVEL2_METRIC_BUCKETS[bucket]
+    if db.engine.dialect.name == "sqlite":
+        period = db.func.strftime(sqlite_fmt, Level2Metric.assessed_at)
+    else:
+        period = db.func.to_char(Level2Metric.assessed_at, postgres_fmt)
+    period = period.label("period")
+
+    query = db.session.query(
+        period,
+        db.func.count(Level2Metric.id),
+        db.func.avg(Level2Metric.value),
+        db.func.min(Level2Metric.value),
+        db.func.max(Level2Metric.value),
+    ).filter(Level2Metric.metric == metric)
+    if age_group:
+        query = query.filter(Level2Metric.age_group == age_group)
+    if since:
+        query = query.filter(Level2Metric.assessed_at >= since)
+    if until:
+        query = query.filter(Level2Metric.assessed_at < until)
+
+    return [
+        {"period": p, "count": count, "mean": mean, "min": low, "max": high}
+        for p, count, mean, low, high in query.group_by(period).order_by(period).all()
+    ]
+
+
+NORMS_MIN_SAMPLES = int(os.getenv("NORMS_MIN_SAMPLES", "30"))
+_norms_lock = threading.Lock()
+_norm_table_cache = {}  # (age_group, domain) -> (n, breakpoints)
+
+
+def level1_norm_scores(result: "AssessmentResult") -> tuple:
+    """``(age_group, {domain: score})`` a Level-1 result contributes to the population norms."""
+    age_group = result.age_group or age_to_age_group(result.age)
+    if not age_group or not result.condition_type or result.risk_score is None:
+        return None, {}
+    return age_group, {f"level1_{result.condition_type}": result.risk_score}
+
+
+def level2_norm_scores(result: "Level2Result") -> tuple:
+    scores = dict(json.loads(result.domain_scores or "{}"))
+    scores["final_risk_score"] = result.final_risk_score
+    return result.age_group, {k: v for k, v in scores.items() if isinstance(v, (int, float))}
+
+
+def update_population_norms(age_group: str, scores: dict):
+    """
+    Fold one result's scores into the stored sketches.  Runs in its own
+    transaction after the result is committed, so a failure here never loses
+    a submission (``rebuild_population_norms`` can always catch up).
+    """
+    if not age_group or not scores:
+        return
+
+    def work(session):
+        with _norms_lock:
+            for domain, value in scores.items():
+                row = session.get(PopulationSketch, (age_group, domain))
+                sketch = KLLSketch.from_bytes(row.sketch) if row else KLLSketch()
+                sketch.update(value)
+                if row is None:
+                    row = PopulationSketch(age_group=age_group, domain=domain)
+                    session.add(row)
+                store_sketch(row, sketch)
+
+    try:
+        commit_unit(work)
+    except Exception as e:
+        print(f"Failed to update population norms for {age_group}: {e}")
+
+
+def store_sketch(row: "PopulationSketch", sketch: KLLSketch):
+    row.n = sketch.n
+    row.sketch = sketch.to_bytes()
+    row.percentiles = json.dumps(percentile_table(sketch))
+    row.updated_at = datetime.utcnow()
+
+
+def rebuild_population_norms() -> dict:
+    """Recompute every sketch from all hot and archived results; returns ``{"age_group/domain": n}``."""
+    sketches = {}
+
+    def add(age_group, scores):
+        for domain, value in scores.items():
+            sketches.setdefault((age_group, domain), KLLSketch()).update(value)
+
+    sources = ((AssessmentResult, level1_norm_scores), (Level2Result, level2_norm_scores))
+    for model, extract in sources:
+        for _ in sharding.each_shard():
+            for record in model.query.yield_per(1000):
+                add(*extract(record))
+        batches = ArchiveBatch.query.filter_by(table_name=model.__tablename__).yield_per(50)
+        for batch in batches:
+            for values in decode_rows(batch.payload, batch.codec):
+                add(*extract(rebuild_record(model, values)))
+
+    with _norms_lock:
+        PopulationSketch.query.delete()
+        for (age_group, domain), sketch in sketches.items():
+            if age_group is None:
+                continue
+            row = PopulationSketch(age_group=age_group, domain=domain)
+            store_sketch(row, sketch)
+            db.session.add(row)
+        db.session.commit()
+        _norm_table_cache.clear()
+    return {f"{a}/{d}": s.n for (a, d), s in sorted(sketches.items()) if a is not None}
+
+
+def norm_tables(age_groups) -> dict:
+    """
+    Breakpoint tables for every domain of ``age_groups``.  Only the small
+    JSON tables are read; parsed tables are cached until the row's count changes.
+    """
+    age_groups = {a for a in age_groups if a}
+    if not age_groups:
+        return {}
+    rows = (
+        db.session.query(PopulationSketch.age_group, PopulationSketch.domain, PopulationSketch.n)
+        .filter(PopulationSketch.age_group.in_(age_groups))
+        .all()
+    )
+    tables = {}
+    for age_group, domain, n in rows:
+        if n < NORMS_MIN_SAMPLES:
+            continue
+        key = (age_group, domain)
+        cached = _norm_table_cache.get(key)
+        if cached is None or cached[0] != n:
+            breakpoints = db.session.query(PopulationSketch.percentiles).filter_by(
+                age_group=age_group, domain=domain).scalar()
+            cached = _norm_table_cache[key] = (n, json.loads(breakpoints))
+        tables[key] = cached[1]
+    return tables
+
+
+def score_percentiles(age_group: str, scores: dict, tables: dict) -> dict:
+    """``{domain: percentile}``: share of the age group scoring at or below each score (None if too few samples)."""
+    return {
+        domain: percentile_from_table(tables[(age_group, domain)], value)
+        if (age_group, domain) in tables and value is not None else None
+        for domain, value in scores.items()
+    }
+
+
+_trends_lock = threading.Lock()
+
+
+def trend_series(result) -> tuple:
+    """``({series: value}, scale)`` one result contributes to its user's trends."""
+    if isinstance(result, AssessmentResult):
+        if not result.condition_type or result.risk_score is None:
+            return {}, 100.0
+        return {f"level1_{result.condition_type}": result.risk_score}, 100.0
+    _, scores = level2_norm_scores(result)
+    return {f"level2_{domain}": value for domain, value in scores.items()}, 1.0
+
+
+def update_user_trends(result):
+    """Fold a committed result into its user's trend rows, in a transaction of its own."""
+    scores, scale = trend_series(result)
+    if not result.user_id or not scores:
+        return
+    user_id, assessed_at = result.user_id, result.assessed_at
+
+    def work(session):
+        with _trends_lock:
+            for series, value in scores.items():
+                row = session.get(UserTrend, (user_id, series))
+                if row is None:
+                    row = UserTrend(user_id=user_id, series=series, state=json.dumps(trends.new_state()))
+                    session.add(row)
+                state = trends.update(json.loads(row.state), assessed_at, value, scale)
+                row.state = json.dumps(state)
+                row.n = state["n"]
+                row.last_at = assessed_at
+                row.updated_at = datetime.utcnow()
+
+    try:
+        commit_unit(work)
+    except Exception as e:
+        print(f"Failed to update trends for {user_id}: {e}")
+
+
+def rebuild_user_trends(user_id: str) -> int:
+    """Replay all of a user's hot and archived results in time order; returns the number of series."""
+    records = (
+        merge_archived(AssessmentResult, user_id, AssessmentResult.query.filter_by(user_id=user_id).all())
+        + merge_archived(Level2Result, user_id, Level2Result.query.filter_by(user_id=user_id).all())
+    )
+    states = {}
+    for record in sorted(records, key=lambda r: r.assessed_at):
+        scores, scale = trend_series(record)
+        for series, value in scores.items():
+            trends.update(states.setdefault(series, trends.new_state()), record.assessed_at, value, scale)
+
+    with _trends_lock:
+        UserTrend.query.filter_by(user_id=user_id).delete()
+        for series, state in states.items():
+            db.session.add(UserTrend(
+                user_id=user_id, series=series, n=state["n"], state=json.dumps(state),
+                last_at=datetime.fromisoformat(state["last_at"]), updated_at=datetime.utcnow(),
+            ))
+        db.session.commit()
+    return len(states)
+
+
+def user_has_results(user_id: str) -> bool:
+    return any(
+        db.session.query(q.exists()).scalar()
+        for q in (
+            AssessmentResult.query.filter_by(user_id=user_id),
+            Level2Result.query.filter_by(user_id=user_id),
+            ArchivedRecord.query.filter_by(user_id=user_id).filter(
+                ArchivedRecord.table_name.in_(["assessment_results", "level2_results"])),
+        )
+    )
+
+
+RESCORE_BATCH_ROWS = int(os.getenv("RESCORE_BATCH_ROWS", "2000"))
+
+
+def _rescore_level1(spec, row) -> dict:
+    prediction = spec.score_level1(row.condition_type, json.loads(row.ml_features or "{}"))
+    return {"risk_score": prediction["risk_score"], "risk_level": prediction["risk_level"],
+            "risk_label": prediction["risk_label"], "requires_level2": prediction["requires_level2"]}
+
+
+def _rescore_level2(spec, row) -> dict:
+    result = spec.score_level2(row.age_group, json.loads(row.raw_metrics or "{}"))
+    return {"domain_scores": json.dumps(result["domain_scores"]), "final_risk_score": result["final_risk_score"],
+            "final_risk_percent": result["final_risk_percent"]}
+
+
+RESCORE_TABLES = (
+    (AssessmentResult, ("condition_type", "ml_features"), _rescore_level1),
+    (Level2Result, ("age_group", "raw_metrics"), _rescore_level2),
+)
+
+
+def rescore_results(batch_size: int = RESCORE_BATCH_ROWS, dry_run: bool = False) -> dict:
+    """
+    Re-score every hot result not yet scored by the current spec version.
+
+    Reads only the input columns in keyset-paginated batches and writes each
+    batch with one executemany UPDATE by primary key, so it can be rerun or
+    interrupted at any point.  Percentile sketches and the trends of users
+    whose scores moved are rebuilt afterwards.  Archived rows keep the
+    version they were scored with; Level-2/3 unlocks are never revoked.
+    """
+    spec = scoring.current_spec()
+    stats = {"spec_version": spec.version, "dry_run": dry_run}
+    changed_users = set()
+    started = time.perf_counter()
+    for model, inputs, rescore in RESCORE_TABLES:
+        outputs = [c for c in ("risk_score", "risk_level", "risk_label", "requires_level2",
+                               "domain_scores", "final_risk_score", "final_risk_percent") if hasattr(model, c)]
+        columns = [model.id, model.user_id] + [getattr(model, c) for c in inputs + tuple(outputs)]
+        stale = or_(model.scoring_spec_version.is_(None), model.scoring_spec_version != spec.version)
+        scanned = changed = 0
+        for _ in sharding.each_shard():
+            last_id = 0
+            while True:
+                rows = (
+                    db.session.query(*columns)
+                    .filter(stale, model.id > last_id)
+                    .order_by(model.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                updates = []
+                for row in rows:
+                    values = rescore(spec, row)
+                    if any(getattr(row, c) != v for c, v in values.items()):
+                        changed += 1
+                        changed_users.add(row.user_id)
+                    updates.append(dict(values, id=row.id, scoring_spec_version=spec.version))
+                scanned += len(rows)
+                if dry_run:
+                    continue
+                db.session.execute(update(model), updates)
+                db.session.commit()
+        stats[model.__tablename__] = {"scanned": scanned, "changed": changed}
+
+    changed_users.discard(None)
+    stats["users_changed"] = len(changed_users)
+    stats["rescore_seconds"] = round(time.perf_counter() - started, 3)
+    if not dry_run and changed_users:
+        started = time.perf_counter()
+        rebuild_population_norms()
+        for user_id in changed_users:
+            with sharding.for_user(user_id):
+                rebuild_user_trends(user_id)
+        stats["rebuild_seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+_group_commit_lock = threading.Lock()
+
+
+def get_group_committer(app: Flask) -> GroupCommitter:
+    """Create the app's group-commit writer thread on first use."""
+    committer = app.extensions.get("group_committer")
+    if committer is None:
+        with _group_commit_lock:
+            committer = app.extensions.get("group_committer")
+            if committer is None:
+                # db's session class, so shard routing applies (the writer runs in an app context)
+                committer = GroupCommitter(
+                    lambda: db.session.session_factory(expire_on_commit=False),
+                    context=app.app_context,
+                    max_batch=app.config["GROUP_COMMIT_MAX_BATCH"],
+                    max_wait=app.config["GROUP_COMMIT_WAIT_MS"] / 1000.0,
+                ).start()
+                atexit.register(committer.stop)
+                app.extensions["group_committer"] = committer
+    return committer
+
+
+def commit_unit(work):
+    """
+    Run ``work(session)`` and commit it; returns its result once the rows are
+    durable.  With GROUP_COMMIT the unit is batched with concurrent ones by
+    the writer thread (see group_commit.py), otherwise it commits on the
+    request's own session.
+    """
+    app = current_app._get_current_object()
+    if app.config["GROUP_COMMIT"]:
+        return get_group_committer(app).run(sharding.carry_scope(work))
+    try:
+        result = work(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def persist_level1(session, fields: dict, requires_level2: bool) -> "AssessmentResult":
+    """Insert a Level-1 result and fold it into the user's level progress."""
+    result = AssessmentResult(**fields)
+    session.add(result)
+    user_id = fields.get("user_id")
+    if user_id:
+        progress = session.get(UserLevelProgress, user_id) or UserLevelProgress(user_id=user_id)
+        progress.level1_completed = True
+        level2_conditions = json.loads(progress.level2_conditions or "[]")
+        if requires_level2 and fields["condition_type"] not in level2_conditions:
+            level2_conditions.append(fields["condition_type"])
+        progress.level2_unlocked = progress.level2_unlocked or requires_level2
+        progress.level2_conditions = json.dumps(level2_conditions)
+        progress.updated_at = datetime.utcnow()
+        session.add(progress)
+    return result
+
+
+def persist_level2(session, fields: dict, metrics: dict, unlock_level3: bool,
+                   telemetry_session_id: str = None) -> "Level2Result":
+    """Insert a Level-2 result with its typed metric rows and update the user's level progress."""
+    result = Level2Result(**fields)
+    session.add(result)
+    session.flush()  # assigns result.id for the typed metric rows
+    session.add_all(level2_metric_rows(result, metrics))
+
+    progress = session.get(UserLevelProgress, result.user_id) or UserLevelProgress(user_id=result.user_id)
+    progress.level2_completed = True
+    progress.level3_unlocked = progress.level3_unlocked or unlock_level3
+    if unlock_level3:
+        l3_conds = json.loads(progress.level3_conditions or "[]")
+        if "high_risk_level2" not in l3_conds:
+            l3_conds.append("high_risk_level2")
+        progress.level3_conditions = json.dumps(l3_conds)
+    progress.updated_at = datetime.utcnow()
+    session.add(progress)
+
+    if telemetry_session_id:
+        telemetry_session = session.get(TelemetrySession, telemetry_session_id)
+        if telemetry_session is not None:
+            telemetry_session.age_group = result.age_group
+    return result
+
+
+def save_chat_message(user_id: str, role: str, content: str) -> "ChatMessage":
+    """Persist one chat message and wake any long-polling history readers."""
+    def work(session):
+        msg = ChatMessage(user_id=user_id, role=role, content=content)
+        session.add(msg)
+        return msg
+
+    msg = commit_unit(work)
+    chat_notifier.notify(user_id)
+    return msg
+
+
+_db_init_lock = threading.Lock()
+
+
+def init_db(app: Flask):
+    """Create tables and run ``ensure_schema`` once per process (safe to call on every request)."""
+    if app.extensions.get("cogniwise_db_ready"):
+        return
+    with _db_init_lock:
+        if app.extensions.get("cogniwise_db_ready"):
+            return
+        with app.app_context():
+            db.create_all()
+            ensure_schema()
+            shards = app.extensions.get("shards")
+            if shards is not None:
+                shards.create_all()
+                for shard in range(shards.count):
+                    ensure_search_index(shards.engine(shard))
+        app.extensions["cogniwise_db_ready"] = True
+
+
 def ensure_column(table_name: str, column_name: str, column_sql: str):
     inspector = inspect(db.engine)
     existing_columns = [col["name"] for col in inspector.get_columns(table_name)]
@@ -264,6 +1241,8 @@ def ensure_schema():
     ensure_column("assessment_results", "address", "TEXT")
 
     ensure_column("assessment_results", "address", "TEXT")
+    ensure_column("assessment_results", "scoring_spec_version", "TEXT")
+    ensure_column("level2_results", "scoring_spec_version", "TEXT")
 
     # Ensure profiles columns (Critical for frontend consistency)
     try:
@@ -279,6 +1258,161 @@ def ensure_schema():
     ensure_column("user_level_progress", "level3_unlocked", "BOOLEAN")
     ensure_column("user_level_progress", "level3_conditions", "TEXT")
 
+    ensure_column("telemetry_sessions", "age_group", "TEXT")
+
+    # Per-user reads: cursor-based chat history walks (user_id, id); results filter by user_id
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_chat_messages_user_id_id ON chat_messages (user_id, id)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_assessment_results_user_id ON assessment_results (user_id)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_level2_results_user_id ON level2_results (user_id)"
+        ))
+
+    ensure_search_index()
+
+
+USER_SEARCH_COLUMNS = ("user_name", "user_email", "address", "admin_notes")
+USER_SEARCH_WEIGHTS = (10.0, 8.0, 2.0, 1.0)  # bm25 column weights, same order
+SEARCH_SCAN_ROWS = int(os.getenv("SEARCH_SCAN_ROWS", "2000"))  # matching rows considered per page
+SEARCH_RANK_ROWS = int(os.getenv("SEARCH_RANK_ROWS", "5000"))  # above this many matches, skip bm25
+
+
+def ensure_search_index(engine=None):
+    """
+    SQLite FTS5 index over the searchable assessment columns.  It is an
+    external-content table (no second copy of the text) kept in sync by
+    triggers, so every insert, update, delete or archival is reflected.
+    Each shard has its own (``engine``).
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != "sqlite":
+        return
+    columns = ", ".join(USER_SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in USER_SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in USER_SEARCH_COLUMNS)
+    try:
+        with engine.begin() as connection:
+            exists = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'assessment_results_fts'"
+            )).first()
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS assessment_results_fts USING fts5("
+                f"{columns}, content='assessment_results', content_rowid='id', prefix='2 3')"
+            ))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS assessment_results_fts_ai AFTER INSERT ON assessment_results BEGIN "
+                f"INSERT INTO assessment_results_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            ))
+            connection.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS assessment_results_fts_ad AFTER DELETE ON assessment_results BEGIN "
+                f"INSERT INTO assessment_results_fts(assessment_results_fts, rowid, {columns}) "
+                f"VALUES ('delete', old.id, {old_values}); END"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS assessment_results_fts_au AFTER UPDATE OF {columns} "
+                "ON assessment_results BEGIN "
+                f"INSERT INTO assessment_results_fts(assessment_results_fts, rowid, {columns}) "
+                f"VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO assessment_results_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            ))
+            # Weighted bm25 as the table's rank function, so MATCH ... ORDER BY rank uses it.
+            weights = ", ".join(str(w) for w in USER_SEARCH_WEIGHTS)
+            connection.execute(text(
+                f"INSERT INTO assessment_results_fts(assessment_results_fts, rank) VALUES ('rank', 'bm25({weights})')"
+            ))
+            if not exists:
+                # Index the rows that were stored before the index existed.
+                connection.execute(text(
+                    "INSERT INTO assessment_results_fts(assessment_results_fts) VALUES ('rebuild')"
+                ))
+    except Exception as e:
+        # SQLite builds without FTS5 fall back to LIKE matching in search_users.
+        print(f"Warning: full-text search index unavailable: {e}")
+
+
+# raw SQL on assessment_results goes to the table's shard (sharding.py)
+SEARCH_BIND = {"mapper": AssessmentResult}
+
+
+def search_index_available(session=None) -> bool:
+    session = session or db.session
+    if session.get_bind(**SEARCH_BIND).dialect.name != "sqlite":
+        return False
+    return session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'assessment_results_fts'"
+    ), bind_arguments=SEARCH_BIND).first() is not None
+
+
+def search_users(query: str, limit: int = 20, offset: int = 0) -> tuple:
+    """
+    Users whose name, email, address or admin notes match every term of
+    ``query`` as a prefix, best bm25 match first (newest first for very broad
+    queries).  Returns ``(hits, has_more)`` where each hit is
+    ``(user_id, rank)``; lower rank is better, None when unranked.
+
+    With sharded storage every shard is searched for its first
+    ``offset + limit + 1`` users and the lists are merged by rank (a user
+    lives on one shard, so there are no duplicates).
+    """
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return [], False
+    if current_app.extensions.get("shards") is None:
+        rows = _search_users(db.session, terms, limit + 1, offset)
+    else:
+        per_shard = across_shards(lambda session: _search_users(session, terms, offset + limit + 1, 0))
+        # ranked hits first (best first), then unranked ones round-robin, which keeps each shard's order
+        ranked = sorted((hit for hits in per_shard for hit in hits if hit[1] is not None), key=lambda h: (h[1], h[0]))
+        unranked = [hit for group in itertools.zip_longest(*per_shard) for hit in group
+                    if hit is not None and hit[1] is None]
+        rows = (ranked + unranked)[offset:offset + limit + 1]
+    return [(user_id, rank) for user_id, rank in rows[:limit]], len(rows) > limit
+
+
+def _search_users(session, terms: list, limit: int, offset: int) -> list:
+    """Up to ``limit`` ``(user_id, rank)`` rows from one database (see ``search_users``)."""
+    if search_index_available(session):
+        match = " ".join(f'"{t}"*' for t in terms)
+        scan = max(SEARCH_SCAN_ROWS, (offset + limit) * 10)
+        params = {"match": match, "scan": scan, "limit": limit, "offset": offset}
+        matched = session.execute(text(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM assessment_results_fts"
+            " WHERE assessment_results_fts MATCH :match LIMIT :cap)"
+        ), {"match": match, "cap": SEARCH_RANK_ROWS + 1}, bind_arguments=SEARCH_BIND).scalar()
+        if matched <= SEARCH_RANK_ROWS:
+            # Score matching rows inside FTS5 (best first), then collapse them
+            # to one hit per user.
+            inner = "SELECT rowid, rank AS score FROM assessment_results_fts" \
+                    " WHERE assessment_results_fts MATCH :match ORDER BY rank LIMIT :scan"
+            order = "best"
+        else:
+            # Terms this common barely discriminate and scoring every match is
+            # the slow part, so broad queries list the newest matches instead.
+            inner = "SELECT rowid, NULL AS score FROM assessment_results_fts" \
+                    " WHERE assessment_results_fts MATCH :match ORDER BY rowid DESC LIMIT :scan"
+            order = "MAX(m.rowid) DESC"
+        rows = session.execute(text(
+            f"SELECT r.user_id, MIN(m.score) AS best FROM ({inner}) m "
+            "JOIN assessment_results r ON r.id = m.rowid WHERE r.user_id IS NOT NULL "
+            f"GROUP BY r.user_id ORDER BY {order}, r.user_id LIMIT :limit OFFSET :offset"
+        ), params, bind_arguments=SEARCH_BIND).all()
+        return [tuple(row) for row in rows]
+    columns = [getattr(AssessmentResult, c) for c in USER_SEARCH_COLUMNS]
+    q = session.query(AssessmentResult.user_id, db.func.max(AssessmentResult.assessed_at))
+    for term in terms:
+        q = q.filter(db.or_(*(c.ilike(f"%{term}%") for c in columns)))
+    rows = (
+        q.filter(AssessmentResult.user_id.isnot(None))
+        .group_by(AssessmentResult.user_id)
+        .order_by(db.func.max(AssessmentResult.assessed_at).desc())
+        .limit(limit).offset(offset).all()
+    )
+    return [(user_id, None) for user_id, _ in rows]
+
 
 def age_to_age_group(age):
     """Derive age_group from age (child, teen, adult, elderly). Returns None if age is None."""
@@ -305,7 +1439,7 @@ def default_progress_dict(user_id: str) -> dict:
         "level3_unlocked": False,
         "level2_conditions": [],
         "level3_conditions": [],
-        "updated_at": datetime.utcnow().isoformat(),
+        "updated_at": None,  # nothing stored yet; also keeps the payload (and its ETag) stable
     }
 
 
@@ -313,165 +1447,511 @@ def calculate_risk(condition: str, features: dict) -> dict:
     """
     Simple, deterministic risk calculator that mirrors the original
     Supabase Edge Function behaviour but works for any condition.
+    The rule per condition and the risk bands come from the scoring spec.
     """
-    numeric_values = [
-        float(v)
-        for k, v in features.items()
-        if k != "age" and (isinstance(v, (int, float)) or (isinstance(v, str) and str(v).replace(".", "", 1).isdigit()))
-    ]
+    return scoring.current_spec().score_level1(condition, features)
 
-    if not numeric_values:
-        risk_score = 0.0
-    else:
-        avg = sum(numeric_values) / len(numeric_values)
-        
-        if condition in ["adhd", "asd", "dementia"]:
-            # For ADHD, ASD, Dementia we ensure that:
-            # High Score (5) = High Risk
-            # Low Score (1) = Low Risk
-            # So we map 1..5 directly to 0..100%
-            # Avg 1 -> 20%, Avg 5 -> 100%
-            raw_score = (avg / 5.0) * 100.0
-            risk_score = min(100.0, max(0.0, raw_score))
-        elif max(numeric_values) <= 10:
-            # Legacy logic for other conditions (assuming High Score = Good/Low Risk)
-            risk_score = max(0.0, min(100.0, 100.0 - avg * 10.0))
-        else:
-            # For time‑based or mixed scales, normalise roughly into 0‑100
-            normalised = min(avg / max(numeric_values), 1.0)
-            risk_score = round(normalised * 100.0, 1)
-
-    if risk_score >= 75:
-        risk_level = "high"
-        risk_label = "High Risk"
-    elif risk_score >= 55:
-        risk_level = "moderate"
-        risk_label = "Moderate Risk"
-    elif risk_score >= 35:
-        risk_level = "mild"
-        risk_label = "Mild Risk"
+
+def _model_serving():
+    # numpy and the model files are only loaded when model scoring is enabled
+    try:
+        import model_serving
+    except ImportError:
+        from backend import model_serving
+    return model_serving
+
+
+def _directory():
+    # numpy and the dataset are only loaded on the first referral lookup
+    try:
+        import directory
+    except ImportError:
+        from backend import directory
+    return directory
+
+
+DIRECTORY_DEFAULT_LIMIT = 10
+DIRECTORY_MAX_LIMIT = 100
+DIRECTORY_MAX_RADIUS_KM = 500.0
+
+# Served when no directory dataset is deployed (DIRECTORY_PATH)
+SAMPLE_DOCTORS = [
+    {"name": "Dr. Sarah Smith", "specialty": "Neurologist", "contact": "+1-555-0123", "rating": 4.8},
+    {"name": "Dr. James Johnson", "specialty": "Psychiatrist (ADHD/ASD)", "contact": "+1-555-0124", "rating": 4.9},
+    {"name": "Dr. Emily Chen", "specialty": "Geriatric Specialist", "contact": "+1-555-0125", "rating": 4.7}
+]
+SAMPLE_HOSPITALS = [
+    {"name": "City General Hospital", "distance": "2.5 km", "emergency_contact": "911", "address": "123 Main St"},
+    {"name": "Neuro Care Institute", "distance": "5.0 km", "emergency_contact": "+1-800-NEURO", "address": "456 Medical Dr"}
+]
+
+
+def score_level1(condition: str, features: dict) -> dict:
+    """Level-1 prediction from the configured scorer; the heuristic is the fallback."""
+    if current_app.config["LEVEL1_SCORER"] == "model":
+        try:
+            return _model_serving().get_engine().predict(condition, features)
+        except Exception as e:
+            print(f"Model scoring unavailable, using heuristic: {e}")
+    return calculate_risk(condition, features)
+
+
+_report_pool_lock = threading.Lock()
+
+
+def get_report_pool(app: Flask):
+    """The app's warm PDF rendering pool, started on first use (None with REPORT_WORKERS=0)."""
+    if app.config["REPORT_WORKERS"] <= 0:
+        return None
+    pool = app.extensions.get("report_pool")
+    if pool is None:
+        with _report_pool_lock:
+            pool = app.extensions.get("report_pool")
+            if pool is None:
+                pool = report_renderer.RenderPool(app.config["REPORT_WORKERS"],
+                                                  max_pending=app.config["REPORT_QUEUE_LIMIT"],
+                                                  timeout=app.config["REPORT_TIMEOUT"]).start()
+                atexit.register(pool.stop)
+                app.extensions["report_pool"] = pool
+    return pool
+
+
+def render_report(app: Flask, data: dict, title: str) -> bytes:
+    """PDF bytes for a report, rendered by the pool; raises ReportPoolBusy/ReportTimeout."""
+    pool = get_report_pool(app)
+    if pool is None:
+        return report_renderer.render(data, title)
+    return pool.render(data, title)
+
+
+def report_data(result_type: str, record) -> tuple:
+    """Return ``(data, title)`` for rendering ``record`` as a ``result_type`` report."""
+    data = record.to_dict()
+    if result_type == "level1":
+        title = f"Assessment Report - {data.get('condition_type', '').upper()}"
+    elif result_type == "level2":
+        title = f"Level 2 Assessment Report - {data.get('age_group', '').title()}"
     else:
-        risk_level = "low"
-        risk_label = "Low Risk"
+        # Level 3 uses Level 2 data but formats it as Emergency Report
+        data['EMERGENCY_NOTICE'] = "High Risk Detected - Immediate Intervention Advised"
+        title = "EMERGENCY INTERVENTION REPORT - IMMEDIATE ACTION REQUIRED"
+    return data, title
+
+
+def load_report(result_type: str, record_id) -> tuple:
+    """Return ``(data, title)`` for a downloadable report; raises LookupError/ValueError."""
+    model = REPORT_MODELS.get(result_type)
+    if model is None:
+        raise ValueError("Invalid report type")
+    record = get_record(model, record_id)
+    if not record:
+        raise LookupError("Assessment not found" if result_type == "level1" else "Level-2 result not found")
+    return report_data(result_type, record)
+
+
+def extract_pdf_text(stream, limit: int = 10000) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("Server configuration error: PDF parser not available")
+
+    pdf_reader = PdfReader(stream)
+    text_content = ""
+    for page in pdf_reader.pages:
+        text_content += page.extract_text() + "\n"
+
+    # Truncate if too long (simple protection)
+    return text_content[:limit]
 
-    requires_level2 = risk_score >= 55
+
+def upload_message_content(filename: str, text_content: str) -> str:
+    return (
+        f"I am uploading a document for analysis: {filename}.\n\nDocument Content:\n{text_content}\n\n"
+        "[End of Document]\nPlease analyze this document and answer my questions about it."
+    )
+
+
+class ChatServiceError(Exception):
+    """Gemini call failed; ``status`` is the HTTP code to return to the caller."""
+
+    def __init__(self, message: str, status: int = 500, retryable: bool = True, retry_after: float = None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def build_chat_prompt(message: str, history: list, summary: str = None) -> str:
+    # Provide general knowledge base context
+    kb_context = get_context()
+
+    # Construct Prompt
+    system_instruction = f"""You are CogniWise AI, a helpful medical assistant for cognitive assessments.
+            Use the following knowledge base context to answer the user's questions.
+
+            KNOWLEDGE BASE CONTEXT:
+            {kb_context}
+
+            IMPORTANT INSTRUCTIONS:
+            1. **STRICT DOMAIN RESTRICTION**: You are a specialized medical assistant. You MUST NOT answer questions about general knowledge, politics, sports, movies, or current events (e.g., "Who is the PM?", "What is the capital of France?").
+            2. If a user asks a non-medical question, politely refuse and state: "I am CogniWise AI, specialized in cognitive health. I cannot answer general knowledge or political questions. Please ask me about brain health, ADHD, dementia, or cognitive assessments."
+            3. If the user asks in Kannada (or any other language), you MUST reply in that same language.
+            4. If the user asks to translate or explain an uploaded medical document, do so accurately in the requested language.
+            5. Keep responses concise, empathetic, and professional.
+            """
+
+    # Construct a full conversation prompt; uploaded PDFs are stored as user
+    # messages, so they reach the model through the history.
+    full_prompt = system_instruction + "\n\n"
+    if summary:
+        full_prompt += f"SUMMARY OF EARLIER CONVERSATION:\n{summary}\n\n"
+    for h in history:
+        role_label = "User" if h["role"] == "user" else "Model"
+        full_prompt += f"{role_label}: {h['content']}\n"
+
+    full_prompt += f"User: {message}\nModel:"
+    return full_prompt
+
+
+def generate_chat_reply(message: str, history: list, summary: str = None) -> str:
+    """Run one chat turn against Gemini and return the reply text; raises ChatServiceError."""
+    if os.getenv("GEMINI_BACKEND") != "fake":
+        if not os.getenv("GEMINI_API_KEY"):
+            raise ChatServiceError("Server configuration error: Gemini API Key missing", 500, retryable=False)
+
+        # Use new google.genai SDK
+        try:
+            from google import genai
+        except ImportError:
+            raise ChatServiceError("AI service unavailable: genai library missing", 500, retryable=False)
+
+    full_prompt = build_chat_prompt(message, history, summary)
+
+    # The gateway rate-limits, retries 429s with backoff and walks the model
+    # fallback list; see gemini_client.py.
+    try:
+        return get_gateway().generate(full_prompt)
+    except GeminiUnavailable as e:
+        raise ChatServiceError(e.message, e.status, retry_after=e.retry_after)
+
+
+def chat_prompt_context(user_id: str, client_history: list, exclude_id: int = None) -> tuple:
+    """
+    Return ``(summary, history)`` for the next prompt: the stored rolling
+    summary plus the most recent unsummarized turns after it (capped at
+    ``2 * KEEP_RECENT``).  Users with no stored messages fall back to the
+    history the client sent.
+    """
+    summary_row = db.session.get(ChatSummary, user_id)
+    through_id = summary_row.summarized_through_id if summary_row else 0
+    query = ChatMessage.query.filter(ChatMessage.user_id == user_id, ChatMessage.id > through_id)
+    if exclude_id is not None:
+        query = query.filter(ChatMessage.id != exclude_id)
+    recent = list(reversed(query.order_by(ChatMessage.id.desc()).limit(chat_summary.KEEP_RECENT * 2).all()))
+    if not recent and not summary_row:
+        return None, client_history
+    history = [{"role": m.role, "content": m.content} for m in recent]
+    return (summary_row.summary if summary_row else None), history
+
+
+def maybe_schedule_compaction(app: Flask, user_id: str):
+    """Enqueue a background summary job once the unsummarized history is large enough."""
+    summary_row = db.session.get(ChatSummary, user_id)
+    through_id = summary_row.summarized_through_id if summary_row else 0
+    dialect = db.session.get_bind(mapper=ChatMessage).dialect
+    chars_column = chat_codec.stored_chars(ChatMessage.content, dialect)
+    count, chars = (
+        db.session.query(db.func.count(ChatMessage.id), db.func.coalesce(db.func.sum(chars_column), 0))
+        .filter(ChatMessage.user_id == user_id, ChatMessage.id > through_id)
+        .one()
+    )
+    if chat_summary.needs_compaction(chars, count):
+        queue = get_job_queue(app)
+        # One pending summary job per user: it folds in every turn that arrived before it runs.
+        if not queue.is_pending("chat_summary", "user_id", user_id):
+            queue.enqueue("chat_summary", {"user_id": user_id}, priority=-5)
+
+
+def compact_chat_history(user_id: str) -> dict:
+    """Fold all but the most recent turns into the user's rolling summary (idempotent)."""
+    summary_row = db.session.get(ChatSummary, user_id)
+    if not summary_row:
+        summary_row = ChatSummary(user_id=user_id, summary="", summarized_through_id=0, summarized_messages=0)
+    pending = (
+        ChatMessage.query.filter(ChatMessage.user_id == user_id, ChatMessage.id > summary_row.summarized_through_id)
+        .order_by(ChatMessage.id.asc())
+        .all()
+    )
+    chars = sum(len(m.content or "") for m in pending)
+    if not chat_summary.needs_compaction(chars, len(pending)):
+        return {"compacted": 0}
+
+    to_summarize, _ = chat_summary.split_for_compaction(pending)
+    turns = [{"role": m.role, "content": m.content} for m in to_summarize]
+    summary_row.summary = chat_summary.summarize(summary_row.summary, turns, generate=lambda prompt: get_gateway().generate(prompt))
+    summary_row.summarized_through_id = to_summarize[-1].id
+    summary_row.summarized_messages = (summary_row.summarized_messages or 0) + len(to_summarize)
+    summary_row.updated_at = datetime.utcnow()
+    db.session.add(summary_row)
+    db.session.commit()
+    return {"compacted": len(to_summarize), "summary_chars": len(summary_row.summary)}
+
+
+def compress_chat_messages(batch_size: int = 500, dry_run: bool = False) -> dict:
+    """Compress stored chat bodies over the codec threshold, shard by shard (resumable)."""
+    started = time.perf_counter()
+    totals = {"scanned": 0, "compressed": 0, "raw_bytes": 0, "stored_bytes": 0}
+    for _ in sharding.each_shard():
+        stats = chat_codec.compress_existing(db.session, ChatMessage, batch_size=batch_size, dry_run=dry_run)
+        for key in totals:
+            totals[key] += stats[key]
+    totals.update(codec=chat_codec.codec(), dry_run=dry_run, seconds=round(time.perf_counter() - started, 3))
+    return totals
+
+
+def chat_summary_metrics() -> dict:
+    now = datetime.utcnow()
+    rows = db.session.query(ChatSummary.summary, ChatSummary.updated_at).all()
+    sizes = sorted(len(summary or "") for summary, _ in rows)
+    ages = sorted((now - updated_at).total_seconds() for _, updated_at in rows)
+
+    def pct(values, q):
+        return values[min(len(values) - 1, int(q * len(values)))] if values else None
 
     return {
-        "risk_score": float(risk_score),
-        "risk_level": risk_level,
-        "risk_label": risk_label,
-        "requires_level2": requires_level2,
+        "summaries": len(rows),
+        "summary_chars_avg": round(sum(sizes) / len(sizes), 1) if sizes else None,
+        "summary_chars_p95": pct(sizes, 0.95),
+        "summary_chars_max": sizes[-1] if sizes else None,
+        "summary_age_seconds_p50": pct(ages, 0.5),
+        "summary_age_seconds_max": ages[-1] if ages else None,
+        "threshold_chars": chat_summary.THRESHOLD_CHARS,
+        "keep_recent": chat_summary.KEEP_RECENT,
     }
 
 
+# --- Background job handlers (run by JobQueue workers inside an app context) ---
 
-def generate_pdf_report(data: dict, title: str) -> io.BytesIO:
-    # import reportlab inside function to avoid import errors when the library
-    # is not available in the environment (e.g. minimal Vercel lambda).
-    try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    except ImportError as e:
-        raise RuntimeError("PDF generation library missing: %s" % e)
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Title
-    story.append(Paragraph(title, styles['Title']))
-    story.append(Spacer(1, 20))
-
-    # General Info Table
-    data_list = []
-    for key, value in data.items():
-        if key in ["raw_metrics", "questionnaire_responses", "ml_features", "domain_scores", "level2_conditions", "level3_conditions"]:
-            continue
-        if isinstance(value, (dict, list)):
-            continue
-            
-        clean_key = key.replace('_', ' ').title()
-        data_list.append([clean_key, str(value)])
-    
-    if data_list:
-        t = Table(data_list, colWidths=[200, 300])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('BACKGROUND', (1, 0), (1, -1), colors.whitesmoke),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('GRID', (0,0), (-1,-1), 1, colors.black)
-        ]))
-        story.append(t)
-        story.append(Spacer(1, 20))
-
-    # Add domain scores/metrics if available
-    if "domain_scores" in data:
-        story.append(Paragraph("Detailed Domain Scores", styles['Heading2']))
-        story.append(Spacer(1, 10))
-        scores = data["domain_scores"]
-        score_data = [[k.replace('_', ' ').title(), f"{v*100:.1f}%"] for k, v in scores.items()]
-        t2 = Table(score_data, colWidths=[200, 100])
-        t2.setStyle(TableStyle([
-            ('GRID', (0,0), (-1,-1), 1, colors.grey),
-        ]))
-        story.append(t2)
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+def run_chat_job(payload: dict) -> dict:
+    if not payload.get("user_id") or not payload.get("message"):
+        raise PermanentJobError("Missing required fields")
+    with sharding.for_user(payload["user_id"]):
+        summary, history = chat_prompt_context(payload["user_id"], payload.get("history") or [],
+                                               exclude_id=payload.get("message_id"))
+        try:
+            response_text = generate_chat_reply(payload["message"], history, summary)
+        except ChatServiceError as e:
+            if not e.retryable:
+                raise PermanentJobError(e.message)
+            raise
+        ai_msg = save_chat_message(payload["user_id"], "assistant", response_text)
+        maybe_schedule_compaction(current_app, payload["user_id"])
+    return {"response": response_text, "message_id": ai_msg.id}
 
 
-def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
-    def require_admin_token(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            auth_header = request.headers.get("Authorization", "")
-            if not auth_header.startswith("Bearer "):
-                return jsonify({"message": "Missing admin token"}), 401
+def run_rescore_job(payload: dict) -> dict:
+    return rescore_results()
 
-            token = auth_header.split(" ", 1)[1].strip()
-            try:
-                payload = serializer.loads(token, max_age=app.config["ADMIN_TOKEN_EXPIRES_IN"])
-            except SignatureExpired:
-                return jsonify({"message": "Admin session expired"}), 401
-            except BadSignature:
-                return jsonify({"message": "Invalid admin token"}), 401
 
-            if payload.get("role") != "admin":
-                return jsonify({"message": "Unauthorized"}), 403
+def run_chat_compress_job(payload: dict) -> dict:
+    return compress_chat_messages(batch_size=int(payload.get("batch_size") or 500))
 
-            return func(*args, **kwargs)
 
-        return wrapper
+def run_chat_summary_job(payload: dict) -> dict:
+    if not payload.get("user_id"):
+        raise PermanentJobError("Missing user_id")
+    with sharding.for_user(payload["user_id"]):
+        return compact_chat_history(payload["user_id"])
 
-    def upsert_progress(user_id: str, condition: str, requires_level2: bool):
-        if not user_id:
-            return
-        
-        # Ensure we are in app context if needed, though this is called from route handlers
-        progress = UserLevelProgress.query.get(user_id)
-        if not progress:
-            progress = UserLevelProgress(user_id=user_id)
 
-        progress.level1_completed = True
+def run_report_job(payload: dict) -> dict:
+    import base64
 
-        level2_conditions = json.loads(progress.level2_conditions or "[]")
-        if requires_level2 and condition not in level2_conditions:
-            level2_conditions.append(condition)
+    try:
+        data, title = load_report(payload.get("result_type"), payload.get("id"))
+    except (LookupError, ValueError) as e:
+        raise PermanentJobError(str(e))
+    pdf = render_report(current_app._get_current_object(), data, title)
+    return {
+        "filename": f"report_{payload['result_type']}_{payload['id']}.pdf",
+        "content_type": "application/pdf",
+        "pdf_base64": base64.b64encode(pdf).decode("ascii"),
+    }
 
-        progress.level2_unlocked = progress.level2_unlocked or requires_level2
-        progress.level2_conditions = json.dumps(level2_conditions)
-        progress.updated_at = datetime.utcnow()
 
-        db.session.add(progress)
+def run_pdf_upload_job(payload: dict) -> dict:
+    import base64
+
+    try:
+        raw = base64.b64decode(payload["file_base64"])
+        text_content = extract_pdf_text(io.BytesIO(raw))
+    except (KeyError, ValueError, RuntimeError) as e:
+        raise PermanentJobError(str(e))
+    with sharding.for_user(payload.get("user_id")):
+        save_chat_message(payload["user_id"], "user",
+                          upload_message_content(payload.get("filename", "document.pdf"), text_content))
+    summary = f"[User uploaded PDF content]:\n{text_content}\n[End of PDF]"
+    return {"message": "File processed successfully", "extracted_text": summary}
+
+
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(app: Flask) -> JobQueue:
+    """Create the app's job queue on first use (workers start on first enqueue)."""
+    queue = app.extensions.get("job_queue")
+    if queue is None:
+        with _job_queue_lock:
+            queue = app.extensions.get("job_queue")
+            if queue is None:
+                queue = JobQueue(app.config["JOBS_DB_PATH"], workers=app.config["JOB_WORKERS"],
+                                 context_factory=app.app_context,
+                                 retention_seconds=app.config["JOBS_RETENTION_SECONDS"])
+                queue.register("chat", run_chat_job, concurrency=4, max_attempts=4)
+                queue.register("report", run_report_job, concurrency=2, max_attempts=2)
+                queue.register("pdf_upload", run_pdf_upload_job, concurrency=2, max_attempts=2)
+                queue.register("chat_summary", run_chat_summary_job, concurrency=1, max_attempts=3, internal=True)
+                queue.register("rescore", run_rescore_job, concurrency=1, max_attempts=2, internal=True)
+                queue.register("chat_compress", run_chat_compress_job, concurrency=1, max_attempts=2, internal=True)
+                app.extensions["job_queue"] = queue
+    return queue
+
+
+TELEMETRY_BINARY_TYPES = ("application/x-cogniwise-telemetry", "application/octet-stream")
+TELEMETRY_SESSION_RE = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+_telemetry_writer_lock = threading.Lock()
+_telemetry_owners = {}  # session_id -> user_id, so ownership checks skip the database
+
+
+def write_telemetry_chunks(items):
+    """Append one chunk per session and bump the session totals, in a single transaction."""
+    now = datetime.utcnow()
+    for session_id, user_id, columns in items:
+        t = columns["t"]
+        payload = telemetry.encode_chunk(columns)
+        db.session.add(TelemetryChunk(
+            session_id=session_id, user_id=user_id, event_count=len(t),
+            t_min=min(t), t_max=max(t), payload=payload, created_at=now,
+        ))
+        session = db.session.get(TelemetrySession, session_id)
+        if session is None:
+            session = TelemetrySession(session_id=session_id, user_id=user_id, event_count=0, chunk_count=0,
+                                       stored_bytes=0, t_min=min(t), t_max=max(t), created_at=now)
+            db.session.add(session)
+        session.event_count += len(t)
+        session.chunk_count += 1
+        session.stored_bytes += len(payload)
+        session.t_min = min(session.t_min, min(t))
+        session.t_max = max(session.t_max, max(t))
+        session.updated_at = now
+    db.session.commit()
+
+
+def get_telemetry_writer(app: Flask) -> "telemetry.TelemetryWriter":
+    """Create the app's telemetry writer (and its flusher thread) on first use."""
+    writer = app.extensions.get("telemetry_writer")
+    if writer is None:
+        with _telemetry_writer_lock:
+            writer = app.extensions.get("telemetry_writer")
+            if writer is None:
+                def write_chunks(items):
+                    with app.app_context():
+                        try:
+                            write_telemetry_chunks(items)
+                        except Exception:
+                            db.session.rollback()
+                            raise
+
+                writer = telemetry.TelemetryWriter(
+                    write_chunks,
+                    flush_interval=app.config["TELEMETRY_FLUSH_INTERVAL"],
+                    max_buffered_events=app.config["TELEMETRY_MAX_BUFFERED"],
+                    background=app.config["TELEMETRY_FLUSH"] != "sync",
+                ).start()
+                atexit.register(writer.stop)
+                app.extensions["telemetry_writer"] = writer
+    return writer
+
+
+def telemetry_session_owner(session_id: str):
+    owner = _telemetry_owners.get(session_id)
+    if owner is None:
+        session = db.session.get(TelemetrySession, session_id)
+        if session is None:
+            return None
+        owner = session.user_id
+        if len(_telemetry_owners) > 100000:
+            _telemetry_owners.clear()
+        _telemetry_owners[session_id] = owner
+    return owner
+
+
+def load_sessions_columns(session_ids: list) -> dict:
+    """session_id -> stored telemetry columns, read with one query."""
+    chunks = {session_id: [] for session_id in session_ids}
+    rows = (
+        db.session.query(TelemetryChunk.session_id, TelemetryChunk.payload)
+        .filter(TelemetryChunk.session_id.in_(list(chunks)))
+        .order_by(TelemetryChunk.id)
+    )
+    for session_id, payload in rows:
+        chunks[session_id].append(telemetry.decode_chunk(payload))
+    return {session_id: telemetry.concat(parts) for session_id, parts in chunks.items()}
+
+
+def write_session_metrics(rows: list, out) -> int:
+    results = telemetry_level2_metrics([(age_group, session_id) for session_id, _, age_group in rows])
+    for (session_id, user_id, age_group), metrics in zip(rows, results):
+        out.write(json.dumps({"session_id": session_id, "user_id": user_id, "age_group": age_group,
+                              "metrics": metrics}) + "\n")
+    return len(rows)
+
+
+def telemetry_level2_metrics(sessions: list) -> list:
+    """Level-2 metrics for ``[(age_group, session_id), ...]`` computed from stored telemetry."""
+    # numpy is only needed here, so it stays out of the import path of every other request
+    try:
+        from level2_features import extract_batch
+    except ImportError:
+        from backend.level2_features import extract_batch
+    columns = load_sessions_columns([session_id for _, session_id in sessions])
+    return extract_batch([(age_group, columns[session_id]) for age_group, session_id in sessions])
+
+
+def wants_async(data: dict = None) -> bool:
+    flag = request.args.get("async") or (data or {}).get("async")
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
+    def admin_token_error():
+        """The error response for a request without a valid admin token, else None."""
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            return jsonify({"message": "Missing admin token"}), 401
+
+        token = auth_header.split(" ", 1)[1].strip()
+        try:
+            payload = serializer.loads(token, max_age=app.config["ADMIN_TOKEN_EXPIRES_IN"])
+        except SignatureExpired:
+            return jsonify({"message": "Admin session expired"}), 401
+        except BadSignature:
+            return jsonify({"message": "Invalid admin token"}), 401
+
+        if payload.get("role") != "admin":
+            return jsonify({"message": "Unauthorized"}), 403
+        return None
+
+    def require_admin_token(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            error = admin_token_error()
+            if error is not None:
+                return error
+            return func(*args, **kwargs)
+
+        return wrapper
 
     @app.post("/api/submit-level1")
     def submit_level1():
@@ -484,7 +1964,7 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
             features = data.get("features") or {}
             questionnaire_responses = data.get("questionnaire_responses") or {}
 
-            prediction = calculate_risk(condition, features)
+            prediction = score_level1(condition, features)
 
             age_value = data.get("age")
             try:
@@ -495,7 +1975,7 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
             age_group_value = data.get("age_group")
             if not age_group_value and age_value is not None:
                 age_group_value = age_to_age_group(age_value)
-            result = AssessmentResult(
+            fields = dict(
                 user_id=data.get("user_id"),
                 user_name=data.get("user_name"),
                 user_email=data.get("user_email"),
@@ -508,14 +1988,15 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
                 risk_level=prediction["risk_level"],
                 risk_label=prediction["risk_label"],
                 requires_level2=prediction["requires_level2"],
+                scoring_spec_version=prediction.get("spec_version"),
                 gender=data.get("gender"),
                 address=data.get("address"),
                 assessed_at=datetime.utcnow(),
             )
 
-            db.session.add(result)
-            upsert_progress(data.get("user_id"), condition, prediction["requires_level2"])
-            db.session.commit()
+            result = commit_unit(lambda session: persist_level1(session, fields, prediction["requires_level2"]))
+            update_population_norms(*level1_norm_scores(result))
+            update_user_trends(result)
 
             return jsonify(prediction), 200
         except Exception as exc:
@@ -542,7 +2023,22 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
                 return jsonify({"message": "Server configuration error: level2 logic missing"}), 500
 
             metrics = {}
-            if "game_scores" in data and data["game_scores"]:
+            telemetry_session_id = None
+            session_id = data.get("session_id")
+            if session_id and not data.get("game_scores"):
+                # Metrics computed from the raw telemetry streamed during the games
+                session_id = str(session_id)
+                get_telemetry_writer(app).flush(session_id)
+                session = db.session.get(TelemetrySession, session_id)
+                if session is None:
+                    return jsonify({"message": "Telemetry session not found"}), 404
+                if session.user_id != user_id:
+                    return jsonify({"message": "Session belongs to another user"}), 403
+                metrics = telemetry_level2_metrics([(age_group, session_id)])[0]
+                if not metrics:
+                    return jsonify({"message": "Telemetry session has no usable game events"}), 400
+                metrics["telemetry_session_id"] = telemetry_session_id = session_id
+            elif "game_scores" in data and data["game_scores"]:
                 # Use real game data normalized from frontend
                 # We expect game1, game2, game3 (0.0 to 1.0)
                 game_scores = data["game_scores"]
@@ -557,36 +2053,22 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
 
             result_data = calculate_level2_score(age_group, metrics)
             
-            level2_result = Level2Result(
+            fields = dict(
                 user_id=user_id,
                 age_group=age_group,
                 raw_metrics=json.dumps(metrics),
                 domain_scores=json.dumps(result_data["domain_scores"]),
                 final_risk_score=result_data["final_risk_score"],
                 final_risk_percent=result_data["final_risk_percent"],
+                scoring_spec_version=result_data.get("spec_version"),
                 assessed_at=datetime.utcnow()
             )
+            unlock_level3 = scoring.current_spec().level3_unlocked(result_data["final_risk_percent"])
             
-            db.session.add(level2_result)
-            
-            unlock_level3 = result_data["final_risk_percent"] >= 55.0
-            
-            progress = UserLevelProgress.query.get(user_id)
-            if not progress:
-                progress = UserLevelProgress(user_id=user_id)
-            
-            progress.level2_completed = True # Mark Level 2 as completed
-            progress.level3_unlocked = progress.level3_unlocked or unlock_level3
-            if unlock_level3:
-                l3_conds = json.loads(progress.level3_conditions or "[]")
-                if "high_risk_level2" not in l3_conds:
-                    l3_conds.append("high_risk_level2")
-                progress.level3_conditions = json.dumps(l3_conds)
-                
-            progress.updated_at = datetime.utcnow()
-            db.session.add(progress)
-            
-            db.session.commit()
+            level2_result = commit_unit(lambda session: persist_level2(
+                session, fields, metrics, unlock_level3, telemetry_session_id))
+            update_population_norms(*level2_norm_scores(level2_result))
+            update_user_trends(level2_result)
             
             return jsonify({
                 "results": level2_result.to_dict(),
@@ -598,6 +2080,7 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
             return jsonify({"message": "Failed to submit Level-2", "error": str(e)}), 500
 
     @app.get("/api/level3/summary/<user_id>")
+    @replica.reads_from_replica
     def get_level3_summary(user_id: str):
         try:
             # Fetch latest Level-2 result for context
@@ -653,26 +2136,109 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    def directory_search(kind: str, sample: list):
+        """Shared query handling for the doctor/hospital lookups."""
+        directory = _directory().current_directory()
+        if not len(directory.indexes[kind]):
+            return jsonify(sample), 200  # no dataset deployed
+        try:
+            lat, lon = request.args.get("lat", type=float), request.args.get("lon", type=float)
+            radius_km = request.args.get("radius_km", type=float)
+            limit = request.args.get("limit", DIRECTORY_DEFAULT_LIMIT, type=int)
+            if (lat is None) != (lon is None):
+                raise ValueError("lat and lon must be given together")
+            if lat is not None and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError("lat/lon out of range")
+            if radius_km is not None and not 0 < radius_km <= DIRECTORY_MAX_RADIUS_KM:
+                raise ValueError(f"radius_km must be between 0 and {DIRECTORY_MAX_RADIUS_KM}")
+            if not 1 <= limit <= DIRECTORY_MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {DIRECTORY_MAX_LIMIT}")
+            results = directory.search(kind, lat, lon, radius_km, limit, request.args.get("specialty"))
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        return jsonify(results), 200
+
     @app.get("/api/level3/find_doctors")
     def find_doctors():
-        # Mock data - in real app, query a DB based on location/specialty
-        doctors = [
-            {"name": "Dr. Sarah Smith", "specialty": "Neurologist", "contact": "+1-555-0123", "rating": 4.8},
-            {"name": "Dr. James Johnson", "specialty": "Psychiatrist (ADHD/ASD)", "contact": "+1-555-0124", "rating": 4.9},
-            {"name": "Dr. Emily Chen", "specialty": "Geriatric Specialist", "contact": "+1-555-0125", "rating": 4.7}
-        ]
-        return jsonify(doctors), 200
+        """Nearest specialists to ?lat=&lon= (or within ?radius_km=), optionally ?specialty=neurologist,geriatric."""
+        return directory_search("doctor", SAMPLE_DOCTORS)
 
     @app.get("/api/level3/find_hospitals")
     def find_hospitals():
-        # Mock data representing nearby emergency centers
-        hospitals = [
-            {"name": "City General Hospital", "distance": "2.5 km", "emergency_contact": "911", "address": "123 Main St"},
-            {"name": "Neuro Care Institute", "distance": "5.0 km", "emergency_contact": "+1-800-NEURO", "address": "456 Medical Dr"}
-        ]
-        return jsonify(hospitals), 200
+        """Nearest facilities; same parameters as find_doctors."""
+        return directory_search("hospital", SAMPLE_HOSPITALS)
+
+    @app.post("/api/level2/telemetry/<session_id>")
+    def ingest_telemetry(session_id: str):
+        """Accept a batch of game events (NDJSON or binary columns) for one Level-2 session."""
+        user_id = request.args.get("user_id") or request.headers.get("X-User-Id")
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+        if not TELEMETRY_SESSION_RE.match(session_id):
+            return jsonify({"message": "Invalid session id"}), 400
+        limit = app.config["TELEMETRY_MAX_BODY"]
+        if (request.content_length or 0) > limit:
+            return jsonify({"message": f"Batch larger than {limit} bytes; send smaller chunks"}), 413
+        body = request.get_data(cache=False)
+        if len(body) > limit:
+            return jsonify({"message": f"Batch larger than {limit} bytes; send smaller chunks"}), 413
+
+        try:
+            if request.mimetype in TELEMETRY_BINARY_TYPES:
+                columns = telemetry.parse_binary(body)
+            else:
+                columns = telemetry.parse_ndjson(body)
+        except telemetry.TelemetryFormatError as e:
+            return jsonify({"message": "Invalid telemetry batch", "error": str(e)}), 400
+
+        owner = telemetry_session_owner(session_id)
+        if owner is not None and owner != user_id:
+            return jsonify({"message": "Session belongs to another user"}), 403
+        _telemetry_owners.setdefault(session_id, user_id)
+
+        try:
+            accepted = get_telemetry_writer(app).append(session_id, user_id, columns)
+        except telemetry.TelemetryBackpressure as e:
+            headers = {"Retry-After": str(max(1, int(round(e.retry_after))))}
+            return jsonify({"message": "Telemetry buffer full, retry later"}), 503, headers
+        return jsonify({"session_id": session_id, "accepted": accepted}), 202
+
+    @app.get("/api/level2/telemetry/<session_id>")
+    def get_telemetry_summary(session_id: str):
+        """Event breakdown of one of the caller's sessions (``user_id`` as for ingest)."""
+        user_id = request.args.get("user_id") or request.headers.get("X-User-Id")
+        if not user_id:
+            return jsonify({"message": "user_id is required"}), 400
+        get_telemetry_writer(app).flush(session_id)
+        session = db.session.get(TelemetrySession, session_id)
+        if session is None:
+            return jsonify({"message": "Session not found"}), 404
+        if session.user_id != user_id:
+            return jsonify({"message": "Session belongs to another user"}), 403
+        columns = load_sessions_columns([session_id])[session_id]
+        by_type, by_game = {}, {}
+        for code in columns["type"]:
+            name = telemetry.EVENT_TYPES[code] if code < len(telemetry.EVENT_TYPES) else "other"
+            by_type[name] = by_type.get(name, 0) + 1
+        for game in columns["game"]:
+            by_game[str(game)] = by_game.get(str(game), 0) + 1
+        return jsonify({
+            "session_id": session_id,
+            "user_id": session.user_id,
+            "event_count": session.event_count,
+            "chunk_count": session.chunk_count,
+            "stored_bytes": session.stored_bytes,
+            "t_min": session.t_min,
+            "t_max": session.t_max,
+            "trials": len(set(zip(columns["game"], columns["trial"]))),
+            "events_by_type": by_type,
+            "events_by_game": by_game,
+            "updated_at": session.updated_at.isoformat(),
+        }), 200
 
     @app.get("/api/level2/results/<user_id>")
+    @replica.reads_from_replica
+    @http_cache.conditional
     def get_level2_results(user_id: str):
         try:
             results = (
@@ -680,11 +2246,20 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
                 .order_by(Level2Result.assessed_at.desc())
                 .all()
             )
-            return jsonify([r.to_dict() for r in results]), 200
+            results = merge_archived(Level2Result, user_id, results)
+            tables = norm_tables(r.age_group for r in results)
+            payload = []
+            for r in results:
+                entry = r.to_dict()
+                entry["percentiles"] = score_percentiles(*level2_norm_scores(r), tables)
+                payload.append(entry)
+            return jsonify(payload), 200
         except Exception as e:
             return jsonify({"message": "Failed to load results", "error": str(e)}), 500
 
     @app.get("/api/results/<user_id>")
+    @replica.reads_from_replica
+    @http_cache.conditional
     def get_results(user_id: str):
         try:
             results = (
@@ -692,7 +2267,16 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
                 .order_by(AssessmentResult.assessed_at.desc())
                 .all()
             )
-            return jsonify([r.to_dict() for r in results]), 200
+            results = merge_archived(AssessmentResult, user_id, results)
+            norm_scores = [level1_norm_scores(r) for r in results]
+            tables = norm_tables(age_group for age_group, _ in norm_scores)
+            payload = []
+            for r, (age_group, scores) in zip(results, norm_scores):
+                entry = r.to_dict()
+                percentile = score_percentiles(age_group, scores, tables)
+                entry["risk_percentile"] = next(iter(percentile.values()), None)
+                payload.append(entry)
+            return jsonify(payload), 200
         except Exception as exc:
             return (
                 jsonify({"message": "Failed to load results", "error": str(exc)}),
@@ -700,6 +2284,8 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
             )
 
     @app.get("/api/progress/<user_id>")
+    @replica.reads_from_replica
+    @http_cache.conditional
     def get_progress(user_id: str):
         try:
             progress = UserLevelProgress.query.get(user_id)
@@ -711,6 +2297,98 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
             traceback.print_exc()
             return jsonify({"message": "Failed to get progress", "error": str(e), "trace": traceback.format_exc()}), 500
 
+    @app.get("/api/trends/<user_id>")
+    @replica.reads_from_replica
+    def get_trends(user_id: str):
+        """
+        Per-series trends for one user: ``level1_<condition>`` risk scores and
+        ``level2_<domain>`` domain scores, each with its recent points, moving
+        averages, slope and CUSUM change points.  Served from the stored
+        aggregates; ``?series=a,b`` limits the output.
+        """
+        try:
+            rows = UserTrend.query.filter_by(user_id=user_id).all()
+            if not rows and user_has_results(user_id):
+                # Results from before trends were tracked: build the aggregates once.
+                rebuild_user_trends(user_id)
+                rows = UserTrend.query.filter_by(user_id=user_id).all()
+
+            wanted = {s for s in request.args.get("series", "").split(",") if s}
+            series = {
+                row.series: trends.summarize(json.loads(row.state))
+                for row in sorted(rows, key=lambda r: r.series)
+                if not wanted or row.series in wanted
+            }
+            return jsonify({"user_id": user_id, "series": series}), 200
+        except Exception as e:
+            return jsonify({"message": "Failed to load trends", "error": str(e)}), 500
+
+    @app.get("/api/norms/<age_group>")
+    @replica.reads_from_replica
+    def get_norms(age_group: str):
+        """
+        Population norms for one age group.  ``?domain=<d>&value=<x>`` returns
+        the percentile of ``x`` (share of the age group at or below it); without
+        ``value`` it lists each domain's sample count and quartiles.
+        """
+        domain = request.args.get("domain")
+        value = request.args.get("value", type=float)
+        tables = norm_tables([age_group])
+        if value is not None:
+            if not domain:
+                return jsonify({"message": "domain is required with value"}), 400
+            table = tables.get((age_group, domain))
+            if table is None:
+                return jsonify({"message": "Not enough data for this age group and domain"}), 404
+            return jsonify({"age_group": age_group, "domain": domain, "value": value,
+                            "percentile": percentile_from_table(table, value)}), 200
+
+        counts = dict(
+            db.session.query(PopulationSketch.domain, PopulationSketch.n).filter_by(age_group=age_group).all()
+        )
+        return jsonify({
+            d: {"n": counts[d], "p10": t[10], "p25": t[25], "p50": t[50], "p75": t[75], "p90": t[90]}
+            for (a, d), t in sorted(tables.items())
+            if not domain or d == domain
+        }), 200
+
+    @app.get("/api/admin/scoring")
+    @require_admin_token
+    def admin_scoring_spec():
+        spec = scoring.current_spec()
+        pending = {
+            model.__tablename__: model.query.filter(or_(
+                model.scoring_spec_version.is_(None), model.scoring_spec_version != spec.version)).count()
+            for model, _, _ in RESCORE_TABLES
+        }
+        return jsonify({"version": spec.version, "path": spec.path, "pending_rescore": pending,
+                        "spec": spec.raw}), 200
+
+    @app.post("/api/admin/scoring/rescore")
+    @require_admin_token
+    def admin_rescore():
+        data = request.get_json(silent=True) or {}
+        if wants_async(data):
+            job_id = get_job_queue(app).enqueue("rescore", {})
+            return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+        dry_run = str(request.args.get("dry_run") or data.get("dry_run")).lower() in ("1", "true", "yes")
+        return jsonify(rescore_results(dry_run=dry_run)), 200
+
+    @app.post("/api/admin/chat/compress")
+    @require_admin_token
+    def admin_compress_chat():
+        data = request.get_json(silent=True) or {}
+        if wants_async(data):
+            job_id = get_job_queue(app).enqueue("chat_compress", {"batch_size": data.get("batch_size")}, priority=-10)
+            return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+        dry_run = str(request.args.get("dry_run") or data.get("dry_run")).lower() in ("1", "true", "yes")
+        return jsonify(compress_chat_messages(dry_run=dry_run)), 200
+
+    @app.post("/api/admin/norms/rebuild")
+    @require_admin_token
+    def admin_rebuild_norms():
+        return jsonify({"sketches": rebuild_population_norms()}), 200
+
     @app.post("/api/admin/login")
     def admin_login():
         credentials = request.get_json(force=True, silent=False) or {}
@@ -725,30 +2403,35 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
 
     @app.get("/api/admin/users")
     @require_admin_token
+    @replica.reads_from_replica
+    @http_cache.conditional
     def admin_users():
-        subquery = (
-            db.session.query(
-                AssessmentResult.user_id,
-                db.func.max(AssessmentResult.assessed_at).label("latest_assessment"),
+        def latest(session):
+            subquery = (
+                session.query(
+                    AssessmentResult.user_id,
+                    db.func.max(AssessmentResult.assessed_at).label("latest_assessment"),
+                )
+                .group_by(AssessmentResult.user_id)
+                .subquery()
             )
-            .group_by(AssessmentResult.user_id)
-            .subquery()
-        )
-
-        latest_records = (
-            db.session.query(AssessmentResult)
-            .join(
-                subquery,
-                (AssessmentResult.user_id == subquery.c.user_id)
-                & (AssessmentResult.assessed_at == subquery.c.latest_assessment),
+            return (
+                session.query(AssessmentResult, UserLevelProgress)
+                .join(
+                    subquery,
+                    (AssessmentResult.user_id == subquery.c.user_id)
+                    & (AssessmentResult.assessed_at == subquery.c.latest_assessment),
+                )
+                .outerjoin(UserLevelProgress, UserLevelProgress.user_id == AssessmentResult.user_id)
+                .all()
             )
-            .order_by(AssessmentResult.assessed_at.desc())
-            .all()
-        )
+
+        # a user's results and progress share a shard, so each shard's rows are complete
+        latest_records = sorted(itertools.chain.from_iterable(across_shards(latest)),
+                                key=lambda pair: pair[0].assessed_at, reverse=True)
 
         payload = []
-        for record in latest_records:
-            progress = UserLevelProgress.query.get(record.user_id)
+        for record, progress in latest_records:
             age_group_display = record.age_group or age_to_age_group(record.age)
             payload.append(
                 {
@@ -766,52 +2449,227 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
 
         return jsonify(payload), 200
 
+    @app.get("/api/admin/users/search")
+    @require_admin_token
+    @replica.reads_from_replica
+    def admin_search_users():
+        """``?q=<terms>&limit=&offset=``: prefix search over name, email, address and admin notes."""
+        q = (request.args.get("q") or "").strip()
+        limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        if not q:
+            return jsonify({"message": "Missing search query"}), 400
+
+        hits, has_more = search_users(q, limit, offset)
+        user_ids = [user_id for user_id, _ in hits]
+        latest = {}
+        if user_ids:
+            def latest_of(session):
+                subquery = (
+                    session.query(
+                        AssessmentResult.user_id,
+                        db.func.max(AssessmentResult.id).label("latest_id"),
+                    )
+                    .filter(AssessmentResult.user_id.in_(user_ids))
+                    .group_by(AssessmentResult.user_id)
+                    .subquery()
+                )
+                return session.query(AssessmentResult).join(subquery, AssessmentResult.id == subquery.c.latest_id).all()
+
+            latest = {r.user_id: r for records in across_shards(latest_of) for r in records}
+
+        results = []
+        for user_id, rank in hits:
+            record = latest.get(user_id)
+            if record is None:
+                continue
+            results.append({
+                "user_id": user_id,
+                "name": record.user_name,
+                "email": record.user_email,
+                "address": record.address,
+                "age_group": record.age_group or age_to_age_group(record.age),
+                "last_assessed": record.assessed_at.isoformat(),
+                "rank": rank,
+            })
+        return jsonify({"query": q, "results": results, "limit": limit, "offset": offset,
+                        "has_more": has_more}), 200
+
+    @app.get("/api/admin/export/<table>")
+    @require_admin_token
+    @replica.reads_from_replica
+    def admin_export(table: str):
+        """
+        Stream ``assessment_results`` or ``level2_results`` as CSV (default) or
+        Parquet (``format=parquet``, needs pyarrow).  Options: ``deidentify=1``,
+        ``flatten=0`` (keep JSON columns as text), ``archived=0``, ``from``/``to``.
+        """
+        models = {m.__tablename__: m for m in (AssessmentResult, Level2Result)}
+        if table not in models:
+            return jsonify({"message": f"table must be one of {sorted(models)}"}), 400
+        fmt = request.args.get("format", "csv")
+        if fmt not in ("csv", "parquet"):
+            return jsonify({"message": "format must be csv or parquet"}), 400
+        if fmt == "parquet" and not data_export.parquet_available():
+            return jsonify({"message": "Parquet export is not available on this server (pyarrow missing)"}), 501
+        try:
+            since = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else None
+            until = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        except ValueError:
+            return jsonify({"message": "from/to must be ISO dates"}), 400
+
+        def flag(name, default):
+            return request.args.get(name, default).lower() in ("1", "true", "yes")
+
+        key = os.getenv("EXPORT_PSEUDONYM_KEY", app.config["SECRET_KEY"]).encode("utf-8")
+        chunks = data_export.export(
+            db.session, models[table], ArchiveBatch if flag("archived", "1") else None, fmt,
+            flatten=flag("flatten", "1"), deidentify=flag("deidentify", "0"), pseudonym_key=key,
+            since=since, until=until, shards=app.extensions.get("shards"),
+        )
+        filename = f"{table}-{datetime.utcnow():%Y%m%d}.{fmt}"
+        return Response(
+            stream_with_context(chunks),
+            mimetype="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
     @app.get("/api/admin/users/<user_id>/assessments")
     @require_admin_token
+    @replica.reads_from_replica
     def admin_user_assessments(user_id: str):
         results = (
             AssessmentResult.query.filter_by(user_id=user_id)
             .order_by(AssessmentResult.assessed_at.desc())
             .all()
         )
+        results = merge_archived(AssessmentResult, user_id, results)
         return jsonify([r.to_dict() for r in results]), 200
 
+    @app.get("/api/admin/users/<user_id>/overview")
+    @require_admin_token
+    @replica.reads_from_replica
+    @http_cache.conditional
+    def admin_user_overview(user_id: str):
+        """
+        One user's Level-1/Level-2 results, progress, Level-3 status and chat
+        stats in a single response.  ``?include=`` picks sections and
+        ``?fields=level1.risk_score,...`` projects the result columns.
+        """
+        try:
+            sections, projection = parse_overview_args(request.args.get("include"), request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        return jsonify(user_overview(user_id, sections, projection)), 200
+
     @app.post("/api/admin/assessments/<int:assessment_id>/suggestion")
     @require_admin_token
     def admin_save_suggestion(assessment_id: int):
         payload = request.get_json(force=True, silent=False) or {}
         notes = payload.get("notes", "").strip()
 
-        result = AssessmentResult.query.get_or_404(assessment_id)
-        result.admin_notes = notes or None
-        db.session.commit()
+        found = find_record(AssessmentResult, assessment_id)
+        if found is None:
+            return jsonify({"message": "Assessment not found"}), 404
+        with sharding.for_user(found.user_id):
+            result = db.session.get(AssessmentResult, assessment_id)
+            result.admin_notes = notes or None
+            db.session.commit()
+            return jsonify({"message": "Suggestion saved", "assessment": result.to_dict()}), 200
 
-        return jsonify({"message": "Suggestion saved", "assessment": result.to_dict()}), 200
+    @app.get("/api/admin/level2/metrics")
+    @require_admin_token
+    @replica.reads_from_replica
+    def admin_level2_metrics():
+        """
+        Cohort aggregates over typed Level-2 metrics, e.g.
+        ``?metric=anti_saccade_error_rate&age_group=adult&bucket=month``.
+        Without ``metric`` it lists the available (age_group, metric) pairs.
+        """
+        metric = request.args.get("metric")
+        age_group = request.args.get("age_group")
+        if not metric:
+            query = db.session.query(Level2Metric.age_group, Level2Metric.metric, db.func.count(Level2Metric.id))
+            if age_group:
+                query = query.filter(Level2Metric.age_group == age_group)
+            rows = query.group_by(Level2Metric.age_group, Level2Metric.metric).all()
+            return jsonify([{"age_group": a, "metric": m, "count": c} for a, m, c in rows]), 200
+
+        bucket = request.args.get("bucket", "month")
+        if bucket not in LEVEL2_METRIC_BUCKETS:
+            return jsonify({"message": f"bucket must be one of {sorted(LEVEL2_METRIC_BUCKETS)}"}), 400
+        try:
+            since = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else None
+            until = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        except ValueError:
+            return jsonify({"message": "from/to must be ISO dates"}), 400
+
+        return jsonify({
+            "metric": metric,
+            "age_group": age_group,
+            "bucket": bucket,
+            "series": level2_metric_aggregate(metric, age_group, bucket, since, until),
+        }), 200
+
+    metrics.register("jobs", lambda: get_job_queue(app).stats())
+    metrics.register("gemini", lambda: get_gateway().stats())
+    metrics.register("chat_summaries", chat_summary_metrics)
+    metrics.register("chat_storage", chat_codec.stats)
+    metrics.register("reports", lambda: (
+        app.extensions["report_pool"].stats() if "report_pool" in app.extensions else {"workers": 0}))
+    metrics.register("norms", lambda: {
+        "sketches": PopulationSketch.query.count(),
+        "samples": int(db.session.query(db.func.coalesce(db.func.sum(PopulationSketch.n), 0)).scalar()),
+        "stored_bytes": int(db.session.query(
+            db.func.coalesce(db.func.sum(db.func.length(PopulationSketch.sketch)), 0)).scalar()),
+    })
+    metrics.register("archive", lambda: archive_stats(db.session, ArchiveBatch))
+    metrics.register("models", lambda: (
+        _model_serving().engine_stats() if app.config["LEVEL1_SCORER"] == "model" else {"loaded": False}))
+    metrics.register("directory", lambda: _directory().directory_stats())
+    metrics.register("replica", lambda: (
+        app.extensions["read_router"].stats() if "read_router" in app.extensions else {"enabled": False}))
+    metrics.register("shards", lambda: (
+        app.extensions["shards"].stats() if "shards" in app.extensions else {"enabled": False}))
+    metrics.register("group_commit", lambda: (
+        get_group_committer(app).stats() if app.config["GROUP_COMMIT"] else {"enabled": False}))
+    metrics.register("telemetry", lambda: dict(
+        get_telemetry_writer(app).stats(),
+        sessions=TelemetrySession.query.count(),
+        stored_events=int(db.session.query(db.func.coalesce(db.func.sum(TelemetrySession.event_count), 0)).scalar()),
+        stored_bytes=int(db.session.query(db.func.coalesce(db.func.sum(TelemetrySession.stored_bytes), 0)).scalar()),
+    ))
+
+    @app.get("/api/admin/metrics")
+    @require_admin_token
+    def admin_metrics():
+        return jsonify(metrics.collect()), 200
 
     @app.get("/api/reports/<result_type>/<id>/pdf")
+    @replica.reads_from_replica
     def download_report_pdf(result_type, id):
         try:
-            if result_type == "level1":
-                record = AssessmentResult.query.get_or_404(id)
-                data = record.to_dict()
-                title = f"Assessment Report - {data.get('condition_type', '').upper()}"
-            elif result_type == "level2":
-                record = Level2Result.query.get_or_404(id)
-                data = record.to_dict()
-                title = f"Level 2 Assessment Report - {data.get('age_group', '').title()}"
-            elif result_type == "level3":
-                # Level 3 uses Level 2 data but formats it as Emergency Report
-                record = Level2Result.query.get_or_404(id)
-                data = record.to_dict()
-                data['EMERGENCY_NOTICE'] = "High Risk Detected - Immediate Intervention Advised"
-                title = "EMERGENCY INTERVENTION REPORT - IMMEDIATE ACTION REQUIRED"
-            else:
-                return jsonify({"message": "Invalid report type"}), 400
+            if wants_async():
+                job_id = get_job_queue(app).enqueue("report", {"result_type": result_type, "id": id})
+                return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+            try:
+                data, title = load_report(result_type, id)
+            except LookupError as e:
+                return jsonify({"message": str(e)}), 404
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
+
+            try:
+                pdf = render_report(app, data, title)
+            except report_renderer.ReportPoolBusy as e:
+                headers = {"Retry-After": str(max(1, int(round(e.retry_after))))}
+                return jsonify({"message": "Report renderer busy, retry later"}), 503, headers
+            except report_renderer.ReportTimeout as e:
+                return jsonify({"message": str(e)}), 504
 
-            pdf_buffer = generate_pdf_report(data, title)
-            
             return send_file(
-                pdf_buffer,
+                io.BytesIO(pdf),
                 as_attachment=True,
                 download_name=f"report_{result_type}_{id}.pdf",
                 mimetype='application/pdf'
@@ -820,18 +2678,85 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
             return jsonify({"message": "Failed to generate PDF", "error": str(e)}), 500
 
     @app.get("/api/chat/history")
+    @replica.reads_from_replica
+    @http_cache.conditional
     def get_chat_history():
+        """
+        Chat history with cursors.
+
+        No cursor returns the newest ``limit`` messages; ``since_id`` returns
+        messages after that id (new turns) and ``before_id`` the page before
+        it (scrolling back).  Results are always oldest-first.  With
+        ``since_id`` and ``wait=<seconds>`` the request long-polls until a new
+        message arrives.  Responses carry a weak ETag derived from the user's
+        latest message id, so unchanged polls cost a 304.
+        """
         user_id = request.args.get("user_id") # specific user or from session if we implemented auth middleware here
         # For simplicity, assuming user_id checks passed or we trust the query param for now (in prod, use token)
-        # But wait, other routes don't verify token except admin. 
         # The frontend calls supabase auth, but backend routes here (submit-level1) just take user_id. 
         # We will follow that pattern for now, but ideally we should verify.
         
         if not user_id:
              return jsonify([]), 200
 
-        messages = ChatMessage.query.filter_by(user_id=user_id).order_by(ChatMessage.created_at.asc()).limit(50).all()
-        return jsonify([m.to_dict() for m in messages]), 200
+        try:
+            since_id = request.args.get("since_id", type=int)
+            before_id = request.args.get("before_id", type=int)
+            limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+            wait_seconds = min(max(request.args.get("wait", 0, type=float), 0.0), 30.0)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor parameters"}), 400
+
+        def latest_id():
+            return db.session.query(db.func.max(ChatMessage.id)).filter(ChatMessage.user_id == user_id).scalar() or 0
+
+        if since_id is not None and wait_seconds:
+            replica.use_primary()  # a long poll waits for rows the replica may not have yet
+        seen_version = chat_notifier.version(user_id)
+        last_id = latest_id()
+        if since_id is not None and wait_seconds and last_id <= since_id:
+            deadline = time.monotonic() + wait_seconds
+            while last_id <= since_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # Short slices so writes from other worker processes are also noticed.
+                chat_notifier.wait(user_id, seen_version, min(remaining, 1.0))
+                seen_version = chat_notifier.version(user_id)
+                db.session.rollback()  # end the read transaction so the next query sees new rows
+                last_id = latest_id()
+
+        etag = f"chat-{user_id}-{last_id}-{since_id}-{before_id}-{limit}"
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        query = ChatMessage.query.filter_by(user_id=user_id)
+        if since_id is not None:
+            messages = query.filter(ChatMessage.id > since_id).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+        else:
+            if before_id is not None:
+                query = query.filter(ChatMessage.id < before_id)
+            messages = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+            if len(messages) <= limit:
+                # Hot rows ran out: keep scrolling back into the archive.
+                oldest_hot = messages[-1].id if messages else before_id
+                archived = [
+                    m for m in merge_archived(ChatMessage, user_id, [], time_attr="created_at")
+                    if oldest_hot is None or m.id < oldest_hot
+                ]
+                messages += archived[: limit + 1 - len(messages)]
+            has_more = len(messages) > limit
+            messages = list(reversed(messages[:limit]))
+
+        response = jsonify([m.to_dict() for m in messages])
+        response.set_etag(etag, weak=True)
+        response.headers["X-Chat-Last-Id"] = str(last_id)
+        response.headers["X-Chat-Has-More"] = "true" if has_more else "false"
+        return response
 
     @app.post("/api/chat/send")
     def chat_send():
@@ -845,99 +2770,30 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
                 return jsonify({"message": "Missing required fields"}), 400
 
             # 1. Save User Message
-            user_msg = ChatMessage(user_id=user_id, role="user", content=message)
-            db.session.add(user_msg)
-            db.session.commit()
-
-            # 2. Build Context
-            # Provide general knowledge base context
-            try:
-                from backend.knowledge_base import get_context
-            except ImportError:
-                return jsonify({"message": "Server configuration error: knowledge base missing"}), 500
-            kb_context = get_context()
-            
-            # Construct Prompt
-            system_instruction = f"""You are CogniWise AI, a helpful medical assistant for cognitive assessments.
-            Use the following knowledge base context to answer the user's questions.
-            
-            KNOWLEDGE BASE CONTEXT:
-            {kb_context}
-            
-            IMPORTANT INSTRUCTIONS:
-            1. **STRICT DOMAIN RESTRICTION**: You are a specialized medical assistant. You MUST NOT answer questions about general knowledge, politics, sports, movies, or current events (e.g., "Who is the PM?", "What is the capital of France?").
-            2. If a user asks a non-medical question, politely refuse and state: "I am CogniWise AI, specialized in cognitive health. I cannot answer general knowledge or political questions. Please ask me about brain health, ADHD, dementia, or cognitive assessments."
-            3. If the user asks in Kannada (or any other language), you MUST reply in that same language.
-            4. If the user asks to translate or explain an uploaded medical document, do so accurately in the requested language.
-            5. Keep responses concise, empathetic, and professional.
-            """
-            
-            # If user uploaded a PDF recently, we might want to include it. 
-            # For this simple implementation, we assume the PDF content was sent in the message or we rely on history if we had a vector db.
-            # But the requirement says "give option to upload the pdf". 
-            # We will handle PDF upload in /upload endpoint and append its content to the conversation history or context?
-            # A simple way: The /upload endpoint extracts text and saves it as a system message or hidden user message.
-            
-            if not os.getenv("GEMINI_API_KEY"):
-                return jsonify({"message": "Server configuration error: Gemini API Key missing"}), 500
-
-            # Use new google.genai SDK
+            user_msg = save_chat_message(user_id, "user", message)
+
+            # 2. Generate the reply, either in a background job or inline
+            if wants_async(data):
+                job_id = get_job_queue(app).enqueue(
+                    "chat",
+                    {"user_id": user_id, "message": message, "history": history, "message_id": user_msg.id},
+                    priority=10,
+                )
+                return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+            # Prompt uses the rolling summary + recent stored turns (bounded size)
+            summary, history = chat_prompt_context(user_id, history, exclude_id=user_msg.id)
             try:
-                from google import genai
-            except ImportError:
-                return jsonify({"message": "AI service unavailable: genai library missing"}), 500
-            client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-            
-            # Prepare chat history for the new SDK
-            # Format: contents=[Content(role='user', parts=[...]), ...]
-            # The SDK handles this slightly differently, but the simplest way is to just 
-            # concat history or use the chat interface if available. 
-            # For simplicity in this specialized context, let's construct the prompt with history manually 
-            # or use the simple generate_content with system instruction if supported by the model version.
-            
-            # Construct a full conversation prompt
-            full_prompt = system_instruction + "\n\n"
-            for h in history:
-                role_label = "User" if h["role"] == "user" else "Model"
-                full_prompt += f"{role_label}: {h['content']}\n"
-            
-            full_prompt += f"User: {message}\nModel:"
-
-            # List of models to try in order of preference
-            models_to_try = ['gemini-2.0-flash', 'gemini-flash-latest']
-            response_text = None
-            last_error = None
-
-            for model_name in models_to_try:
-                try:
-                    print(f"Attempting chat with model: {model_name}")
-                    response = client.models.generate_content(
-                        model=model_name, 
-                        contents=[full_prompt]
-                    )
-                    if hasattr(response, 'text') and response.text:
-                        response_text = response.text
-                        break # Success!
-                    else:
-                        print(f"Model {model_name} returned empty text.")
-                except Exception as e:
-                    print(f"Model {model_name} failed: {e}")
-                    last_error = e
-                    # If it's a quota error (429), we might want to fail fast or continue.
-                    # Usually 429 applies to the project, so switching models might not help if they share quota.
-                    # But if one is free tier and other is paid (unlikely here), or different buckets.
-                    # We continue to try the next model just in case.
-            
-            if not response_text:
-                error_msg = str(last_error) if last_error else "Unknown error"
-                if "429" in error_msg:
-                    return jsonify({"message": "AI Usage Limit Exceeded. Please wait a minute and try again."}), 429
-                return jsonify({"message": f"AI Service Unavailable: {error_msg}"}), 500
+                response_text = generate_chat_reply(message, history, summary)
+            except ChatServiceError as e:
+                headers = {}
+                if e.retry_after:
+                    headers["Retry-After"] = str(max(1, int(round(e.retry_after))))
+                return jsonify({"message": e.message}), e.status, headers
 
             # 3. Save Assistant Message
-            ai_msg = ChatMessage(user_id=user_id, role="assistant", content=response_text)
-            db.session.add(ai_msg)
-            db.session.commit()
+            save_chat_message(user_id, "assistant", response_text)
+            maybe_schedule_compaction(app, user_id)
 
             return jsonify({"response": response_text}), 200
         except Exception as e:
@@ -957,27 +2813,28 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
                 return jsonify({"message": "No selected file"}), 400
                 
             if file and user_id:
+                if wants_async(request.form):
+                    import base64
+
+                    payload = {
+                        "user_id": user_id,
+                        "filename": file.filename,
+                        "file_base64": base64.b64encode(file.read()).decode("ascii"),
+                    }
+                    job_id = get_job_queue(app).enqueue("pdf_upload", payload, priority=5)
+                    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
                 # Parse PDF
                 try:
-                    from pypdf import PdfReader
-                except ImportError:
-                    return jsonify({"message": "Server configuration error: PDF parser not available"}), 500
-
-                pdf_reader = PdfReader(file)
-                text_content = ""
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
-                
-                # Truncate if too long (simple protection)
-                text_content = text_content[:10000] 
+                    text_content = extract_pdf_text(file)
+                except RuntimeError as e:
+                    return jsonify({"message": str(e)}), 500
                 
                 summary = f"[User uploaded PDF content]:\n{text_content}\n[End of PDF]"
                 
                 # Save as a user message but with clear indication it is document context
                 # We save a larger portion of context for the AI to 'remember' it in chat history
-                msg = ChatMessage(user_id=user_id, role="user", content=f"I am uploading a document for analysis: {file.filename}.\n\nDocument Content:\n{text_content}\n\n[End of Document]\nPlease analyze this document and answer my questions about it.")
-                db.session.add(msg)
-                db.session.commit()
+                save_chat_message(user_id, "user", upload_message_content(file.filename, text_content))
                 
                 # We return the extracted text so frontend can optionally display or just acknowledge
                 return jsonify({"message": "File processed successfully", "extracted_text": summary}), 200
@@ -985,6 +2842,34 @@ def register_routes(app: Flask, serializer: URLSafeTimedSerializer):
         except Exception as e:
             return jsonify({"message": "Upload failed", "error": str(e)}), 500
 
+    @app.post("/api/jobs")
+    def enqueue_job():
+        data = request.get_json(force=True, silent=False) or {}
+        job_type = data.get("type")
+        queue = get_job_queue(app)
+        public_types = queue.public_job_types()
+        if job_type not in public_types:
+            return jsonify({"message": "Unknown job type", "job_types": public_types}), 400
+        try:
+            priority = int(data.get("priority", 0))
+        except (TypeError, ValueError):
+            return jsonify({"message": "Invalid priority"}), 400
+
+        job_id = queue.enqueue(job_type, data.get("payload") or {}, priority=priority)
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+    @app.get("/api/jobs/<job_id>")
+    def get_job(job_id: str):
+        queue = get_job_queue(app)
+        job = queue.get(job_id)
+        if not job:
+            return jsonify({"message": "Job not found"}), 404
+        if job["job_type"] not in queue.public_job_types():
+            error = admin_token_error()  # internal job results are for admins only
+            if error is not None:
+                return error
+        return jsonify(job), 200
+
 
 # Export app for Vercel Python runtime
 app = create_app()
@@ -0,0 +1,266 @@
+"""
+Hot/cold tiering for assessment and chat history.
+
+Rows older than the retention window are moved out of the hot tables into
+compressed, per-user archive batches (JSON rows, zlib or zstd).  A narrow
+``archived_records`` index maps every archived id to its batch so single
+records stay directly addressable, and the read endpoints merge archived
+rows back in transparently.
+
+Run incrementally (e.g. from cron):
+
+    python -m backend.archive --retention-days 365 --max-batches 200
+"""
+
+import argparse
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+# table name -> column used to decide the record's age
+ARCHIVABLE_TABLES = {
+    "assessment_results": "assessed_at",
+    "level2_results": "assessed_at",
+    "chat_messages": "created_at",
+}
+
+try:
+    import zstandard as _zstd
+except ImportError:  # optional dependency
+    _zstd = None
+
+
+def default_codec() -> str:
+    codec = os.getenv("ARCHIVE_CODEC", "zlib")
+    return codec if codec == "zlib" or _zstd is not None else "zlib"
+
+
+def encode_rows(rows: list, codec: str = "zlib") -> bytes:
+    raw = json.dumps(rows, separators=(",", ":"), default=_json_default).encode("utf-8")
+    if codec == "zstd":
+        return _zstd.ZstdCompressor(level=10).compress(raw)
+    return zlib.compress(raw, 9)
+
+
+def decode_rows(payload: bytes, codec: str) -> list:
+    if codec == "zstd":
+        if _zstd is None:
+            raise RuntimeError("zstandard is required to read zstd archive batches")
+        raw = _zstd.ZstdDecompressor().decompress(payload)
+    else:
+        raw = zlib.decompress(payload)
+    return json.loads(raw.decode("utf-8"))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+
+def row_values(record) -> dict:
+    return {col.name: getattr(record, col.name) for col in record.__table__.columns}
+
+
+def rebuild_record(model, values: dict):
+    """Build a detached ``model`` instance from archived column values (so ``to_dict()`` works)."""
+    kwargs = {}
+    for col in model.__table__.columns:
+        value = values.get(col.name)
+        if value is not None and col.type.python_type is datetime and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        kwargs[col.name] = value
+    return model(**kwargs)
+
+
+def archive_table(session, model, batch_model, index_model, cutoff: datetime,
+                  batch_size: int = 500, max_batches: int = None, codec: str = None, dry_run: bool = False) -> dict:
+    """
+    Move rows of ``model`` older than ``cutoff`` into per-user archive batches.
+
+    Each batch is moved in two commits, in this order: the ``batch_model``
+    row and its ``index_model`` entries first (on the primary), then the
+    deletion of exactly the ids that batch recorded from the hot table
+    (which may live on a shard, so the two cannot share a transaction).
+    A crash in between leaves rows both hot and archived, never lost; the
+    next run finds their ``index_model`` entries, skips them when building
+    batches and finishes the move by deleting the hot copies.  The newest
+    row of the table always stays hot so SQLite never hands out an archived
+    id again.
+    """
+    table = model.__tablename__
+    time_col = getattr(model, ARCHIVABLE_TABLES[table])
+    codec = codec or default_codec()
+    max_id = session.query(model.id).order_by(model.id.desc()).limit(1).scalar()
+    stats = {"table": table, "batches": 0, "rows": 0, "raw_bytes": 0, "stored_bytes": 0, "recovered": 0}
+    if max_id is None:
+        return stats
+
+    user_ids = [
+        user_id for (user_id,) in
+        session.query(model.user_id).filter(time_col < cutoff, model.id < max_id).distinct().all()
+    ]
+    for user_id in user_ids:
+        user_filter = model.user_id == user_id if user_id is not None else model.user_id.is_(None)
+        while max_batches is None or stats["batches"] < max_batches:
+            records = (
+                session.query(model)
+                .filter(user_filter, time_col < cutoff, model.id < max_id)
+                .order_by(model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not records:
+                break
+            archived = {
+                record_id for (record_id,) in
+                session.query(index_model.record_id).filter(
+                    index_model.table_name == table, index_model.record_id.in_([r.id for r in records]))
+            }
+            if archived:
+                # Left hot by an interrupted run: already in a committed batch.
+                if dry_run:
+                    records = [r for r in records if r.id not in archived]
+                    if not records:
+                        break
+                else:
+                    _delete_hot(session, model, sorted(archived))
+                    stats["recovered"] += len(archived)
+                    continue
+
+            rows = [row_values(r) for r in records]
+            payload = encode_rows(rows, codec)
+            stats["batches"] += 1
+            stats["rows"] += len(rows)
+            stats["raw_bytes"] += len(json.dumps(rows, default=_json_default))
+            stats["stored_bytes"] += len(payload)
+            if dry_run:
+                return stats
+
+            times = [getattr(r, time_col.key) for r in records]
+            batch = batch_model(
+                table_name=table,
+                user_id=user_id,
+                first_id=records[0].id,
+                last_id=records[-1].id,
+                row_count=len(records),
+                oldest_at=min(times),
+                newest_at=max(times),
+                codec=codec,
+                payload=payload,
+                created_at=datetime.utcnow(),
+            )
+            session.add(batch)
+            session.flush()
+            session.bulk_insert_mappings(
+                index_model,
+                [{"table_name": table, "record_id": r.id, "batch_id": batch.id, "user_id": user_id} for r in records],
+            )
+            session.commit()
+
+            recorded = [
+                record_id for (record_id,) in
+                session.query(index_model.record_id).filter(
+                    index_model.table_name == table, index_model.batch_id == batch.id)
+            ]
+            _delete_hot(session, model, recorded)
+    return stats
+
+
+def _delete_hot(session, model, ids: list):
+    session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    session.commit()
+
+
+def archived_records_for_user(session, batch_model, model, user_id: str) -> list:
+    """All archived rows of ``model`` for one user, as detached instances (oldest batch first)."""
+    batches = (
+        session.query(batch_model)
+        .filter(batch_model.table_name == model.__tablename__, batch_model.user_id == user_id)
+        .order_by(batch_model.first_id)
+        .all()
+    )
+    out = []
+    for batch in batches:
+        out.extend(rebuild_record(model, row) for row in decode_rows(batch.payload, batch.codec))
+    return out
+
+
+def find_archived_record(session, batch_model, index_model, model, record_id: int):
+    entry = session.query(index_model).get((model.__tablename__, int(record_id)))
+    if entry is None:
+        return None
+    batch = session.query(batch_model).get(entry.batch_id)
+    for row in decode_rows(batch.payload, batch.codec):
+        if row["id"] == int(record_id):
+            return rebuild_record(model, row)
+    return None
+
+
+def archive_stats(session, batch_model) -> dict:
+    rows = (
+        session.query(
+            batch_model.table_name,
+            func.count(batch_model.id),
+            func.sum(batch_model.row_count),
+            func.sum(func.length(batch_model.payload)),
+            func.max(batch_model.newest_at),
+        )
+        .group_by(batch_model.table_name)
+        .all()
+    )
+    return {
+        table: {"batches": batches, "rows": int(count or 0), "stored_bytes": int(size or 0),
+                "newest_archived_at": newest.isoformat() if newest else None}
+        for table, batches, count, size, newest in rows
+    }
+
+
+def run_archival(retention_days: int, tables=None, batch_size: int = 500, max_batches: int = None,
+                 dry_run: bool = False) -> list:
+    """Archive every configured table inside an app context; used by the CLI."""
+    try:
+        from app import app, db, init_db, AssessmentResult, Level2Result, ChatMessage, ArchiveBatch, ArchivedRecord
+        from sharding import each_shard
+    except ImportError:
+        from backend.app import app, db, init_db, AssessmentResult, Level2Result, ChatMessage, ArchiveBatch, ArchivedRecord
+        from backend.sharding import each_shard
+
+    models = {m.__tablename__: m for m in (AssessmentResult, Level2Result, ChatMessage)}
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    results = []
+    init_db(app)
+    with app.app_context():
+        for table in tables or ARCHIVABLE_TABLES:
+            for shard in each_shard():  # once per shard with sharded storage (sharding.py)
+                stats = archive_table(db.session, models[table], ArchiveBatch, ArchivedRecord, cutoff,
+                                      batch_size=batch_size, max_batches=max_batches, dry_run=dry_run)
+                if shard is not None:
+                    stats["shard"] = shard
+                results.append(stats)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old rows into compressed archive batches.")
+    parser.add_argument("--retention-days", type=int, default=int(os.getenv("ARCHIVE_RETENTION_DAYS", "365")))
+    parser.add_argument("--tables", nargs="*", choices=sorted(ARCHIVABLE_TABLES))
+    parser.add_argument("--batch-size", type=int, default=500, help="max rows per archive batch")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches per table")
+    parser.add_argument("--dry-run", action="store_true", help="report the first batch per table without writing")
+    args = parser.parse_args(argv)
+
+    for stats in run_archival(args.retention_days, args.tables, args.batch_size, args.max_batches, args.dry_run):
+        ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        where = f" (shard {stats['shard']})" if "shard" in stats else ""
+        print(f"{stats['table']}{where}: {stats['rows']} rows in {stats['batches']} batches "
+              f"({stats['raw_bytes']} -> {stats['stored_bytes']} bytes, {ratio:.1f}x)")
+        if stats["recovered"]:
+            print(f"  removed {stats['recovered']} hot rows already archived by an interrupted run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+ASGI serving mode for CogniWise Scan.
+
+The chat, upload and report endpoints are served by native async handlers
+(async Gemini client via ``GeminiGateway.generate_async`` and aiosqlite),
+so a chat turn waiting on Gemini no longer pins a worker thread.  Every
+other route, and any request the async path cannot serve (non-SQLite
+databases, sharded storage, ``async=1`` job submissions, archived
+reports), is replayed
+into the unchanged Flask app through asgiref's WSGI adapter.  Successful
+async writes set the same read-your-writes cookie as ``replica.track_writes``.
+
+    pip install -r backend/requirements.txt   # asgiref, aiosqlite, uvicorn
+    uvicorn backend.asgi:app --port 5000
+
+``bench_asgi.py`` compares concurrent chat capacity with the sync app.
+"""
+
+import asyncio
+import io
+import json
+import re
+import time
+from datetime import datetime
+
+import aiosqlite
+from asgiref.wsgi import WsgiToAsgi
+
+try:
+    import app as backend_app
+    from gemini_client import GeminiUnavailable, get_gateway
+    from chat_events import notifier as chat_notifier
+    import chat_summary
+    import chat_codec
+    import replica
+except ImportError:
+    from backend import app as backend_app
+    from backend.gemini_client import GeminiUnavailable, get_gateway
+    from backend.chat_events import notifier as chat_notifier
+    from backend import chat_summary, chat_codec, replica
+
+flask_app = backend_app.app
+
+_REPORT_RE = re.compile(r"^/api/reports/(?P<result_type>[^/]+)/(?P<id>[^/]+)/pdf$")
+
+
+class _Fallback(Exception):
+    """Raised by an async handler to hand the (buffered) request to the WSGI app."""
+
+
+def _sqlite_path(uri: str):
+    if not uri.startswith("sqlite:///") or uri.endswith(":memory:"):
+        return None
+    return uri[len("sqlite:///"):]
+
+
+def _db_timestamp() -> str:
+    # Same text format SQLAlchemy uses for DateTime columns on SQLite.
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class AsyncStore:
+    """Lazily opened aiosqlite connection shared by the async handlers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    async def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            async with self._lock:
+                if self._conn is None:
+                    conn = await aiosqlite.connect(self.path, timeout=30)
+                    conn.row_factory = aiosqlite.Row
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    self._conn = conn
+        return self._conn
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def fetchall(self, sql: str, params=()):
+        conn = await self.conn()
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchall()
+
+    async def fetchone(self, sql: str, params=()):
+        conn = await self.conn()
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def insert_chat_message(self, user_id: str, role: str, content: str) -> int:
+        conn = await self.conn()
+        async with self._lock:
+            cursor = await conn.execute(
+                "INSERT INTO chat_messages (user_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, role, chat_codec.encode(content), _db_timestamp()),
+            )
+            await conn.commit()
+        chat_notifier.notify(user_id)
+        return cursor.lastrowid
+
+    async def chat_prompt_context(self, user_id: str, client_history: list, exclude_id: int):
+        """Async mirror of ``app.chat_prompt_context``."""
+        summary_row = await self.fetchone(
+            "SELECT summary, summarized_through_id FROM chat_summaries WHERE user_id = ?", (user_id,)
+        )
+        through_id = summary_row["summarized_through_id"] if summary_row else 0
+        rows = await self.fetchall(
+            "SELECT role, content FROM chat_messages WHERE user_id = ? AND id > ? AND id != ?"
+            " ORDER BY id DESC LIMIT ?",
+            (user_id, through_id, exclude_id, chat_summary.KEEP_RECENT * 2),
+        )
+        if not rows and not summary_row:
+            return None, client_history
+        history = [{"role": r["role"], "content": chat_codec.decode(r["content"])} for r in reversed(rows)]
+        return (summary_row["summary"] if summary_row else None), history
+
+
+def record_from_row(model, row):
+    """Detached ORM instance from a raw SQLite row, with the column types SQLAlchemy would produce."""
+    values = {}
+    for col in model.__table__.columns:
+        value = row[col.name]
+        python_type = col.type.python_type
+        if value is not None:
+            if python_type is datetime and isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            elif python_type is bool:
+                value = bool(value)
+        values[col.name] = value
+    return model(**values)
+
+
+class AsyncApp:
+    def __init__(self, wsgi_app):
+        self.flask_app = wsgi_app
+        self.wsgi = WsgiToAsgi(wsgi_app)
+        path = _sqlite_path(wsgi_app.config["SQLALCHEMY_DATABASE_URI"])
+        # chat rows live on the shards with sharded storage, which only the Flask app routes
+        self.store = AsyncStore(path) if path and "shards" not in wsgi_app.extensions else None
+        self.routes = {
+            ("POST", "/api/chat/send"): self.chat_send,
+            ("POST", "/api/chat/upload"): self.chat_upload,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http" or self.store is None:
+            return await self.wsgi(scope, receive, send)
+
+        handler = self.routes.get((scope["method"], scope["path"]))
+        kwargs = {}
+        if handler is None and scope["method"] == "GET":
+            match = _REPORT_RE.match(scope["path"])
+            if match:
+                handler, kwargs = self.report_pdf, match.groupdict()
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+
+        if _db_init_pending(self.flask_app):
+            # Native handlers query SQLite directly, so honour DB_INIT=lazy here too.
+            await asyncio.to_thread(backend_app.init_db, self.flask_app)
+        body = await _read_body(receive)
+        try:
+            status, payload, headers = await handler(scope, body, **kwargs)
+        except _Fallback:
+            return await self.wsgi(scope, _replay(body), send)
+        except Exception as e:
+            status, payload, headers = 500, {"message": "Server error", "error": str(e)}, {}
+        await _respond(scope, send, status, payload, headers)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.store is not None:
+                    await self.store.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _track_write(self, user_id: str) -> dict:
+        """Headers for a successful write: ``replica.track_writes`` for the async handlers."""
+        router = self.flask_app.extensions.get("read_router")
+        if router is None:
+            return {}
+        now = time.time()
+        router.note_write(user_id, now)
+        return {"Set-Cookie": f"{replica.STICKY_COOKIE}={now:.3f}; HttpOnly; Max-Age=3600; Path=/; SameSite=Lax"}
+
+    # -- handlers -----------------------------------------------------------
+
+    async def chat_send(self, scope, body: bytes):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"message": "Invalid JSON"}, {}
+        if _query_flag(scope, "async") or str(data.get("async")).lower() in ("1", "true", "yes"):
+            raise _Fallback()  # job submission stays on the sync path
+        user_id = data.get("user_id")
+        message = data.get("message")
+        history = data.get("history", [])
+        if not user_id or not message:
+            return 400, {"message": "Missing required fields"}, {}
+
+        message_id = await self.store.insert_chat_message(user_id, "user", message)
+
+        if not _gemini_configured():
+            return 500, {"message": "Server configuration error: Gemini API Key missing"}, {}
+        summary, history = await self.store.chat_prompt_context(user_id, history, message_id)
+        prompt = backend_app.build_chat_prompt(message, history, summary)
+        try:
+            response_text = await get_gateway().generate_async(prompt)
+        except GeminiUnavailable as e:
+            headers = {"Retry-After": str(max(1, int(round(e.retry_after))))} if e.retry_after else {}
+            return e.status, {"message": e.message}, headers
+
+        await self.store.insert_chat_message(user_id, "assistant", response_text)
+        await asyncio.to_thread(_schedule_compaction, user_id)
+        return 200, {"response": response_text}, self._track_write(user_id)
+
+    async def chat_upload(self, scope, body: bytes):
+        from werkzeug.formparser import parse_form_data
+
+        headers = dict(scope["headers"])
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "CONTENT_TYPE": headers.get(b"content-type", b"").decode("latin-1"),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+        }
+        _, form, files = parse_form_data(environ)
+        if _query_flag(scope, "async") or str(form.get("async")).lower() in ("1", "true", "yes"):
+            raise _Fallback()
+        if "file" not in files:
+            return 400, {"message": "No file part"}, {}
+        file = files["file"]
+        user_id = form.get("user_id")
+        if file.filename == "":
+            return 400, {"message": "No selected file"}, {}
+        if not user_id:
+            raise _Fallback()  # keep the sync endpoint's behaviour for this edge case
+
+        try:
+            text_content = await asyncio.to_thread(backend_app.extract_pdf_text, file.stream)
+        except RuntimeError as e:
+            return 500, {"message": str(e)}, {}
+        await self.store.insert_chat_message(
+            user_id, "user", backend_app.upload_message_content(file.filename, text_content)
+        )
+        summary = f"[User uploaded PDF content]:\n{text_content}\n[End of PDF]"
+        return 200, {"message": "File processed successfully", "extracted_text": summary}, self._track_write(user_id)
+
+    async def report_pdf(self, scope, body: bytes, result_type: str, id: str):
+        if _query_flag(scope, "async"):
+            raise _Fallback()
+        model = backend_app.REPORT_MODELS.get(result_type)
+        if model is None:
+            return 400, {"message": "Invalid report type"}, {}
+        row = await self.store.fetchone(f"SELECT * FROM {model.__tablename__} WHERE id = ?", (id,))
+        if row is None:
+            raise _Fallback()  # may live in the archive; the sync path knows how to find it
+
+        data, title = backend_app.report_data(result_type, record_from_row(model, row))
+        try:
+            pdf = await asyncio.to_thread(backend_app.render_report, self.flask_app, data, title)
+        except backend_app.report_renderer.ReportPoolBusy as e:
+            retry_after = str(max(1, int(round(e.retry_after))))
+            return 503, {"message": "Report renderer busy, retry later"}, {"Retry-After": retry_after}
+        except backend_app.report_renderer.ReportTimeout as e:
+            return 504, {"message": str(e)}, {}
+        return 200, pdf, {
+            "Content-Type": "application/pdf",
+            "Content-Disposition": f"attachment; filename=report_{result_type}_{id}.pdf",
+        }
+
+
+def _db_init_pending(wsgi_app) -> bool:
+    return wsgi_app.config.get("DB_INIT") == "lazy" and not wsgi_app.extensions.get("cogniwise_db_ready")
+
+
+def _gemini_configured() -> bool:
+    import os
+
+    return os.getenv("GEMINI_BACKEND") == "fake" or bool(os.getenv("GEMINI_API_KEY"))
+
+
+def _schedule_compaction(user_id: str):
+    with flask_app.app_context():
+        backend_app.maybe_schedule_compaction(flask_app, user_id)
+
+
+def _query_flag(scope, name: str) -> bool:
+    from urllib.parse import parse_qs
+
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name, [])
+    return bool(values) and values[0].lower() in ("1", "true", "yes")
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _replay(body: bytes):
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+async def _respond(scope, send, status: int, payload, headers: dict):
+    if isinstance(payload, (bytes, bytearray)):
+        body = bytes(payload)
+    else:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", **headers}
+    headers["Content-Length"] = str(len(body))
+    # Mirror the Flask app's permissive CORS policy.
+    origin = dict(scope["headers"]).get(b"origin")
+    headers["Access-Control-Allow-Origin"] = origin.decode("latin-1") if origin else "*"
+    if origin:
+        headers["Access-Control-Allow-Credentials"] = "true"
+        headers["Vary"] = "Origin"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+app = AsyncApp(flask_app)
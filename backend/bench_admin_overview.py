@@ -0,0 +1,113 @@
+"""
+Opening a user in the admin dashboard: the four calls it used to make one
+after another (admin assessments, Level-2 results, progress, chat history)
+against the single ``/api/admin/users/<user_id>/overview`` request, in
+full and with a projection of the columns the user view shows.
+
+Users get ``--results`` Level-1 results, a few Level-2 results and
+``--messages`` chat messages in a temporary SQLite database; reports
+latency per dashboard open and the SQL statements each way issues.
+
+    python backend/bench_admin_overview.py --users 100 --results 40 --messages 200
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECTION = ("include=level1,level2,level3,chat&fields=level1.id,level1.condition_type,level1.risk_score,"
+              "level1.risk_level,level1.admin_notes,level1.assessed_at,level2.id,level2.domain_scores,"
+              "level2.final_risk_percent,level2.assessed_at")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-request admin user overview.")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--results", type=int, default=40, help="Level-1 results per user")
+    parser.add_argument("--messages", type=int, default=200, help="chat messages per user")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-overview-")
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'overview.db')}",
+                      JOBS_DB_PATH=os.path.join(tmp, "jobs.db"))
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:0] = [here, os.path.dirname(here)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    from sqlalchemy import event
+
+    rng = random.Random(9)
+    users = [f"patient-{u}" for u in range(args.users)]
+    with A.app.app_context():
+        for user_id in users:
+            for _ in range(args.results):
+                features = {f"q{k}": rng.randint(1, 5) for k in range(20)}
+                p = A.calculate_risk("adhd", features)
+                A.db.session.add(A.AssessmentResult(
+                    user_id=user_id, user_name=user_id, condition_type="adhd", age_group="adult",
+                    questionnaire_responses=json.dumps({k: str(v) for k, v in features.items()}),
+                    ml_features=json.dumps(features), risk_score=p["risk_score"], risk_level=p["risk_level"],
+                    risk_label=p["risk_label"], requires_level2=p["requires_level2"]))
+            for _ in range(3):
+                A.db.session.add(A.Level2Result(
+                    user_id=user_id, age_group="adult",
+                    raw_metrics=json.dumps({f"game{g}_rt_{k}": rng.random() * 900 for g in range(4) for k in range(12)}),
+                    domain_scores=json.dumps({d: rng.random() for d in ("attention", "memory", "executive")}),
+                    final_risk_score=rng.random(), final_risk_percent=rng.random() * 100))
+            A.db.session.add(A.UserLevelProgress(user_id=user_id, level1_completed=True, level2_unlocked=True))
+            for i in range(args.messages):
+                A.db.session.add(A.ChatMessage(user_id=user_id, role="user" if i % 2 == 0 else "assistant",
+                                               content=" ".join(["Could you explain the result?"] * rng.randint(1, 20))))
+            A.db.session.commit()
+
+    client = A.app.test_client()
+    token = client.post("/api/admin/login", json={"email": A.app.config["ADMIN_EMAIL"],
+                                                  "password": A.app.config["ADMIN_PASSWORD"]}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    statements = [0]
+    with A.app.app_context():
+        event.listen(A.db.engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    def sequential(user_id):
+        size = 0
+        for url in (f"/api/admin/users/{user_id}/assessments", f"/api/level2/results/{user_id}",
+                    f"/api/progress/{user_id}", f"/api/chat/history?user_id={user_id}&limit=50"):
+            r = client.get(url, headers=headers)
+            assert r.status_code == 200, (url, r.status_code)
+            size += len(r.data)
+        return size
+
+    def overview(query):
+        def call(user_id):
+            r = client.get(f"/api/admin/users/{user_id}/overview?{query}", headers=headers)
+            assert r.status_code == 200, r.status_code
+            return len(r.data)
+        return call
+
+    print(f"{args.users} users x ({args.results} Level-1 + 3 Level-2 results, {args.messages} chat messages)\n")
+    print(f"{'dashboard open':<24} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'SQL':>5} {'KB':>7}")
+    for name, requests, fn in (("4 sequential calls", 4, sequential), ("overview", 1, overview("")),
+                               ("overview, projected", 1, overview(PROJECTION))):
+        fn(users[0])  # warm-up
+        samples, sizes = [], []
+        statements[0] = 0
+        for n in range(args.repeat):
+            started = time.perf_counter()
+            sizes.append(fn(users[n % len(users)]))
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        print(f"{name:<24} {requests:>8} {statistics.median(samples) * 1000:>8.2f} "
+              f"{samples[int(len(samples) * 0.99) - 1] * 1000:>8.2f} {statements[0] / args.repeat:>5.1f} "
+              f"{statistics.mean(sizes) / 1024:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Concurrent chat capacity: threaded Flask (WSGI) vs the ASGI serving mode.
+
+Both sides run one process against a fake Gemini backend with a fixed
+latency, so the numbers show how many chat turns can be in flight at once,
+not Gemini's own speed.
+
+    python backend/bench_asgi.py --users 8 64 256 --latency 0.5 --threads 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _setup_env(latency: float):
+    tmp = tempfile.mkdtemp(prefix="cogniwise-bench-")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        JOBS_DB_PATH=os.path.join(tmp, "jobs.db"),
+        GEMINI_BACKEND="fake",
+        GEMINI_FAKE_LATENCY=str(latency),
+        GEMINI_RPM="1000000",
+        GEMINI_BURST="100000",
+        GEMINI_MAX_QUEUE="100000",
+        CHAT_SUMMARY_THRESHOLD_CHARS="100000000",
+    )
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_sync(flask_app, users: int, threads: int) -> dict:
+    client = flask_app.test_client()
+
+    def one(i):
+        started = time.perf_counter()
+        r = client.post("/api/chat/send", json={"user_id": f"sync-{i}", "message": "How can I improve memory?"})
+        assert r.status_code == 200, r.get_json()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = list(pool.map(one, range(users)))
+    return {"elapsed": time.perf_counter() - started, "latencies": latencies}
+
+
+def bench_async(asgi_app, users: int) -> dict:
+    async def one(i):
+        body = json.dumps({"user_id": f"async-{i}", "message": "How can I improve memory?"}).encode()
+        scope = {"type": "http", "method": "POST", "path": "/api/chat/send", "query_string": b"",
+                 "headers": [(b"content-type", b"application/json")]}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        started = time.perf_counter()
+        await asgi_app(scope, receive, send)
+        assert sent[0]["status"] == 200, sent
+        return time.perf_counter() - started
+
+    async def run():
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+        await asgi_app.store.close()
+        return {"elapsed": elapsed, "latencies": latencies}
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[8, 64, 256])
+    parser.add_argument("--latency", type=float, default=0.5, help="fake Gemini latency in seconds")
+    parser.add_argument("--threads", type=int, default=8, help="worker threads for the sync server")
+    args = parser.parse_args()
+
+    _setup_env(args.latency)
+    import builtins
+
+    quiet_print = builtins.print
+    builtins.print = lambda *a, **k: None  # silence per-call model logging
+    try:
+        import asgi
+    finally:
+        builtins.print = quiet_print
+
+    print(f"fake Gemini latency {args.latency}s, sync server threads={args.threads}")
+    print(f"{'users':>6} {'mode':>6} {'elapsed s':>10} {'turns/s':>8} {'p50 s':>7} {'p95 s':>7}")
+    for users in args.users:
+        builtins.print = lambda *a, **k: None
+        try:
+            results = {
+                "sync": bench_sync(asgi.flask_app, users, args.threads),
+                "asgi": bench_async(asgi.AsyncApp(asgi.flask_app), users),
+            }
+        finally:
+            builtins.print = quiet_print
+        for mode, r in results.items():
+            print(f"{users:>6} {mode:>6} {r['elapsed']:>10.2f} {users / r['elapsed']:>8.1f} "
+                  f"{_percentile(r['latencies'], 0.5):>7.2f} {_percentile(r['latencies'], 0.95):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Database size and chat read latency before and after compressing stored
+chat bodies (chat_codec.py).
+
+Builds a chat corpus shaped like production traffic in a temporary SQLite
+database with compression off: mostly short user turns, long model
+answers and the occasional PDF upload (up to 10 KB of extracted text),
+written from the knowledge-base vocabulary so it compresses like real
+prose rather than random bytes.  Then measures the file size (after
+VACUUM) and the latency of ``/api/chat/history`` and of prompt assembly,
+runs the in-place migration and measures again.
+
+    python backend/bench_chat_compression.py --users 300 --messages 60
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def sentences():
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, here)
+    from knowledge_base import KNOWLEDGE_BASE
+
+    out = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+        elif isinstance(node, str):
+            out.extend(s.strip() + "." for s in node.split(".") if len(s.strip()) > 10)
+
+    walk(KNOWLEDGE_BASE)
+    return out
+
+
+def corpus_message(rng, pool: list, i: int):
+    kind = rng.random()
+    if kind < 0.03:  # PDF upload: extracted report text
+        pages = []
+        for page in range(rng.randint(2, 5)):
+            lines = [f"Page {page + 1}", f"Patient ref {rng.randint(10000, 99999)}  Date {rng.randint(1, 28)}/0{rng.randint(1, 9)}/2024"]
+            lines += [rng.choice(pool) + f" Score: {rng.randint(0, 40)}/40." for _ in range(rng.randint(12, 30))]
+            pages.append("\n".join(lines))
+        text = "\n\n".join(pages)[:10000]
+        return "user", ("I am uploading a document for analysis: report.pdf.\n\nDocument Content:\n" + text +
+                        "\n\n[End of Document]\nPlease analyze this document and answer my questions about it.")
+    if i % 2 == 0:
+        return "user", " ".join(rng.choice(pool) for _ in range(rng.randint(1, 2)))
+    paragraphs = ["\n".join(f"* {rng.choice(pool)}" if rng.random() < 0.4 else rng.choice(pool)
+                            for _ in range(rng.randint(3, 8))) for _ in range(rng.randint(1, 5))]
+    return "assistant", "\n\n".join(paragraphs)
+
+
+def measure(A, path: str, users: list, repeat: int) -> dict:
+    with A.app.app_context():
+        with A.db.engine.connect() as connection:
+            connection.exec_driver_sql("VACUUM")
+    client = A.app.test_client()
+    rng = random.Random(3)
+    history, prompt = [], []
+    for _ in range(repeat):
+        user_id = rng.choice(users)
+        started = time.perf_counter()
+        r = client.get(f"/api/chat/history?user_id={user_id}&limit=50")
+        history.append(time.perf_counter() - started)
+        assert r.status_code == 200 and r.get_json(), r.status_code
+        with A.app.app_context():
+            started = time.perf_counter()
+            A.chat_prompt_context(user_id, [])
+            prompt.append(time.perf_counter() - started)
+    history.sort()
+    return {"bytes": os.path.getsize(path), "history_p50_ms": statistics.median(history) * 1000,
+            "history_p99_ms": history[int(len(history) * 0.99) - 1] * 1000,
+            "prompt_p50_ms": statistics.median(prompt) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed chat message storage.")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=60, help="messages per user")
+    parser.add_argument("--repeat", type=int, default=400, help="history reads per measurement")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default="zlib")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-chatz-")
+    path = os.path.join(tmp, "chat.db")
+    os.environ.update(DATABASE_URL=f"sqlite:///{path}", JOBS_DB_PATH=os.path.join(tmp, "jobs.db"),
+                      CHAT_CODEC=args.codec)
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:0] = [here, os.path.dirname(here)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    codec = A.chat_codec
+
+    threshold, codec.MIN_CHARS = codec.MIN_CHARS, 0  # write the corpus the way it was stored before
+    pool = sentences()
+    rng = random.Random(7)
+    users = [f"chat-user-{u}" for u in range(args.users)]
+    raw = 0
+    with A.app.app_context():
+        for user_id in users:
+            for i in range(args.messages):
+                role, content = corpus_message(rng, pool, i)
+                raw += len(content.encode("utf-8"))
+                A.db.session.add(A.ChatMessage(user_id=user_id, role=role, content=content,
+                                               created_at=datetime.utcnow()))
+            A.db.session.commit()
+    total = args.users * args.messages
+    print(f"{total:,} messages from {args.users} users, {raw / 1e6:.1f} MB of text, "
+          f"threshold {threshold} chars, codec {codec.codec()}\n")
+
+    before = measure(A, path, users, args.repeat)
+    codec.MIN_CHARS = threshold
+    with A.app.app_context():
+        stats = A.compress_chat_messages()
+    after = measure(A, path, users, args.repeat)
+
+    with A.app.app_context():
+        sample = A.ChatMessage.query.filter_by(user_id=users[0]).order_by(A.ChatMessage.id).all()
+    rng = random.Random(7)
+    expected = [corpus_message(rng, pool, i)[1] for i in range(args.messages)]
+    intact = [m.content for m in sample] == expected
+
+    print(f"{'storage':<12} {'db MB':>7} {'history p50 ms':>15} {'p99 ms':>8} {'prompt p50 ms':>14}")
+    for name, r in (("plain", before), ("compressed", after)):
+        print(f"{name:<12} {r['bytes'] / 1e6:>7.2f} {r['history_p50_ms']:>15.2f} {r['history_p99_ms']:>8.2f} "
+              f"{r['prompt_p50_ms']:>14.2f}")
+    print(f"\nmigration: {stats['compressed']:,} of {total:,} messages compressed "
+          f"({stats['raw_bytes'] / 1e6:.1f} MB -> {stats['stored_bytes'] / 1e6:.1f} MB) in {stats['seconds']:.2f}s; "
+          f"database {before['bytes'] / after['bytes']:.2f}x smaller; round trip {'ok' if intact else 'MISMATCH'}")
+    if not intact:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Referral lookup cost on a synthetic directory (entries clustered around a
+few hundred "cities" plus a uniform rural spread).
+
+Reports load time, k-nearest and within-radius latency of the grid index
+against a full NumPy haversine scan, checks both return the same entries
+(exits non-zero if not), and times the HTTP endpoint end to end.
+
+    python backend/bench_directory.py --entries 200000
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SPECIALTY_TEXT = ["Neurologist", "Geriatric Specialist", "Psychiatrist (ADHD/ASD)", "Child Psychiatrist",
+                  "Memory Clinic", "General Practitioner"]
+
+
+def write_dataset(path: str, entries: int, seed: int) -> list:
+    rng = random.Random(seed)
+    cities = [(rng.uniform(-55, 65), rng.uniform(-170, 175)) for _ in range(300)]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "kind", "specialty", "lat", "lon", "phone", "emergency_contact", "address", "rating"])
+        for i in range(entries):
+            if rng.random() < 0.9:
+                clat, clon = rng.choice(cities)
+                lat = max(-89.9, min(89.9, rng.gauss(clat, 0.3)))
+                lon = (rng.gauss(clon, 0.4) + 180.0) % 360.0 - 180.0
+            else:
+                lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+            kind = "hospital" if rng.random() < 0.2 else "doctor"
+            specialty = "Emergency" if kind == "hospital" and rng.random() < 0.5 else rng.choice(SPECIALTY_TEXT)
+            writer.writerow([f"{kind}-{i}", kind, specialty, f"{lat:.5f}", f"{lon:.5f}", f"+1-555-{i:07d}",
+                             "911" if kind == "hospital" else "", f"{i} Main St", f"{rng.uniform(3, 5):.1f}"])
+    return cities
+
+
+def brute_force(index, lat, lon, mask, k=None, radius=None):
+    """Full scan over every entry of the kind: the baseline and the reference answer."""
+    import numpy as np
+    positions = np.arange(len(index))
+    if mask:
+        positions = positions[(index.mask & mask) != 0]
+    distances = index._distances(positions, lat, lon)
+    if radius is not None:
+        keep = distances <= radius
+        positions, distances = positions[keep], distances[keep]
+    order = np.argsort(distances, kind="stable")
+    if k is not None:
+        order = order[:k]
+    return [(float(distances[i]), index.entries[positions[i]]) for i in order]
+
+
+def timed(fn, queries) -> tuple:
+    latencies, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        results.append(fn(*q))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return results, statistics.median(latencies) * 1e3, latencies[int(len(latencies) * 0.99) - 1] * 1e3
+
+
+def same(a, b) -> bool:
+    # equal distances may come back in either order; compare the distance lists and the entry sets
+    return (len(a) == len(b) and all(math.isclose(x[0], y[0], abs_tol=1e-9) for x, y in zip(a, b))
+            and {id(x[1]) for x in a} == {id(y[1]) for y in b})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the doctor/hospital directory index.")
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-directory-")
+    path = os.path.join(tmp, "directory.csv")
+    cities = write_dataset(path, args.entries, args.seed)
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'directory.db')}",
+                      JOBS_DB_PATH=os.path.join(tmp, "jobs.db"), DIRECTORY_PATH=path)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import directory as D
+
+    started = time.perf_counter()
+    directory = D.load_directory(path)
+    print(f"loaded {len(directory)} entries ({directory.stats()['doctors']} doctors, "
+          f"{directory.stats()['hospitals']} hospitals) in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(args.seed + 1)
+    doctors = directory.indexes["doctor"]
+    queries = []
+    for _ in range(args.queries):
+        clat, clon = rng.choice(cities) if rng.random() < 0.8 else (rng.uniform(-60, 70), rng.uniform(-180, 180))
+        mask = D.specialty_mask(rng.choice(["", "neurologist", "geriatric", "adhd_asd_psychiatrist", "dementia"]))
+        queries.append((clat + rng.gauss(0, 0.2), clon + rng.gauss(0, 0.2), mask))
+
+    mismatches = 0
+    print(f"\n{'query':<22} {'index p50':>10} {'p99':>8} {'scan p50':>10} {'p99':>8}   (ms)")
+    for label, grid, scan in (
+        ("10 nearest", lambda la, lo, m: doctors.nearest(la, lo, 10, m),
+         lambda la, lo, m: brute_force(doctors, la, lo, m, k=10)),
+        ("within 25 km", lambda la, lo, m: doctors.within(la, lo, 25.0, m),
+         lambda la, lo, m: brute_force(doctors, la, lo, m, radius=25.0)),
+        ("within 100 km", lambda la, lo, m: doctors.within(la, lo, 100.0, m),
+         lambda la, lo, m: brute_force(doctors, la, lo, m, radius=100.0)),
+    ):
+        got, g50, g99 = timed(grid, queries)
+        want, s50, s99 = timed(scan, queries)
+        mismatches += sum(not same(a, b) for a, b in zip(got, want))
+        print(f"{label:<22} {g50:>10.3f} {g99:>8.3f} {s50:>10.3f} {s99:>8.3f}")
+    print(f"mismatches vs full scan: {mismatches}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    client = A.app.test_client()
+    urls = [f"/api/level3/find_doctors?lat={la:.5f}&lon={lo:.5f}&specialty=neurologist" for la, lo, _ in queries[:500]]
+    client.get(urls[0])  # loads the dataset
+    _, h50, h99 = timed(lambda url: client.get(url).get_json(), [(u,) for u in urls])
+    print(f"\nGET find_doctors (10 nearest neurologists): p50 {h50:.2f} ms  p99 {h99:.2f} ms")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Burst of concurrent submissions against a file-backed SQLite database, with
+per-request commits and with GROUP_COMMIT (group_commit.py).
+
+Each simulated client posts Level-1 and Level-2 submissions back to back
+(a class screening session); reports submissions/s, latency percentiles,
+failed requests, commits issued and the writer's mean batch size, then
+checks that every acknowledged submission is in the database and that a
+failing unit in a batch only fails itself.
+
+    python backend/bench_group_commit.py --clients 32 --per-client 25
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def burst(A, clients: int, per_client: int, seed: int) -> dict:
+    latencies, errors, acked = [], [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(n):
+        rng = random.Random(seed * 1000 + n)
+        http = A.app.test_client()
+        mine, failed, ok = [], [], 0
+        barrier.wait()
+        for i in range(per_client):
+            user_id = f"student-{n}-{i % 3}"
+            started = time.perf_counter()
+            if i % 4 == 3:
+                r = http.post("/api/level2/submit", json={
+                    "user_id": user_id, "age_group": "child",
+                    "game_scores": {f"game{g}": rng.random() for g in (1, 2, 3)}})
+            else:
+                r = http.post("/api/submit-level1", json={
+                    "user_id": user_id, "condition": rng.choice(["adhd", "asd"]), "age": rng.randint(6, 12),
+                    "features": {f"q{k}": rng.randint(1, 5) for k in range(20)}})
+            mine.append(time.perf_counter() - started)
+            if r.status_code == 200:
+                ok += 1
+            else:
+                failed.append(r.get_json() or r.status_code)
+        with lock:
+            latencies.extend(mine)
+            errors.extend(failed)
+            acked.append(ok)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+        "acked": sum(acked),
+    }
+
+
+def stored(A) -> int:
+    with A.app.app_context():
+        return A.AssessmentResult.query.count() + A.Level2Result.query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark group commit under a burst of submissions.")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--per-client", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-group-")
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'group.db')}",
+                      JOBS_DB_PATH=os.path.join(tmp, "jobs.db"))
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:0] = [here, os.path.dirname(here)]  # submit_level2 imports backend.level2_logic
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+
+    total = args.clients * args.per_client
+    print(f"{args.clients} clients x {args.per_client} submissions ({total} total), 3 commits' worth of writes each\n")
+    print(f"{'mode':<16} {'subm/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7} {'commits':>8} {'batch':>6}")
+    failed_any = False
+    for mode in ("per-request", "group commit"):
+        A.app.config["GROUP_COMMIT"] = mode == "group commit"
+        before = stored(A)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = burst(A, args.clients, args.per_client, args.seed)
+        landed = stored(A) - before
+        if A.app.config["GROUP_COMMIT"]:
+            stats = A.get_group_committer(A.app).stats()
+            commits, batch = stats["batches"], f"{stats['mean_batch']:.1f}"
+        else:
+            commits, batch = result["acked"] * 3, "1"
+        print(f"{mode:<16} {result['rps']:>8,.0f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+              f"{len(result['errors']):>7} {commits:>8,} {batch:>6}")
+        if result["errors"]:
+            print(f"    e.g. {result['errors'][0]}")
+        if landed != result["acked"]:
+            print(f"    {result['acked']} acknowledged but {landed} stored")
+            failed_any = True
+
+    # A unit that raises fails alone; the rest of its batch commits.
+    committer = A.get_group_committer(A.app)
+    with A.app.app_context():
+        before = A.ChatMessage.query.count()
+    futures = []
+    for i in range(50):
+        if i == 25:
+            futures.append(committer.submit(lambda session: 1 / 0))
+        else:
+            futures.append(committer.submit(
+                lambda session, i=i: session.add(A.ChatMessage(user_id="bench", role="user", content=f"m{i}"))))
+    outcomes = [f.exception(10) for f in futures]
+    with A.app.app_context():
+        added = A.ChatMessage.query.count() - before
+    isolated = added == 49 and sum(e is not None for e in outcomes) == 1
+    print(f"\nfailing unit in a batch: {added}/49 other units committed, "
+          f"{sum(e is not None for e in outcomes)} failed -> {'ok' if isolated else 'NOT ISOLATED'}")
+    if failed_any or not isolated:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
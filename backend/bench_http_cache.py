@@ -0,0 +1,143 @@
+"""
+Bytes on the wire for the read endpoints with and without compression and
+revalidation (http_cache.py).
+
+Fills a temporary database with one user's results (full questionnaire
+JSON), a chat history containing uploaded-PDF texts, and a few hundred
+users for the admin list, then reports for each endpoint: identity, gzip
+and (if the ``brotli`` package is installed) brotli body sizes, server time
+per request, and the size of a 304 revalidation.
+
+    python backend/bench_http_cache.py --results 200 --chat 60
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORDS = ("patient attention memory task response score cognitive report assessment clinical the of and to in "
+         "with for was on at by is are an be this that from as it level risk child adult elderly reaction time "
+         "recall visual working control focus test result normal range session answer question week month").split()
+
+
+def prose(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def populate(A, args):
+    rng = random.Random(args.seed)
+    start = datetime(2024, 1, 1)
+    with A.app.app_context():
+        rows = [A.UserLevelProgress(user_id="bench-user", level1_completed=True, level2_unlocked=True,
+                                    level2_conditions=json.dumps(["adhd", "asd"]))]
+        for i in range(args.results):
+            answers = {f"q{k}": {"question": prose(rng, 14), "answer": rng.randint(1, 5)} for k in range(30)}
+            features = {f"q{k}": a["answer"] for k, a in answers.items()}
+            p = A.calculate_risk("adhd", features)
+            rows.append(A.AssessmentResult(
+                user_id="bench-user", user_name="Bench User", user_email="bench@example.com", age=34,
+                condition_type=rng.choice(["adhd", "asd", "dementia"]), age_group="adult",
+                questionnaire_responses=json.dumps(answers), ml_features=json.dumps(features),
+                risk_score=p["risk_score"], risk_level=p["risk_level"], risk_label=p["risk_label"],
+                requires_level2=p["requires_level2"], assessed_at=start + timedelta(days=i)))
+        for i in range(args.results // 4):
+            metrics = A.generate_synthetic_data("adult")
+            r = A.calculate_level2_score("adult", metrics)
+            rows.append(A.Level2Result(
+                user_id="bench-user", age_group="adult", raw_metrics=json.dumps(metrics),
+                domain_scores=json.dumps(r["domain_scores"]), final_risk_score=r["final_risk_score"],
+                final_risk_percent=r["final_risk_percent"], assessed_at=start + timedelta(days=i)))
+        for i in range(args.users):
+            rows.append(A.AssessmentResult(
+                user_id=f"user-{i}", user_name=f"User {i}", user_email=f"user{i}@example.com", age=rng.randint(6, 90),
+                condition_type="adhd", questionnaire_responses="{}", ml_features="{}", risk_score=50.0,
+                risk_level="mild", risk_label="Mild Risk", address=prose(rng, 6), assessed_at=start + timedelta(hours=i)))
+        for i in range(args.chat):
+            if i % 10 == 0:
+                content = f"[Uploaded report.pdf]\n{prose(rng, 3000)}"  # extracted PDF text
+            else:
+                content = prose(rng, rng.randint(20, 120))
+            rows.append(A.ChatMessage(user_id="bench-user", role="user" if i % 2 == 0 else "assistant",
+                                      content=content, created_at=start + timedelta(minutes=i)))
+        A.db.session.add_all(rows)
+        A.db.session.commit()
+
+
+def header_bytes(response) -> int:
+    return len(f"HTTP/1.1 {response.status}\r\n") + sum(len(f"{k}: {v}\r\n") for k, v in response.headers.items()) + 2
+
+
+def measure(client, url, headers, encoding, repeat):
+    h = dict(headers)
+    if encoding:
+        h["Accept-Encoding"] = encoding
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url, headers=h)
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+    assert response.status_code == 200, (url, response.status_code)
+    # bodies under HTTP_COMPRESS_MIN_BYTES are sent as they are
+    assert response.headers.get("Content-Encoding") in (encoding, None)
+    return response, len(response.get_data()) + header_bytes(response), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bytes saved by response compression and ETags.")
+    parser.add_argument("--results", type=int, default=200)
+    parser.add_argument("--chat", type=int, default=60)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-http-")
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'http.db')}",
+                      JOBS_DB_PATH=os.path.join(tmp, "jobs.db"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    import http_cache
+    populate(A, args)
+
+    client = A.app.test_client()
+    token = client.post("/api/admin/login", json={"email": A.app.config["ADMIN_EMAIL"],
+                                                  "password": A.app.config["ADMIN_PASSWORD"]}).get_json()["token"]
+    endpoints = [
+        ("results", "/api/results/bench-user", {}),
+        ("level2/results", "/api/level2/results/bench-user", {}),
+        ("progress", "/api/progress/bench-user", {}),
+        ("chat/history", "/api/chat/history?user_id=bench-user&limit=200", {}),
+        ("admin/users", "/api/admin/users", {"Authorization": f"Bearer {token}"}),
+    ]
+    encodings = ["gzip"] + (["br"] if http_cache.brotli is not None else [])
+    print(f"bytes on the wire incl. headers; ms per request in the test client"
+          f"{'' if http_cache.brotli else ' (brotli not installed)'}\n")
+    print(f"{'endpoint':<16} {'identity':>10} {'ms':>6} " + " ".join(f"{e:>10} {'ratio':>6} {'ms':>6}" for e in encodings)
+          + f" {'304':>6}")
+    totals = {"identity": 0, "304": 0, **{e: 0 for e in encodings}}
+    for name, url, headers in endpoints:
+        response, plain, plain_ms = measure(client, url, headers, None, args.repeat)
+        line = f"{name:<16} {plain:>10,} {plain_ms:>6.2f} "
+        totals["identity"] += plain
+        for encoding in encodings:
+            _, size, ms = measure(client, url, headers, encoding, args.repeat)
+            totals[encoding] += size
+            line += f"{size:>10,} {plain / size:>6.1f} {ms:>6.2f} "
+        revalidated = client.get(url, headers=dict(headers, **{"If-None-Match": response.headers["ETag"]}))
+        assert revalidated.status_code == 304 and not revalidated.get_data(), name
+        totals["304"] += header_bytes(revalidated)
+        print(line + f"{header_bytes(revalidated):>6}")
+    print(f"\n{'total':<16} {totals['identity']:>10,}        "
+          + " ".join(f"{totals[e]:>10,} {totals['identity'] / totals[e]:>6.1f}        " for e in encodings)
+          + f"{totals['304']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Level-2 feature extraction at scale (level2_features.py).
+
+Generates synthetic adult telemetry sessions (CPT, anti-saccade and task
+switching games) with NumPy, times ``extract_batch`` over all of them and
+over single sessions, and checks the vectorized results against a plain
+per-trial Python implementation on a subset.  Exits non-zero on mismatch.
+
+    python backend/bench_level2_features.py --trials 1000000
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+from array import array
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from level2_features import SACCADE_THRESHOLD, extract_batch, extract_features  # noqa: E402
+from telemetry import COLUMNS, EVENT_TYPES, event_count  # noqa: E402
+
+RT, GAZE, STIMULUS = (EVENT_TYPES.index(n) for n in ("rt", "gaze", "stimulus"))
+
+
+def synthetic_session(rng: np.random.Generator, trials: int) -> dict:
+    """Roughly a third of the trials per game; 2 events per trial plus gaze where relevant."""
+    per_game = trials // 3
+    parts = []
+    t0 = 0
+    for game in (1, 2, 3):
+        n = per_game if game < 3 else trials - 2 * per_game
+        trial = np.arange(n)
+        onset = t0 + trial * 1500
+        t0 = int(onset[-1]) + 5000 if n else t0
+        if game == 1:
+            target = (rng.random(n) < 0.8).astype(np.float32)
+            respond = np.where(target == 1, rng.random(n) < 0.95, rng.random(n) < 0.1)
+            rt = rng.lognormal(6.0, 0.25, n).astype(np.float32)
+            parts.append((onset, STIMULUS, game, trial, np.nan, np.nan, target))
+            parts.append((onset[respond] + 300, RT, game, trial[respond], np.nan, np.nan, rt[respond]))
+        elif game == 2:
+            cue = np.where(rng.random(n) < 0.5, 0.2, 0.8).astype(np.float32)
+            wrong = rng.random(n) < 0.2
+            look = np.where(wrong == (cue < 0.5), 0.1, 0.9).astype(np.float32)
+            parts.append((onset, STIMULUS, game, trial, cue, np.nan, np.nan))
+            parts.append((onset + 80, GAZE, game, trial, np.full(n, 0.52, np.float32), np.nan, np.nan))
+            parts.append((onset + 200, GAZE, game, trial, look, np.nan, np.nan))
+        else:
+            rule = (rng.random(n) < 0.5).astype(np.float32)
+            rt = rng.normal(600, 80, n).astype(np.float32)
+            aoi = (1 + (rng.random(n) < 0.15)).astype(np.float32)
+            parts.append((onset, STIMULUS, game, trial, np.nan, np.nan, rule))
+            parts.append((onset + 400, RT, game, trial, np.nan, np.nan, rt))
+            parts.append((onset + 450, GAZE, game, trial, np.nan, np.nan, aoi))
+
+    columns = {}
+    for index, (name, code) in enumerate(COLUMNS):
+        pieces = []
+        for part in parts:
+            size = len(part[3])
+            pieces.append(np.broadcast_to(np.asarray(part[index], dtype=np.dtype(code)), (size,)))
+        columns[name] = array(code, np.concatenate(pieces).tobytes())
+    return columns
+
+
+def reference_adult(columns: dict) -> dict:
+    """Straightforward per-trial loop, the way the metrics would be computed without NumPy."""
+    events = sorted(zip(*(columns[name] for name, _ in COLUMNS)))
+    trials = {}
+    for t, kind, game, trial, x, y, value in events:
+        trials.setdefault((game, trial), []).append((t, kind, x, value))
+
+    rts, omissions, commissions, judged, wrong = [], 0, 0, 0, 0
+    switch, repeat, gaze, distracted = [], [], 0, 0
+    previous_rule = None
+    for (game, trial), evs in sorted(trials.items()):
+        stim = next((e for e in evs if e[1] == STIMULUS), None)
+        rt = next((e[3] for e in evs if e[1] == RT), None)
+        if game == 1 and stim:
+            if stim[3] >= 0.5:
+                if rt is None:
+                    omissions += 1
+                else:
+                    rts.append(rt)
+            elif rt is not None:
+                commissions += 1
+        elif game == 2 and stim:
+            look = next((e[2] for e in evs if e[1] == GAZE and abs(e[2] - 0.5) > SACCADE_THRESHOLD), None)
+            if look is not None:
+                judged += 1
+                wrong += (look < 0.5) == (stim[2] < 0.5)
+        elif game == 3:
+            for e in evs:
+                if e[1] == GAZE and e[3] in (1, 2):
+                    gaze += 1
+                    distracted += e[3] == 2
+            if stim:
+                if previous_rule is not None and rt is not None:
+                    (switch if stim[3] != previous_rule else repeat).append(rt)
+                previous_rule = stim[3]
+    return {
+        "rt_variability": round(statistics.stdev(rts), 2),
+        "omission_errors": omissions,
+        "commission_errors": commissions,
+        "anti_saccade_error_rate": round(wrong / judged, 2),
+        "executive_task_switching_cost": round(statistics.mean(switch) - statistics.mean(repeat), 2),
+        "distraction_fixation_pct": round(distracted / gaze, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized Level-2 feature extraction.")
+    parser.add_argument("--trials", type=int, default=1_000_000, help="total trials across all sessions")
+    parser.add_argument("--trials-per-session", type=int, default=300)
+    parser.add_argument("--check-sessions", type=int, default=50, help="sessions compared with the reference")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    n_sessions = max(1, args.trials // args.trials_per_session)
+    started = time.perf_counter()
+    sessions = [("adult", synthetic_session(rng, args.trials_per_session)) for _ in range(n_sessions)]
+    events = sum(event_count(c) for _, c in sessions)
+    print(f"generated {n_sessions} sessions, {n_sessions * args.trials_per_session} trials, "
+          f"{events} events in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    results = extract_batch(sessions)
+    batch_s = time.perf_counter() - started
+    print(f"batch:   {batch_s:.2f}s for all sessions "
+          f"({n_sessions * args.trials_per_session / batch_s:,.0f} trials/s, {events / batch_s:,.0f} events/s)")
+
+    sample = sessions[:min(200, n_sessions)]
+    started = time.perf_counter()
+    for age_group, columns in sample:
+        extract_features(age_group, columns)
+    single_ms = (time.perf_counter() - started) / len(sample) * 1000
+    print(f"submit:  {single_ms:.2f} ms per single {args.trials_per_session}-trial session")
+
+    checked = sessions[:min(args.check_sessions, n_sessions)]
+    started = time.perf_counter()
+    expected = [reference_adult(columns) for _, columns in checked]
+    loop_s = (time.perf_counter() - started) / len(checked) * n_sessions
+    print(f"python:  {loop_s:.1f}s estimated for all sessions with a per-trial loop "
+          f"({loop_s / batch_s:.0f}x slower)")
+
+    mismatches = 0
+    for got, want in zip(results, expected):
+        for name, value in want.items():
+            if not math.isclose(got.get(name, math.nan), value, abs_tol=0.011):
+                mismatches += 1
+                print(f"  mismatch {name}: vectorized {got.get(name)} vs reference {value}")
+    print(f"checked {len(checked)} sessions against the reference: {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Level-1 scoring cost: the ``calculate_risk`` heuristic vs model_serving.py.
+
+Builds random questionnaire feature dicts for each condition and reports
+per-call latency of the heuristic and of a single-row model prediction,
+vectorized throughput at several batch sizes, and latency/throughput of
+concurrent requests going through the micro-batcher.  Also checks that the
+default answer-mean head agrees with the heuristic (exits non-zero if not).
+
+    python backend/bench_model_serving.py --requests 20000 --threads 16
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def random_features(rng: random.Random, feature_names: list) -> dict:
+    features = {}
+    for name in feature_names:
+        if name == "age":
+            features[name] = rng.randint(6, 90)
+        elif rng.random() < 0.9:  # some items left unanswered
+            value = rng.randint(1, 5)
+            features[name] = str(value) if rng.random() < 0.2 else value
+    return features
+
+
+def per_call_us(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(*item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def concurrent(fn, items, threads: int) -> dict:
+    latencies, lock = [], threading.Lock()
+    chunks = [items[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        mine = []
+        for item in chunk:
+            started = time.perf_counter()
+            fn(*item)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(items) / elapsed,
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99) - 1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Level-1 model serving against the heuristic.")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=9)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-models-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'models.db')}"
+    os.environ["JOBS_DB_PATH"] = os.path.join(tmp, "jobs.db")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    import model_serving as M
+
+    started = time.perf_counter()
+    models = M.get_models()
+    print(f"loaded {len(models)} condition models in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"(heads: {', '.join(f'{c}={m.head.name}' for c, m in models.items())})")
+
+    rng = random.Random(args.seed)
+    conditions = list(models)
+    items = []
+    for _ in range(args.requests):
+        condition = rng.choice(conditions)
+        items.append((condition, random_features(rng, models[condition].feature_names)))
+
+    disagree = sum(
+        A.calculate_risk(c, f)["risk_level"] != models[c].predict([f])[0]["risk_level"]
+        for c, f in items[:2000]) if all(m.head.name == "answer_mean" for m in models.values()) else 0
+    print(f"answer-mean head vs heuristic: {disagree} risk-level disagreements in {min(2000, len(items))} requests")
+
+    heuristic_us = per_call_us(A.calculate_risk, items)
+    single_us = per_call_us(lambda c, f: models[c].predict([f]), items[:5000])
+    print(f"\nper call:  heuristic {heuristic_us:.1f} us   model, one row {single_us:.1f} us")
+
+    print(f"\n{'batch':>6} {'us/row':>8} {'rows/s':>11}")
+    by_condition = {}
+    for condition, features in items:
+        by_condition.setdefault(condition, []).append(features)
+    for size in (1, 8, 64, 512, 4096):
+        rows, started = 0, time.perf_counter()
+        for condition, feature_list in by_condition.items():
+            for i in range(0, len(feature_list), size):
+                models[condition].predict(feature_list[i:i + size])
+                rows += len(feature_list[i:i + size])
+        elapsed = time.perf_counter() - started
+        print(f"{size:>6} {elapsed / rows * 1e6:>8.2f} {rows / elapsed:>11,.0f}")
+
+    engine = M.get_engine()
+    print(f"\n{args.threads} concurrent callers:")
+    h = concurrent(A.calculate_risk, items, args.threads)
+    e = concurrent(engine.predict, items, args.threads)
+    print(f"  heuristic      {h['rps']:>9,.0f} req/s  p50 {h['p50_us']:>7.1f} us  p99 {h['p99_us']:>8.1f} us")
+    print(f"  micro-batched  {e['rps']:>9,.0f} req/s  p50 {e['p50_us']:>7.1f} us  p99 {e['p99_us']:>8.1f} us  "
+          f"(mean batch {engine.stats()['mean_batch']})")
+    if disagree:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Accuracy and cost of the population-norm sketches (quantiles.py).
+
+For several score distributions and population sizes, builds a KLL sketch,
+round-trips it through ``to_bytes``/``from_bytes`` and compares the
+percentile reported from its breakpoint table with the exact percentile
+over the sorted data.  Exits non-zero if any error exceeds ``--max-error``
+percentile points.
+
+    python backend/bench_quantiles.py --sizes 1000 100000 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from bisect import bisect_right
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from quantiles import KLLSketch, percentile_from_table, percentile_table  # noqa: E402
+
+DISTRIBUTIONS = {
+    # domain scores are 0-1 risks rounded to 2 decimals, so ties are common
+    "risk_rounded": lambda rng: round(rng.betavariate(2, 5), 2),
+    "bimodal": lambda rng: rng.gauss(0.2, 0.05) if rng.random() < 0.7 else rng.gauss(0.75, 0.1),
+    "uniform": lambda rng: rng.random(),
+    "lognormal": lambda rng: rng.lognormvariate(0, 1),
+}
+
+
+def exact_percentile(sorted_values, value) -> float:
+    return 100.0 * bisect_right(sorted_values, value) / len(sorted_values)
+
+
+def check(name: str, n: int, k: int, seed: int, sorted_input: bool) -> dict:
+    rng = random.Random(seed)
+    values = [DISTRIBUTIONS[name](rng) for _ in range(n)]
+    exact = sorted(values)
+    stream = exact if sorted_input else values
+
+    sketch = KLLSketch(k=k, rng=random.Random(seed + 1))
+    started = time.perf_counter()
+    for v in stream:
+        sketch.update(v)
+    update_us = (time.perf_counter() - started) / n * 1e6
+
+    payload = sketch.to_bytes()
+    table = percentile_table(KLLSketch.from_bytes(payload))
+
+    probes = [exact[int(q * (n - 1))] for q in (i / 200 for i in range(201))]
+    started = time.perf_counter()
+    estimates = [percentile_from_table(table, p) for p in probes]
+    lookup_us = (time.perf_counter() - started) / len(probes) * 1e6
+    errors = [abs(e - exact_percentile(exact, p)) for e, p in zip(estimates, probes)]
+    return {
+        "max_error": max(errors),
+        "mean_error": sum(errors) / len(errors),
+        "update_us": update_us,
+        "lookup_us": lookup_us,
+        "bytes": len(payload),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check KLL percentile accuracy against exact computation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--k", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-error", type=float, default=2.5,
+                        help="allowed |estimated - exact| in percentile points (sketch error + table resolution)")
+    args = parser.parse_args()
+
+    print(f"k={args.k}; errors in percentile points over 201 probe values")
+    print(f"{'distribution':>14} {'order':>7} {'n':>9} {'max err':>8} {'mean err':>9} "
+          f"{'update us':>10} {'lookup us':>10} {'bytes':>6}")
+    failures = 0
+    for name in DISTRIBUTIONS:
+        for n in args.sizes:
+            for sorted_input in (False, True):
+                r = check(name, n, args.k, args.seed, sorted_input)
+                flag = "" if r["max_error"] <= args.max_error else "  FAIL"
+                failures += bool(flag)
+                print(f"{name:>14} {'sorted' if sorted_input else 'random':>7} {n:>9} {r['max_error']:>8.2f} "
+                      f"{r['mean_error']:>9.2f} {r['update_us']:>10.2f} {r['lookup_us']:>10.2f} {r['bytes']:>6}{flag}")
+    if failures:
+        print(f"\n{failures} configuration(s) exceeded {args.max_error} percentile points")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Read throughput under mixed load with and without the read replica
+(replica.py), on file-backed SQLite: a few writer threads keep submitting
+Level-1 assessments while reader threads fetch other users' result lists.
+
+Each mode runs in its own process (the replica bind is read at app
+creation): "primary" serves everything from one database; "replica" routes
+the reads to a SQLite copy refreshed every ``--sync`` seconds.
+
+    python backend/bench_replica.py --readers 8 --writers 4 --seconds 10
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def run_mode(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:0] = [here, os.path.dirname(here)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+
+    users = [f"reader-{i}" for i in range(args.users)]
+    with A.app.app_context():
+        rng = random.Random(1)
+        for user_id in users:
+            for _ in range(10):
+                features = {f"q{k}": rng.randint(1, 5) for k in range(20)}
+                p = A.calculate_risk("adhd", features)
+                A.db.session.add(A.AssessmentResult(
+                    user_id=user_id, condition_type="adhd", age_group="adult", questionnaire_responses="{}",
+                    ml_features=json.dumps(features), risk_score=p["risk_score"], risk_level=p["risk_level"],
+                    risk_label=p["risk_label"], requires_level2=p["requires_level2"]))
+        A.db.session.commit()
+    sync = A.app.extensions.get("replica_sync")
+    if sync is not None:
+        sync.sync()
+
+    stop = threading.Event()
+    reads, writes, errors = [], [0], [0]
+    lock = threading.Lock()
+
+    def reader(n):
+        client, rng, mine = A.app.test_client(), random.Random(n), []
+        while not stop.is_set():
+            started = time.perf_counter()
+            r = client.get(f"/api/results/{rng.choice(users)}")
+            mine.append(time.perf_counter() - started)
+            if r.status_code != 200:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            reads.extend(mine)
+
+    def writer(n):
+        client, rng = A.app.test_client(), random.Random(100 + n)
+        while not stop.is_set():
+            r = client.post("/api/submit-level1", json={
+                "user_id": f"writer-{n}-{rng.randint(0, 50)}", "condition": "asd",
+                "features": {f"q{k}": rng.randint(1, 5) for k in range(20)}})
+            with lock:
+                if r.status_code == 200:
+                    writes[0] += 1
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+    reads.sort()
+    router = A.app.extensions.get("read_router")
+    print(json.dumps({
+        "reads_per_s": len(reads) / args.seconds,
+        "read_p50_ms": statistics.median(reads) * 1000,
+        "read_p99_ms": reads[int(len(reads) * 0.99) - 1] * 1000,
+        "writes_per_s": writes[0] / args.seconds,
+        "errors": errors[0],
+        "syncs": sync.syncs if sync else 0,
+        "sync_ms": round(sync.last_seconds * 1000, 1) if sync and sync.last_seconds else None,
+        "replica_views": router.replica_views if router else 0,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark read/write routing to a SQLite read replica.")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--sync", type=float, default=1.0, help="replica refresh interval (s)")
+    parser.add_argument("--mode", choices=["primary", "replica"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return run_mode(args)
+
+    print(f"{args.readers} readers + {args.writers} writers for {args.seconds:.0f}s, "
+          f"replica refreshed every {args.sync}s\n")
+    print(f"{'mode':<8} {'reads/s':>8} {'p50 ms':>7} {'p99 ms':>8} {'writes/s':>9} {'errors':>7} {'syncs':>6} {'sync ms':>8}")
+    for mode in ("primary", "replica"):
+        tmp = tempfile.mkdtemp(prefix="cogniwise-replica-")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'primary.db')}",
+                   JOBS_DB_PATH=os.path.join(tmp, "jobs.db"))
+        env.pop("REPLICA_DATABASE_URL", None)
+        if mode == "replica":
+            env.update(REPLICA_DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'replica.db')}",
+                       REPLICA_SYNC_SECONDS=str(args.sync))
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--mode", mode, "--readers", str(args.readers),
+             "--writers", str(args.writers), "--users", str(args.users), "--seconds", str(args.seconds)],
+            env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<8} {r['reads_per_s']:>8,.0f} {r['read_p50_ms']:>7.1f} {r['read_p99_ms']:>8.1f} "
+              f"{r['writes_per_s']:>9,.0f} {r['errors']:>7} {r['syncs']:>6} {r['sync_ms'] or '-':>8}")
+
+
+if __name__ == "__main__":
+    main()
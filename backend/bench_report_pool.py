@@ -0,0 +1,128 @@
+"""
+PDF report throughput: the old per-call renderer, the cached-template
+renderer on one thread, and the warm process pool (report_renderer.py)
+driven by concurrent request threads.  Also checks that a burst beyond the
+pool's queue limit is turned away instead of queued.
+
+    python backend/bench_report_pool.py --reports 200 --clients 8
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def sample_report(rng) -> tuple:
+    data = {
+        "id": rng.randint(1, 10**6), "user_id": f"user-{rng.randint(1, 5000)}", "user_name": "Sample Patient",
+        "user_email": "patient@example.com", "condition_type": rng.choice(["adhd", "asd", "dementia"]),
+        "age_group": "adult", "age": rng.randint(18, 80), "risk_score": round(rng.random() * 100, 2),
+        "risk_level": rng.choice(["low", "moderate", "high"]), "risk_label": "Moderate risk",
+        "requires_level2": rng.random() < 0.5, "assessed_at": "2024-05-01T10:00:00",
+        "admin_notes": "Follow up in three months.", "questionnaire_responses": {"q1": 3},
+        "domain_scores": {d: rng.random() for d in ("attention", "memory", "executive_function",
+                                                     "social_communication", "processing_speed")},
+    }
+    return data, f"Assessment Report - {data['condition_type'].upper()}"
+
+
+def legacy_render(data: dict, title: str) -> bytes:
+    """The renderer before report_renderer.py: imports and styles rebuilt on every call."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = [Paragraph(title, styles['Title']), Spacer(1, 20)]
+    rows = [[k.replace('_', ' ').title(), str(v)] for k, v in data.items()
+            if k not in ("questionnaire_responses", "domain_scores") and not isinstance(v, (dict, list))]
+    t = Table(rows, colWidths=[200, 300])
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey), ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'), ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10), ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (1, 0), (1, -1), colors.whitesmoke), ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)]))
+    story += [t, Spacer(1, 20), Paragraph("Detailed Domain Scores", styles['Heading2']), Spacer(1, 10)]
+    t2 = Table([[k.replace('_', ' ').title(), f"{v*100:.1f}%"] for k, v in data["domain_scores"].items()],
+               colWidths=[200, 100])
+    t2.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 1, colors.grey)]))
+    story.append(t2)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def run(render, reports: list, clients: int) -> float:
+    started = time.perf_counter()
+    if clients == 1:
+        for data, title in reports:
+            render(data, title)
+    else:
+        with ThreadPoolExecutor(clients) as pool:
+            list(pool.map(lambda r: render(*r), reports))
+    return len(reports) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled PDF report rendering.")
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8, help="request threads feeding the pool")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import report_renderer
+
+    rng = random.Random(5)
+    reports = [sample_report(rng) for _ in range(args.reports)]
+    report_renderer.render(*reports[0])  # first-call import cost is not what is being compared
+    legacy_render(*reports[0])
+
+    print(f"{args.reports} reports, {args.workers} pool workers ({os.cpu_count()} CPUs), {args.clients} client threads\n")
+    print(f"{'renderer':<34} {'reports/s':>10}")
+    print(f"{'per-call styles, 1 thread':<34} {run(legacy_render, reports, 1):>10,.1f}")
+    print(f"{'cached templates, 1 thread':<34} {run(report_renderer.render, reports, 1):>10,.1f}")
+    print(f"{'cached templates, {} threads'.format(args.clients):<34} "
+          f"{run(report_renderer.render, reports, args.clients):>10,.1f}")
+
+    started = time.perf_counter()
+    pool = report_renderer.RenderPool(args.workers, max_pending=args.clients * 4, timeout=30).start()
+    warm_s = time.perf_counter() - started
+    print(f"{'process pool, {} threads'.format(args.clients):<34} {run(pool.render, reports, args.clients):>10,.1f}"
+          f"   (pool start + warm-up {warm_s:.2f}s, once per process)")
+
+    # A burst larger than the queue limit: the excess is rejected immediately.
+    small = report_renderer.RenderPool(args.workers, max_pending=args.workers, timeout=30).start()
+    outcomes = []
+    lock = threading.Lock()
+
+    def call(r):
+        try:
+            small.render(*r)
+            result = "ok"
+        except report_renderer.ReportPoolBusy:
+            result = "busy"
+        with lock:
+            outcomes.append(result)
+
+    threads = [threading.Thread(target=call, args=(r,)) for r in reports[: args.workers * 6]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"\nburst of {len(threads)} against a queue limit of {small.max_pending}: "
+          f"{outcomes.count('ok')} rendered, {outcomes.count('busy')} rejected with 503")
+    pool.stop()
+    small.stop()
+
+
+if __name__ == "__main__":
+    main()
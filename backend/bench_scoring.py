@@ -0,0 +1,162 @@
+"""
+Scoring spec cost: compile time, per-result scoring latency, and bulk
+re-scoring of stored results after a spec version change.
+
+The bulk path (``rescore_results``: keyset batches of input columns, one
+executemany UPDATE per batch) is compared with the straightforward ORM
+loop that loads full objects and lets the unit of work flush them.
+
+    python backend/bench_scoring.py --rows 200000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def populate(A, rows: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    l1, l2 = [], []
+    with A.app.app_context():
+        for i in range(rows):
+            condition = rng.choice(["adhd", "asd", "dementia"])
+            features = {"age": rng.randint(6, 90), **{f"item{k}": rng.randint(1, 5) for k in range(6)}}
+            p = A.calculate_risk(condition, features)
+            l1.append({"user_id": f"user-{i % 5000}", "condition_type": condition, "questionnaire_responses": "{}",
+                       "ml_features": json.dumps(features), "risk_score": p["risk_score"],
+                       "risk_level": p["risk_level"], "risk_label": p["risk_label"],
+                       "requires_level2": p["requires_level2"], "scoring_spec_version": p["spec_version"],
+                       "assessed_at": start + timedelta(minutes=i)})
+            age_group = rng.choice(["child", "adult", "elderly"])
+            metrics = A.generate_synthetic_data(age_group)
+            r = A.calculate_level2_score(age_group, metrics)
+            l2.append({"user_id": f"user-{i % 5000}", "age_group": age_group, "raw_metrics": json.dumps(metrics),
+                       "domain_scores": json.dumps(r["domain_scores"]), "final_risk_score": r["final_risk_score"],
+                       "final_risk_percent": r["final_risk_percent"], "scoring_spec_version": r["spec_version"],
+                       "assessed_at": start + timedelta(minutes=i)})
+            if len(l1) == 5000:
+                A.db.session.bulk_insert_mappings(A.AssessmentResult, l1)
+                A.db.session.bulk_insert_mappings(A.Level2Result, l2)
+                A.db.session.commit()
+                l1, l2 = [], []
+        if l1:
+            A.db.session.bulk_insert_mappings(A.AssessmentResult, l1)
+            A.db.session.bulk_insert_mappings(A.Level2Result, l2)
+            A.db.session.commit()
+
+
+def bump_spec(path: str, version: str, level2_weight: float):
+    with open(path) as f:
+        spec = json.load(f)
+    spec["version"] = version
+    spec["level1"]["bands"][1]["min"] = 50
+    spec["level2"]["metrics"]["age_groups"]["adult"][0]["weight"] = level2_weight
+    with open(path, "w") as f:
+        json.dump(spec, f)
+
+
+def orm_rescore(A, spec, batch_size: int = 2000) -> int:
+    """Baseline: full ORM objects, attribute assignment, unit-of-work flush per batch."""
+    done = 0
+    for model in (A.AssessmentResult, A.Level2Result):
+        last_id = 0
+        while True:
+            batch = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for row in batch:
+                if model is A.AssessmentResult:
+                    p = spec.score_level1(row.condition_type, json.loads(row.ml_features))
+                    row.risk_score, row.risk_level, row.risk_label = p["risk_score"], p["risk_level"], p["risk_label"]
+                    row.requires_level2 = p["requires_level2"]
+                else:
+                    r = spec.score_level2(row.age_group, json.loads(row.raw_metrics))
+                    row.domain_scores = json.dumps(r["domain_scores"])
+                    row.final_risk_score, row.final_risk_percent = r["final_risk_score"], r["final_risk_percent"]
+                row.scoring_spec_version = spec.version
+            A.db.session.commit()
+            done += len(batch)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark spec-driven scoring and bulk re-scoring.")
+    parser.add_argument("--rows", type=int, default=200000, help="rows per results table")
+    parser.add_argument("--seed", type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-scoring-")
+    spec_path = os.path.join(tmp, "scoring_spec.json")
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_spec.json"), spec_path)
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'scoring.db')}",
+                      JOBS_DB_PATH=os.path.join(tmp, "jobs.db"), SCORING_SPEC_PATH=spec_path,
+                      SCORING_SPEC_CHECK_SECONDS="0", SCORING_AUTO_RESCORE="0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    import scoring
+
+    started = time.perf_counter()
+    for _ in range(100):
+        scoring.load_spec(spec_path)
+    print(f"load + compile spec: {(time.perf_counter() - started) * 10:.2f} ms")
+
+    spec = scoring.current_spec()
+    rng = random.Random(args.seed)
+    l1 = [(rng.choice(["adhd", "asd", "dementia"]), {f"item{k}": rng.randint(1, 5) for k in range(6)})
+          for _ in range(20000)]
+    l2 = [(g, A.generate_synthetic_data(g)) for g in (rng.choice(["child", "adult", "elderly"]) for _ in range(20000))]
+    started = time.perf_counter()
+    for condition, features in l1:
+        spec.score_level1(condition, features)
+    level1_us = (time.perf_counter() - started) / len(l1) * 1e6
+    started = time.perf_counter()
+    for age_group, metrics in l2:
+        spec.score_level2(age_group, metrics)
+    level2_us = (time.perf_counter() - started) / len(l2) * 1e6
+    started = time.perf_counter()
+    for condition, features in l1:
+        scoring.current_spec().score_level1(condition, features)
+    checked_us = (time.perf_counter() - started) / len(l1) * 1e6
+    print(f"score: Level-1 {level1_us:.2f} us, Level-2 {level2_us:.2f} us; "
+          f"Level-1 incl. reload check on every call {checked_us:.2f} us")
+
+    started = time.perf_counter()
+    populate(A, args.rows, args.seed)
+    print(f"\ninserted {args.rows} rows into each results table in {time.perf_counter() - started:.1f}s")
+
+    with A.app.app_context():
+        bump_spec(spec_path, "bench.2", 0.5)
+        started = time.perf_counter()
+        stats = A.rescore_results()
+        bulk_s = time.perf_counter() - started
+        update_s = stats["rescore_seconds"]
+        print(f"bulk rescore: {update_s:.1f}s ({2 * args.rows / update_s:,.0f} rows/s), "
+              f"changed {stats['assessment_results']['changed']} L1 / {stats['level2_results']['changed']} L2; "
+              f"norms + trends rebuild for {stats['users_changed']} users {stats.get('rebuild_seconds', 0):.1f}s "
+              f"(total {bulk_s:.1f}s)")
+
+        started = time.perf_counter()
+        stats = A.rescore_results()
+        print(f"rerun with nothing stale: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        bump_spec(spec_path, "bench.3", 0.35)
+        A.db.session.expire_all()
+        started = time.perf_counter()
+        rows = orm_rescore(A, scoring.current_spec())
+        orm_s = time.perf_counter() - started
+        print(f"ORM object loop, same rows: {orm_s:.1f}s ({rows / orm_s:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Admin user search at scale: FTS5 index vs the LIKE fallback.
+
+Fills a scratch SQLite database with synthetic assessment rows (several
+per user), then times ``search_users`` for typical admin queries with the
+FTS5 index and with plain LIKE matching.
+
+    python backend/bench_search.py --rows 300000
+"""
+
+import argparse
+import io
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+FIRST = ["james", "mary", "robert", "patricia", "john", "jennifer", "michael", "linda", "david", "elizabeth",
+         "william", "barbara", "richard", "susan", "joseph", "jessica", "thomas", "sarah", "priya", "arjun",
+         "ananya", "rahul", "shivani", "kiran", "meera", "vikram", "fatima", "omar", "chen", "wei"]
+LAST = ["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez", "martinez",
+        "sharma", "patel", "reddy", "nair", "iyer", "gupta", "khan", "singh", "wang", "li", "nguyen", "kim"]
+STREETS = ["main st", "oak ave", "mg road", "park lane", "station road", "lake view", "hill st", "church rd"]
+CITIES = ["bengaluru", "mysuru", "chennai", "pune", "delhi", "london", "boston", "toronto", "sydney"]
+NOTES = ["follow up in three months", "refer to neurologist", "family history of dementia",
+         "sleep issues reported", "recommend occupational therapy", None, None, None]
+
+QUERIES = ["shivani", "sharma", "priya pat", "jo", "bengaluru", "neurologist", "mary smith bost",
+           "example", "zzzz"]
+
+
+def populate(app_module, rows: int, seed: int):
+    rng = random.Random(seed)
+    A = app_module
+    start = datetime(2024, 1, 1)
+    users = max(1, rows // 3)
+    batch = []
+    with A.app.app_context():
+        for i in range(rows):
+            u = rng.randrange(users)
+            urng = random.Random(u)
+            first, last = urng.choice(FIRST), urng.choice(LAST)
+            batch.append({
+                "user_id": f"user-{u}",
+                "user_name": f"{first.title()} {last.title()}",
+                "user_email": f"{first}.{last}{u}@example.com",
+                "address": f"{urng.randint(1, 999)} {urng.choice(STREETS)}, {urng.choice(CITIES)}",
+                "admin_notes": rng.choice(NOTES),
+                "condition_type": rng.choice(["adhd", "asd", "dementia"]),
+                "questionnaire_responses": "{}",
+                "ml_features": "{}",
+                "risk_score": rng.uniform(0, 100),
+                "risk_level": "low",
+                "risk_label": "Low Risk",
+                "requires_level2": False,
+                "assessed_at": start + timedelta(minutes=i),
+            })
+            if len(batch) == 5000:
+                A.db.session.bulk_insert_mappings(A.AssessmentResult, batch)
+                A.db.session.commit()
+                batch = []
+        if batch:
+            A.db.session.bulk_insert_mappings(A.AssessmentResult, batch)
+            A.db.session.commit()
+
+
+def time_queries(A, repeats: int) -> dict:
+    out = {}
+    with A.app.app_context():
+        for q in QUERIES:
+            A.search_users(q)  # warm the page cache
+            started = time.perf_counter()
+            for _ in range(repeats):
+                hits, has_more = A.search_users(q, limit=20)
+            out[q] = ((time.perf_counter() - started) / repeats * 1000, len(hits), has_more)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time admin user search over synthetic assessment rows.")
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-search-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'search.db')}"
+    os.environ["JOBS_DB_PATH"] = os.path.join(tmp, "jobs.db")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+
+    started = time.perf_counter()
+    populate(A, args.rows, args.seed)
+    print(f"inserted {args.rows} rows (FTS triggers on) in {time.perf_counter() - started:.1f}s")
+
+    fts = time_queries(A, args.repeats)
+    A.search_index_available = lambda: False
+    like = time_queries(A, max(1, args.repeats // 5))
+
+    print(f"{'query':>18} {'hits':>5} {'more':>5} {'fts5 ms':>9} {'LIKE ms':>9}")
+    for q in QUERIES:
+        ms, hits, more = fts[q]
+        print(f"{q!r:>18} {hits:>5} {str(more):>5} {ms:>9.2f} {like[q][0]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Write scaling of sharded storage (sharding.py) across 1, 4 and 8 SQLite
+shards, plus the cost of the admin fan-out and of a rebalance.
+
+Each layout runs in its own process (shards are configured at app
+creation) on fresh files: client threads for distinct users (a) submit
+Level-1 assessments over HTTP and (b) append chat messages, then the admin
+user list and user search are timed against the full data set.  Finally
+the 4-shard data is rebalanced onto 8 shards.
+
+    python backend/bench_sharding.py --clients 16 --seconds 8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def timed_load(seconds: float, clients: int, step) -> dict:
+    stop = threading.Event()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(n):
+        rng, mine, failed = random.Random(n), [], 0
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                step(n, i, rng)
+            except Exception:
+                failed += 1
+            mine.append(time.perf_counter() - started)
+            i += 1
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return {"per_s": len(latencies) / seconds, "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000, "errors": sum(errors)}
+
+
+def run_layout(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:0] = [here, os.path.dirname(here)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    import sharding
+
+    http = [A.app.test_client() for _ in range(args.clients)]
+
+    def submit(n, i, rng):
+        r = http[n].post("/api/submit-level1", json={
+            "user_id": f"c{n}-u{i % 50}", "user_name": f"Client {n} user {i % 50}", "condition": "adhd",
+            "age": rng.randint(6, 80), "features": {f"q{k}": rng.randint(1, 5) for k in range(20)}})
+        if r.status_code != 200:
+            raise RuntimeError(r.get_json())
+
+    def chat(n, i, rng):
+        user_id = f"c{n}-u{i % 50}"
+        with A.app.app_context(), sharding.for_user(user_id):
+            A.save_chat_message(user_id, "user", f"message {i} " + "x" * rng.randint(20, 400))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = {"submit": timed_load(args.seconds, args.clients, submit),
+               "chat": timed_load(args.seconds, args.clients, chat)}
+
+    client = A.app.test_client()
+    token = client.post("/api/admin/login", json={"email": A.app.config["ADMIN_EMAIL"],
+                                                  "password": A.app.config["ADMIN_PASSWORD"]}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for name, url in (("admin_users", "/api/admin/users"), ("admin_search", "/api/admin/users/search?q=client&limit=20")):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            r = client.get(url, headers=headers)
+            samples.append(time.perf_counter() - started)
+            assert r.status_code == 200, (url, r.status_code)
+        out[name + "_ms"] = statistics.median(samples) * 1000
+    out["users"] = len(client.get("/api/admin/users", headers=headers).get_json())
+    print(json.dumps(out))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharded storage across 1/4/8 shards.")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--shards", default="1,4,8")
+    parser.add_argument("--layout", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.layout:
+        return run_layout(args)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{args.clients} client threads, {args.seconds:.0f}s per workload\n")
+    print(f"{'shards':>6} {'subm/s':>8} {'p99 ms':>8} {'chat/s':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'users':>6} {'admin users ms':>15} {'search ms':>10}")
+    kept = None
+    for count in [int(c) for c in args.shards.split(",")]:
+        tmp = tempfile.mkdtemp(prefix=f"cogniwise-shards{count}-")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'primary.db')}",
+                   JOBS_DB_PATH=os.path.join(tmp, "jobs.db"), SHARD_COUNT=str(count),
+                   SHARD_DIR=os.path.join(tmp, "shards"))
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--layout", str(count), "--clients", str(args.clients),
+             "--seconds", str(args.seconds), "--repeat", str(args.repeat)],
+            env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        s, c = r["submit"], r["chat"]
+        print(f"{count:>6} {s['per_s']:>8,.0f} {s['p99_ms']:>8.1f} {c['per_s']:>8,.0f} {c['p99_ms']:>8.1f} "
+              f"{s['errors'] + c['errors']:>7} {r['users']:>6} {r['admin_users_ms']:>15.1f} {r['admin_search_ms']:>10.1f}")
+        if count == 4:
+            kept = env
+
+    if kept is not None:
+        # Grow the 4-shard data set to 8 shards: the app creates the new files, the CLI moves the rows.
+        env = dict(kept, SHARD_COUNT="8")
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-m", "flask", "--app", "app", "shard-rebalance"], cwd=here,
+                             env=env, capture_output=True, text=True, check=True).stdout
+        stats = json.loads(out[out.index("{"):])
+        moved = sum(stats["rows_moved"].values())
+        print(f"\nrebalance 4 -> 8 shards: {stats['users_moved']} users, {moved:,} rows moved "
+              f"in {stats['seconds']:.2f}s ({time.perf_counter() - started:.1f}s including app start)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Cold-start benchmark for the Flask app.
+
+Each run is a fresh interpreter against a fresh SQLite file, timing
+``import app`` and the first two requests for every DB_INIT mode.  One extra
+``python -X importtime`` run lists the slowest imports (it is kept out of
+the timings because the tracing itself slows imports down).
+``--max-import-ms`` turns it into a regression check.
+
+    python backend/bench_startup.py --runs 5 --max-import-ms 400
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside the child interpreter; prints one JSON line on stdout.
+CHILD = r"""
+import contextlib, io, json, time
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+with contextlib.redirect_stdout(io.StringIO()):
+    first = client.get("/api/health")
+    t2 = time.perf_counter()
+    client.get("/api/health")
+    t3 = time.perf_counter()
+assert first.status_code == 200, first.get_data(as_text=True)
+print(json.dumps({"import": t1 - t0, "first": t2 - t1, "second": t3 - t2}))
+"""
+
+
+def run_once(mode: str, tmp: str, index, importtime: bool = False) -> tuple:
+    db_path = os.path.join(tmp, f"{mode}-{index}.db")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        JOBS_DB_PATH=os.path.join(tmp, "jobs.db"),
+        DB_INIT=mode,
+        # A key is set in production; no Gemini call is made by this benchmark.
+        GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "bench-placeholder"),
+    )
+    if mode == "skip":
+        # "skip" assumes the schema was created at build time.
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"],
+                       cwd=HERE, env=env, check=True, capture_output=True)
+    flags = ["-X", "importtime"] if importtime else []
+    proc = subprocess.run([sys.executable, *flags, "-c", CHILD],
+                          cwd=HERE, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def parse_importtime(stderr: str) -> list:
+    """``(cumulative_us, self_us, depth, module)`` for every line of ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and first-request latency of backend/app.py.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per mode")
+    parser.add_argument("--modes", nargs="+", default=["eager", "lazy", "skip"], choices=["eager", "lazy", "skip"])
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="exit non-zero if the median import time of any mode exceeds this")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-startup-")
+    summary = {}
+    for mode in args.modes:
+        samples = [run_once(mode, tmp, i)[0] for i in range(args.runs)]
+        summary[mode] = {k: statistics.median(s[k] for s in samples) * 1000 for k in ("import", "first", "second")}
+
+    print(f"median of {args.runs} fresh interpreters, fresh SQLite file per run")
+    print(f"{'DB_INIT':>8} {'import ms':>10} {'1st req ms':>11} {'2nd req ms':>11} {'total ms':>9}")
+    for mode, s in summary.items():
+        print(f"{mode:>8} {s['import']:>10.1f} {s['first']:>11.1f} {s['second']:>11.1f} "
+              f"{s['import'] + s['first']:>9.1f}")
+
+    breakdown = parse_importtime(run_once(args.modes[0], tmp, "importtime", importtime=True)[1])
+    print(f"\nslowest imports (DB_INIT={args.modes[0]}, cumulative ms, top-level packages):")
+    top_level = [r for r in breakdown if r[2] <= 1]
+    for cumulative_us, self_us, depth, name in sorted(top_level, reverse=True)[: args.top]:
+        print(f"  {cumulative_us / 1000:>8.1f}  {'  ' * depth}{name}")
+
+    if args.max_import_ms is not None:
+        worst = max(s["import"] for s in summary.values())
+        if worst > args.max_import_ms:
+            print(f"\nFAIL: import took {worst:.1f} ms (budget {args.max_import_ms:.1f} ms)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
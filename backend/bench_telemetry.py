@@ -0,0 +1,167 @@
+"""
+Level-2 telemetry ingestion throughput and storage cost.
+
+Posts synthetic game sessions (reaction-time, gaze and tap events) to the
+ingestion endpoint from several client threads, as NDJSON and as binary
+column batches, and reports events/second accepted, request latency and how
+long the background flusher needs to get everything on disk.  Storage is
+compared with one SQLite row per event holding the same fields.
+
+    python backend/bench_telemetry.py --sessions 20 --batches 50 --batch-events 500
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+EVENT_NAMES = ("rt", "gaze", "gaze", "gaze", "tap", "stimulus")
+
+
+def synthetic_events(rng: random.Random, n: int, start_ms: int) -> list:
+    events, t = [], start_ms
+    for i in range(n):
+        t += rng.randint(4, 20)  # ~60-250 Hz gaze plus sparse trial events
+        kind = rng.choice(EVENT_NAMES)
+        event = {"t": t, "type": kind, "game": 1 + (t // 60000) % 3, "trial": t // 2500}
+        if kind == "gaze":
+            event.update(x=round(rng.random(), 4), y=round(rng.random(), 4), value=round(rng.gauss(3.5, 0.4), 3))
+        elif kind == "rt":
+            event["value"] = round(rng.lognormvariate(6.0, 0.3), 1)
+        elif kind == "tap":
+            event.update(x=round(rng.random(), 4), y=round(rng.random(), 4))
+        events.append(event)
+    return events
+
+
+def build_bodies(T, args) -> dict:
+    """session_id -> [(ndjson_body, binary_body, events)]"""
+    rng = random.Random(args.seed)
+    sessions = {}
+    for s in range(args.sessions):
+        batches, t = [], 0
+        for _ in range(args.batches):
+            events = synthetic_events(rng, args.batch_events, t)
+            t = events[-1]["t"]
+            ndjson = "\n".join(json.dumps(e) for e in events).encode("utf-8")
+            batches.append((ndjson, T.encode_binary(T.parse_ndjson(ndjson)), events))
+        sessions[f"bench-{s}"] = batches
+    return sessions
+
+
+def run_clients(A, sessions: dict, fmt: str, suffix: str) -> dict:
+    latencies, lock = [], threading.Lock()
+    retries = [0]
+    content_type = "application/x-cogniwise-telemetry" if fmt == "binary" else "application/x-ndjson"
+
+    def client(session_id, batches):
+        c = A.app.test_client()
+        mine = []
+        for ndjson, binary, _ in batches:
+            body = binary if fmt == "binary" else ndjson
+            while True:
+                started = time.perf_counter()
+                r = c.post(f"/api/level2/telemetry/{session_id}{suffix}?user_id=u-{session_id}",
+                           data=body, content_type=content_type)
+                mine.append(time.perf_counter() - started)
+                if r.status_code != 503:
+                    break
+                with lock:
+                    retries[0] += 1
+                time.sleep(0.05)
+            assert r.status_code == 202, r.get_data(as_text=True)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(sid, batches)) for sid, batches in sessions.items()]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    accepted_s = time.perf_counter() - started
+    A.get_telemetry_writer(A.app).flush()
+    durable_s = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "accepted_s": accepted_s,
+        "durable_s": durable_s,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "retries": retries[0],
+    }
+
+
+def row_per_event_bytes(sessions: dict, path: str) -> int:
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE telemetry_events (id INTEGER PRIMARY KEY, session_id TEXT, user_id TEXT, t INTEGER, "
+                "type TEXT, game INTEGER, trial INTEGER, x REAL, y REAL, value REAL)")
+    con.execute("CREATE INDEX ix_telemetry_events_session ON telemetry_events (session_id, t)")
+    for sid, batches in sessions.items():
+        con.executemany(
+            "INSERT INTO telemetry_events (session_id, user_id, t, type, game, trial, x, y, value) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(sid, f"u-{sid}", e["t"], e["type"], e["game"], e["trial"], e.get("x"), e.get("y"), e.get("value"))
+             for _, _, events in batches for e in events])
+    con.commit()
+    con.execute("VACUUM")
+    con.close()
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Level-2 telemetry ingestion.")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent client sessions")
+    parser.add_argument("--batches", type=int, default=50, help="batches per session")
+    parser.add_argument("--batch-events", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="cogniwise-telemetry-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'telemetry.db')}"
+    os.environ["JOBS_DB_PATH"] = os.path.join(tmp, "jobs.db")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as A
+    import telemetry as T
+
+    sessions = build_bodies(T, args)
+    total = args.sessions * args.batches * args.batch_events
+    sample = next(iter(sessions.values()))[0]
+    print(f"{total} events: {args.sessions} sessions x {args.batches} batches x {args.batch_events} events; "
+          f"batch body {len(sample[0])} B NDJSON / {len(sample[1])} B binary")
+
+    started = time.perf_counter()
+    for ndjson, _, _ in next(iter(sessions.values())):
+        T.parse_ndjson(ndjson)
+    nd_parse = args.batches * args.batch_events / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for _, binary, _ in next(iter(sessions.values())):
+        T.parse_binary(binary)
+    bin_parse = args.batches * args.batch_events / (time.perf_counter() - started)
+    print(f"parse only: NDJSON {nd_parse:,.0f} events/s, binary {bin_parse:,.0f} events/s")
+
+    print(f"{'format':>7} {'accepted ev/s':>14} {'durable ev/s':>13} {'p50 ms':>7} {'p99 ms':>7} {'503s':>5}")
+    for i, fmt in enumerate(("ndjson", "binary")):
+        r = run_clients(A, sessions, fmt, suffix=f"-{i}")
+        print(f"{fmt:>7} {total / r['accepted_s']:>14,.0f} {total / r['durable_s']:>13,.0f} "
+              f"{r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} {r['retries']:>5}")
+
+    with A.app.app_context():
+        stored = int(A.db.session.query(A.db.func.sum(A.TelemetrySession.stored_bytes)).scalar()) // 2
+        chunks = A.TelemetryChunk.query.count() // 2
+    rows = row_per_event_bytes(sessions, os.path.join(tmp, "rows.db"))
+    print(f"storage: {stored / total:.2f} B/event in {chunks} chunks vs {rows / total:.1f} B/event "
+          f"as one row per event (file size incl. index) -> {rows / stored:.0f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
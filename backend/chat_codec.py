@@ -0,0 +1,193 @@
+"""
+Storage codec for chat message bodies.
+
+Most chat turns are a sentence or two, but PDF uploads paste up to 10 KB
+of extracted text into a message and model answers run long.  Bodies of
+at least ``CHAT_COMPRESS_MIN_CHARS`` characters are stored compressed
+(``CHAT_CODEC``: zlib, or zstd when ``zstandard`` is installed, optionally
+with a trained dictionary from ``CHAT_ZSTD_DICT``); shorter ones stay
+plain text.  ``CompressedText`` does this on every write and undoes it on
+every read, so ``ChatMessage.content`` and ``to_dict()`` always see text.
+
+On SQLite the compressed form is a BLOB in the same column, so old plain
+rows stay readable and ``compress_existing`` can convert them in place,
+batch by batch, while the app runs.  Other databases store text untouched
+(Postgres already compresses large values itself).
+
+Stored form: ``b"\\x00"``, a codec tag, the length in characters as 10
+ASCII digits (so SQL can still size messages, see ``stored_chars``), then
+the compressed UTF-8 body.
+"""
+
+import os
+import threading
+import zlib
+
+from sqlalchemy import Integer, case, cast, func, update
+from sqlalchemy.types import Text, TypeDecorator
+
+try:
+    import zstandard as _zstd
+except ImportError:  # optional dependency
+    _zstd = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+MIN_CHARS = _env_int("CHAT_COMPRESS_MIN_CHARS", 512)  # 0 or less: store everything as text
+CODEC = os.getenv("CHAT_CODEC", "zlib")
+DICT_PATH = os.getenv("CHAT_ZSTD_DICT")
+
+_TAGS = {"zlib": b"z", "zstd": b"s", "zstd-dict": b"d"}
+_HEADER = 12  # marker + tag + 10 digits
+
+_stats = {"compressed": 0, "plain": 0, "raw_bytes": 0, "stored_bytes": 0, "decoded": 0}
+_local = threading.local()  # zstd (de)compressor objects are not thread-safe
+_dict = None
+
+
+def codec() -> str:
+    """The codec new writes use, falling back to zlib when zstd is unavailable."""
+    if CODEC != "zstd" or _zstd is None:
+        return "zlib"
+    return "zstd-dict" if DICT_PATH else "zstd"
+
+
+def _dictionary():
+    global _dict
+    if _dict is None:
+        if not DICT_PATH:
+            raise RuntimeError("CHAT_ZSTD_DICT is required to read dictionary-compressed chat messages")
+        with open(DICT_PATH, "rb") as f:
+            _dict = _zstd.ZstdCompressionDict(f.read())
+    return _dict
+
+
+def _zstd_pair(name: str):
+    pair = getattr(_local, name, None)
+    if pair is None:
+        if _zstd is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed chat messages")
+        zdict = _dictionary() if name == "zstd-dict" else None
+        pair = (_zstd.ZstdCompressor(level=6, dict_data=zdict), _zstd.ZstdDecompressor(dict_data=zdict))
+        setattr(_local, name, pair)
+    return pair
+
+
+def encode(text):
+    """Stored form of a message body: ``text`` itself, or compressed bytes when that is smaller."""
+    if text is None or isinstance(text, bytes) or MIN_CHARS <= 0 or len(text) < MIN_CHARS:
+        return text
+    raw = text.encode("utf-8")
+    name = codec()
+    payload = zlib.compress(raw, 6) if name == "zlib" else _zstd_pair(name)[0].compress(raw)
+    if len(payload) + _HEADER >= len(raw):
+        _stats["plain"] += 1
+        return text
+    stored = b"\x00" + _TAGS[name] + b"%010d" % len(text) + payload
+    _stats["compressed"] += 1
+    _stats["raw_bytes"] += len(raw)
+    _stats["stored_bytes"] += len(stored)
+    return stored
+
+
+def decode(value):
+    """Text of a stored message body (plain text is returned as is)."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    tag = value[1:2]
+    payload = value[_HEADER:]
+    if tag == _TAGS["zlib"]:
+        raw = zlib.decompress(payload)
+    elif tag == _TAGS["zstd"]:
+        raw = _zstd_pair("zstd")[1].decompress(payload)
+    elif tag == _TAGS["zstd-dict"]:
+        raw = _zstd_pair("zstd-dict")[1].decompress(payload)
+    else:
+        raise ValueError(f"Unknown chat message codec tag {tag!r}")
+    _stats["decoded"] += 1
+    return raw.decode("utf-8")
+
+
+def stored_chars(column, dialect):
+    """SQL expression for a message's length in characters, compressed or not (on ``dialect``)."""
+    if dialect.name != "sqlite":
+        return func.length(column)  # only SQLite stores compressed bodies (and has typeof)
+    return case(
+        (func.typeof(column) == "blob", cast(func.substr(column, 3, 10), Integer)),
+        else_=func.length(column),
+    )
+
+
+class CompressedText(TypeDecorator):
+    """``Text`` column whose large values are stored compressed (SQLite only)."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode(value) if dialect.name == "sqlite" else value
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+def compress_existing(session, model, column: str = "content", batch_size: int = 500,
+                      max_batches: int = None, dry_run: bool = False) -> dict:
+    """
+    Compress the plain-text rows of ``model`` that are over the threshold.
+
+    Keyset-paginated by id and committed per batch, so it can run next to
+    live traffic and be interrupted and rerun at any point.
+    """
+    col = getattr(model, column)
+    stats = {"table": model.__tablename__, "codec": codec(), "scanned": 0, "compressed": 0,
+             "raw_bytes": 0, "stored_bytes": 0}
+    if MIN_CHARS <= 0 or session.get_bind(mapper=model).dialect.name != "sqlite":
+        return stats
+    last_id, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        rows = (
+            session.query(model.id, col)
+            .filter(model.id > last_id, func.typeof(col) == "text", func.length(col) >= MIN_CHARS)
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        batches += 1
+        updates = []
+        for row_id, text in rows:
+            stored = encode(text)
+            stats["scanned"] += 1
+            if isinstance(stored, bytes):
+                stats["compressed"] += 1
+                stats["raw_bytes"] += len(text.encode("utf-8"))
+                stats["stored_bytes"] += len(stored)
+                updates.append({"id": row_id, column: stored})
+        if updates and not dry_run:
+            session.execute(update(model), updates)
+        session.commit()
+    return stats
+
+
+def train_dictionary(samples: list, size: int = 64 * 1024) -> bytes:
+    """Train a zstd dictionary on message bodies (for ``CHAT_ZSTD_DICT``)."""
+    if _zstd is None:
+        raise RuntimeError("zstandard is required to train a dictionary")
+    return _zstd.train_dictionary(size, [s.encode("utf-8") for s in samples]).as_bytes()
+
+
+def stats() -> dict:
+    out = dict(_stats, codec=codec(), min_chars=MIN_CHARS)
+    if out["raw_bytes"]:
+        out["ratio"] = round(out["raw_bytes"] / out["stored_bytes"], 2)
+    return out
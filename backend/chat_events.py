@@ -0,0 +1,40 @@
+"""
+In-process wake-ups for chat history long-polling.
+
+Writers call ``notify(user_id)`` after committing a ChatMessage; readers
+blocked in ``wait(user_id, ...)`` wake immediately.  Waiters also wake on
+a short interval so messages written by another worker process are still
+picked up by re-querying the database.
+"""
+
+import threading
+import time
+
+
+class ChatNotifier:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._versions = {}
+
+    def version(self, user_id: str) -> int:
+        with self._cond:
+            return self._versions.get(user_id, 0)
+
+    def notify(self, user_id: str):
+        with self._cond:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._cond.notify_all()
+
+    def wait(self, user_id: str, seen_version: int, timeout: float) -> bool:
+        """Block until ``user_id`` gets a newer version than ``seen_version``; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._versions.get(user_id, 0) == seen_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+notifier = ChatNotifier()
@@ -0,0 +1,85 @@
+"""
+Rolling conversation summaries for long-running chats.
+
+Once a user's unsummarized history grows past ``threshold_chars``, every
+message except the most recent ``keep_recent`` is folded into a stored
+summary.  Prompt assembly then sends summary + recent turns instead of the
+raw history, so per-turn cost stays bounded however long the chat gets.
+
+``CHAT_SUMMARY_BACKEND=stub`` uses a deterministic extractive summarizer
+(no network) for tests and local runs; the default asks Gemini.
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+THRESHOLD_CHARS = _env_int("CHAT_SUMMARY_THRESHOLD_CHARS", 12000)
+KEEP_RECENT = _env_int("CHAT_SUMMARY_KEEP_RECENT", 10)
+MAX_SUMMARY_CHARS = _env_int("CHAT_SUMMARY_MAX_CHARS", 2000)
+
+
+def needs_compaction(unsummarized_chars: int, unsummarized_count: int,
+                     threshold_chars: int = None, keep_recent: int = None) -> bool:
+    threshold_chars = THRESHOLD_CHARS if threshold_chars is None else threshold_chars
+    keep_recent = KEEP_RECENT if keep_recent is None else keep_recent
+    return unsummarized_chars >= threshold_chars and unsummarized_count > keep_recent
+
+
+def split_for_compaction(messages: list, keep_recent: int = None):
+    """Split oldest-first ``messages`` into ``(to_summarize, to_keep)``."""
+    keep_recent = KEEP_RECENT if keep_recent is None else keep_recent
+    if len(messages) <= keep_recent:
+        return [], list(messages)
+    cut = len(messages) - keep_recent
+    return list(messages[:cut]), list(messages[cut:])
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: max(0, limit - 3)] + "..."
+
+
+def stub_summarize(previous_summary: str, messages: list, max_chars: int = None) -> str:
+    """
+    Deterministic summary: keeps the previous summary and the opening of each
+    new turn, trimmed oldest-first to ``max_chars``.
+    """
+    max_chars = MAX_SUMMARY_CHARS if max_chars is None else max_chars
+    lines = [line for line in (previous_summary or "").splitlines() if line.strip()]
+    for m in messages:
+        label = "User" if m["role"] == "user" else "Model"
+        lines.append(f"- {label}: {_clip(m['content'], 160)}")
+    while lines and len("\n".join(lines)) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def build_summary_prompt(previous_summary: str, messages: list, max_chars: int) -> str:
+    transcript = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Model'}: {_clip(m['content'], 2000)}" for m in messages
+    )
+    return (
+        "You maintain a running summary of a conversation between a user and CogniWise AI, "
+        "a cognitive-health assistant. Update the summary with the new turns below. Keep facts the "
+        "assistant will need later: the user's concerns, symptoms, assessment results, uploaded "
+        "documents and advice already given. Write plain text, at most "
+        f"{max_chars} characters.\n\n"
+        f"CURRENT SUMMARY:\n{previous_summary or '(none)'}\n\n"
+        f"NEW TURNS:\n{transcript}\n\nUPDATED SUMMARY:"
+    )
+
+
+def summarize(previous_summary: str, messages: list, max_chars: int = None, generate=None) -> str:
+    """Fold ``messages`` into ``previous_summary`` with the configured backend."""
+    max_chars = MAX_SUMMARY_CHARS if max_chars is None else max_chars
+    if os.getenv("CHAT_SUMMARY_BACKEND", "gemini") == "stub" or generate is None:
+        return stub_summarize(previous_summary, messages, max_chars)
+    text = generate(build_summary_prompt(previous_summary, messages, max_chars))
+    return (text or "").strip()[:max_chars]
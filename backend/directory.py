@@ -0,0 +1,297 @@
+"""
+Local directory of specialists and facilities for the Level-3 referral
+endpoints, with a grid index for nearest / within-radius lookups.
+
+The dataset is a CSV or JSON file (``DIRECTORY_PATH``; a JSON file may be a
+list of objects or ``{"entries": [...]}``) with one row per entry::
+
+    name, kind, specialty, lat, lon, phone, emergency_contact, address, rating
+
+``kind`` is ``doctor`` or ``hospital``.  The free-text ``specialty`` is mapped
+to the codes in ``SPECIALTIES`` (an entry may match several), which is what
+``specialty=`` filters on.
+
+Each kind gets its own ``GridIndex``: entries sorted by the key of the
+``DIRECTORY_CELL_DEG`` lat/lon cell they fall in, so the cells overlapping a
+query's bounding box are a handful of contiguous slices found with
+``searchsorted``; only those candidates get an exact haversine distance.
+k-nearest queries widen the radius until k matches are inside it.
+
+``current_directory()`` reloads the file when its mtime changes (checked at
+most every ``DIRECTORY_CHECK_SECONDS``).
+"""
+
+import csv
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+DIRECTORY_PATH = os.getenv("DIRECTORY_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "directory.csv")
+CELL_DEG = float(os.getenv("DIRECTORY_CELL_DEG", "0.25"))
+CHECK_SECONDS = float(os.getenv("DIRECTORY_CHECK_SECONDS", "30"))
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+KINDS = ("doctor", "hospital")
+
+# code -> substrings of the free-text specialty that map to it
+SPECIALTIES = {
+    "neurologist": ("neurolog",),
+    "geriatric": ("geriatr", "memory clinic"),
+    "adhd_asd_psychiatrist": ("psychiatr", "adhd", "autism", "asd"),
+}
+SPECIALTY_ALIASES = {
+    "neurology": ("neurologist",),
+    "geriatrics": ("geriatric",),
+    "geriatric_specialist": ("geriatric",),
+    "psychiatrist": ("adhd_asd_psychiatrist",),
+    "adhd": ("adhd_asd_psychiatrist",),
+    "asd": ("adhd_asd_psychiatrist",),
+    "dementia": ("neurologist", "geriatric"),
+}
+_BITS = {code: 1 << i for i, code in enumerate(SPECIALTIES)}
+
+
+class DirectoryError(ValueError):
+    """The dataset or a query is invalid."""
+
+
+def specialty_codes(text: str) -> list:
+    text = (text or "").lower()
+    return [code for code, needles in SPECIALTIES.items() if any(n in text for n in needles)]
+
+
+def specialty_mask(specialties) -> int:
+    """Bit mask for a comma-separated string or list of codes/aliases (0 = any)."""
+    if isinstance(specialties, str):
+        specialties = specialties.split(",")
+    mask = 0
+    for name in specialties or ():
+        name = name.strip().lower().replace(" ", "_").replace("/", "_")
+        if not name:
+            continue
+        codes = (name,) if name in _BITS else SPECIALTY_ALIASES.get(name)
+        if not codes:
+            raise DirectoryError(f"unknown specialty {name!r}; use one of {', '.join(SPECIALTIES)}")
+        for code in codes:
+            mask |= _BITS[code]
+    return mask
+
+
+def _float(value, default=None):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value if math.isfinite(value) else default
+
+
+def normalize_entry(raw: dict) -> dict:
+    """One dataset row as served by the API, or None if it has no usable location."""
+    lat, lon = _float(raw.get("lat")), _float(raw.get("lon", raw.get("lng")))
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return None
+    kind = (raw.get("kind") or "doctor").strip().lower()
+    if kind not in KINDS:
+        return None
+    entry = {
+        "name": (raw.get("name") or "").strip(),
+        "kind": kind,
+        "specialty": (raw.get("specialty") or "").strip(),
+        "specialties": specialty_codes(raw.get("specialty")),
+        "lat": lat,
+        "lon": lon,
+        "address": (raw.get("address") or "").strip(),
+        "rating": _float(raw.get("rating")),
+        "contact": (raw.get("phone") or raw.get("contact") or "").strip(),
+    }
+    if kind == "hospital":
+        entry["emergency_contact"] = (raw.get("emergency_contact") or "").strip() or entry["contact"]
+    return entry
+
+
+def read_entries(path: str) -> list:
+    if path.endswith(".json"):
+        with open(path) as f:
+            data = json.load(f)
+        rows = data.get("entries", []) if isinstance(data, dict) else data
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    return [e for e in map(normalize_entry, rows) if e is not None]
+
+
+class GridIndex:
+    """Entries of one kind, sorted by grid cell, with vectorized distance filtering."""
+
+    def __init__(self, entries: list, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self.rows = int(math.ceil(180.0 / cell_deg))
+        self.cols = int(math.ceil(360.0 / cell_deg))
+        lat = np.array([e["lat"] for e in entries], dtype=np.float64)
+        lon = np.array([e["lon"] for e in entries], dtype=np.float64)
+        keys = self._row(lat) * self.cols + self._col(lon)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.entries = [entries[i] for i in order]
+        self.lat = np.radians(lat[order])
+        self.lon = np.radians(lon[order])
+        self.cos_lat = np.cos(self.lat)
+        self.mask = np.array([sum(_BITS[c] for c in e["specialties"]) for e in self.entries], dtype=np.int64)
+        rating = np.array([e["rating"] if e["rating"] is not None else -1.0 for e in self.entries])
+        self.by_rating = np.argsort(-rating, kind="stable")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _row(self, lat):
+        return np.clip(np.floor((lat + 90.0) / self.cell_deg), 0, self.rows - 1).astype(np.int64)
+
+    def _col(self, lon):
+        return np.floor((lon + 180.0) / self.cell_deg).astype(np.int64) % self.cols
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Positions of all entries in cells overlapping the radius's bounding box."""
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(angle)
+        lat_lo, lat_hi = lat - dlat, lat + dlat
+        if lat_lo <= -90 or lat_hi >= 90 or math.sin(angle) >= math.cos(math.radians(lat)):
+            col_ranges = [(0, self.cols - 1)]  # a pole or the whole longitude range is inside
+        else:
+            dlon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+            c0, c1 = int(self._col(np.float64(lon - dlon))), int(self._col(np.float64(lon + dlon)))
+            col_ranges = [(c0, c1)] if c0 <= c1 else [(c0, self.cols - 1), (0, c1)]  # antimeridian
+        r0, r1 = int(self._row(np.float64(lat_lo))), int(self._row(np.float64(lat_hi)))
+        rows = np.arange(r0, r1 + 1, dtype=np.int64) * self.cols
+        starts = np.concatenate([rows + c0 for c0, _ in col_ranges])
+        ends = np.concatenate([rows + c1 for _, c1 in col_ranges])
+        lo = np.searchsorted(self.keys, starts, side="left")
+        hi = np.searchsorted(self.keys, ends, side="right")
+        spans = [(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        if not spans:
+            return np.empty(0, dtype=np.int64)
+        if len(spans) == 1:
+            return np.arange(*spans[0])
+        return np.concatenate([np.arange(a, b) for a, b in spans])
+
+    def _distances(self, positions: np.ndarray, lat: float, lon: float) -> np.ndarray:
+        lat, lon = math.radians(lat), math.radians(lon)
+        a = (np.sin((self.lat[positions] - lat) / 2.0) ** 2
+             + math.cos(lat) * self.cos_lat[positions] * np.sin((self.lon[positions] - lon) / 2.0) ** 2)
+        return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def within(self, lat: float, lon: float, radius_km: float, mask: int = 0, limit: int = None) -> list:
+        """(distance_km, entry) for matches within ``radius_km``, nearest first."""
+        positions = self._candidates(lat, lon, radius_km)
+        if mask:
+            positions = positions[(self.mask[positions] & mask) != 0]
+        distances = self._distances(positions, lat, lon)
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+        if limit is not None and len(distances) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            positions, distances = positions[top], distances[top]
+        order = np.argsort(distances, kind="stable")
+        return [(float(distances[i]), self.entries[positions[i]]) for i in order.tolist()]
+
+    def nearest(self, lat: float, lon: float, k: int, mask: int = 0, start_km: float = 25.0) -> list:
+        """The ``k`` nearest matches: widen the radius until k are inside it (then the k are exact)."""
+        radius = start_km
+        while True:
+            found = self.within(lat, lon, radius, mask, k)
+            if len(found) >= k or radius >= MAX_DISTANCE_KM:
+                return found
+            radius = min(radius * 4.0, MAX_DISTANCE_KM)
+
+    def top_rated(self, k: int, mask: int = 0) -> list:
+        positions = self.by_rating
+        if mask:
+            positions = positions[(self.mask[positions] & mask) != 0]
+        return [(None, self.entries[i]) for i in positions[:k].tolist()]
+
+
+class Directory:
+    def __init__(self, entries: list, path: str = None, mtime: float = None):
+        self.path = path
+        self.mtime = mtime
+        self.indexes = {kind: GridIndex([e for e in entries if e["kind"] == kind]) for kind in KINDS}
+
+    def __len__(self):
+        return sum(len(i) for i in self.indexes.values())
+
+    def search(self, kind: str, lat: float = None, lon: float = None, radius_km: float = None,
+               limit: int = 10, specialties=None) -> list:
+        """
+        Entries of ``kind`` as API dicts with ``distance_km``: the ``limit``
+        nearest to lat/lon (or all within ``radius_km``, nearest first, capped
+        at ``limit``); without a location, the best rated.
+        """
+        index = self.indexes[kind]
+        mask = specialty_mask(specialties)
+        if lat is None or lon is None:
+            found = index.top_rated(limit, mask)
+        elif radius_km is not None:
+            found = index.within(lat, lon, radius_km, mask, limit)
+        else:
+            found = index.nearest(lat, lon, limit, mask)
+        results = []
+        for distance, entry in found:
+            item = {k: v for k, v in entry.items() if k != "kind"}
+            item["distance_km"] = round(distance, 2) if distance is not None else None
+            item["distance"] = f"{distance:.1f} km" if distance is not None else None
+            results.append(item)
+        return results
+
+    def stats(self) -> dict:
+        return {"path": self.path, **{f"{kind}s": len(index) for kind, index in self.indexes.items()}}
+
+
+def load_directory(path: str = DIRECTORY_PATH) -> Directory:
+    return Directory(read_entries(path), path, os.path.getmtime(path))
+
+
+_directory = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def current_directory() -> Directory:
+    """The loaded directory (empty if the dataset file does not exist), reloaded when the file changes."""
+    global _directory, _checked_at
+    now = time.monotonic()
+    if _directory is not None and now - _checked_at < CHECK_SECONDS:
+        return _directory
+    with _lock:
+        if _directory is not None and now - _checked_at < CHECK_SECONDS:
+            return _directory
+        _checked_at = now
+        try:
+            mtime = os.path.getmtime(DIRECTORY_PATH)
+        except OSError:
+            mtime = None
+        if _directory is not None and mtime == _directory.mtime:
+            return _directory
+        if mtime is None:
+            _directory = Directory([], DIRECTORY_PATH)
+            return _directory
+        try:
+            started = time.perf_counter()
+            _directory = load_directory(DIRECTORY_PATH)
+            print(f"Directory loaded: {len(_directory)} entries from {DIRECTORY_PATH} "
+                  f"in {time.perf_counter() - started:.2f}s")
+        except (OSError, ValueError, csv.Error) as e:
+            print(f"Directory load failed: {e}")
+            if _directory is None:
+                _directory = Directory([], DIRECTORY_PATH)
+    return _directory
+
+
+def directory_stats() -> dict:
+    if _directory is None:
+        return {"loaded": False}
+    return {"loaded": True, **_directory.stats()}
@@ -0,0 +1,323 @@
+"""
+Streaming data export of assessment and Level-2 results (CSV, or Parquet
+when pyarrow is installed).
+
+Rows are read in ``yield_per`` chunks from a plain column select (no ORM
+identity map), followed by the archived batches, and written out chunk by
+chunk, so memory stays flat however many rows are exported.
+
+JSON columns are flattened into ``<column>.<key>`` fields.  A CSV header
+has to come first, so the flattened fields are taken from a bounded sample
+of the oldest and newest rows instead of a full scan, which keeps the time
+to first byte constant.  Keys outside the sample, and values that do not
+fit a field's type, go into ``<column>._other`` as JSON, so nothing is lost.
+
+De-identification drops direct identifiers, replaces ``user_id`` with a
+keyed pseudonym (stable across exports that use the same key), keeps only
+the age band and truncates timestamps to the day.
+
+    python -m backend.export assessment_results --out results.csv --deidentify
+"""
+
+import argparse
+import csv
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import os
+import sys
+from datetime import datetime
+
+try:
+    from archive import decode_rows
+except ImportError:
+    from backend.archive import decode_rows
+
+JSON_COLUMNS = {
+    "assessment_results": ("questionnaire_responses", "ml_features"),
+    "level2_results": ("raw_metrics", "domain_scores"),
+}
+IDENTIFYING_COLUMNS = ("user_name", "user_email", "address", "admin_notes", "age")
+SAMPLE_ROWS = int(os.getenv("EXPORT_SAMPLE_ROWS", "2000"))
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
+
+
+def _pyarrow():
+    # optional dependency, and it pulls in numpy: only imported once Parquet is asked for
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def parquet_available() -> bool:
+    return _pyarrow() is not None
+
+
+def pseudonym(user_id, key: bytes) -> str:
+    if user_id is None:
+        return None
+    return hmac.new(key, str(user_id).encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+def _kind(value) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    return "text"
+
+
+def _loads(raw) -> dict:
+    try:
+        value = json.loads(raw) if raw else {}
+    except (TypeError, ValueError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+class ExportSpec:
+    """Output fields for one table, and how to turn a stored row into an output record."""
+
+    def __init__(self, model, flatten: bool = True, deidentify: bool = False, pseudonym_key: bytes = b""):
+        self.model = model
+        self.table = model.__tablename__
+        self.flatten = flatten
+        self.deidentify = deidentify
+        self.pseudonym_key = pseudonym_key
+        self.json_columns = JSON_COLUMNS.get(self.table, ()) if flatten else ()
+        self.json_fields = {}  # column -> {key: kind}
+        self.fields = []       # [(name, kind)]
+
+    def plan(self, sample_rows: list):
+        """Fix the output fields from a sample of stored rows (dicts of column values)."""
+        for column in self.json_columns:
+            keys = {}
+            for row in sample_rows:
+                for key, value in _loads(row.get(column)).items():
+                    kind = _kind(value)
+                    keys[key] = kind if keys.get(key, kind) == kind else "text"
+            self.json_fields[column] = dict(sorted(keys.items()))
+
+        self.fields = []
+        for col in self.model.__table__.columns:
+            if self.deidentify and col.name in IDENTIFYING_COLUMNS:
+                continue
+            if col.name in self.json_fields:
+                self.fields += [(f"{col.name}.{k}", kind) for k, kind in self.json_fields[col.name].items()]
+                self.fields.append((f"{col.name}._other", "text"))
+                continue
+            python_type = col.type.python_type
+            kind = "bool" if python_type is bool else "number" if python_type in (int, float) else "text"
+            self.fields.append((col.name, kind))
+        return self
+
+    def record(self, row: dict) -> dict:
+        out = {}
+        for col in self.model.__table__.columns:
+            name, value = col.name, row.get(col.name)
+            if self.deidentify and name in IDENTIFYING_COLUMNS:
+                continue
+            if name in self.json_fields:
+                known, other = self.json_fields[name], {}
+                for key, v in _loads(value).items():
+                    if key in known and (_kind(v) == known[key] or known[key] == "text"):
+                        out[f"{name}.{key}"] = v if known[key] != "text" or isinstance(v, str) else json.dumps(v)
+                    else:
+                        other[key] = v
+                out[f"{name}._other"] = json.dumps(other) if other else None
+                continue
+            if isinstance(value, str) and col.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            if isinstance(value, datetime):
+                value = value.date().isoformat() if self.deidentify else value.isoformat()
+            if self.deidentify and name == "user_id":
+                value = pseudonym(value, self.pseudonym_key)
+            out[name] = value
+        return out
+
+
+def _time_column(model):
+    return model.__table__.c["assessed_at"]
+
+
+def sample_rows(session, model, limit: int = SAMPLE_ROWS) -> list:
+    table = model.__table__
+    half = max(1, limit // 2)
+    oldest = session.execute(table.select().order_by(table.c.id).limit(half)).mappings().all()
+    newest = session.execute(table.select().order_by(table.c.id.desc()).limit(half)).mappings().all()
+    return [dict(r) for r in oldest] + [dict(r) for r in newest]
+
+
+def iter_stored_rows(session, model, batch_model=None, since: datetime = None, until: datetime = None,
+                     chunk_rows: int = CHUNK_ROWS):
+    """Hot rows in id order (``yield_per`` chunks), then archived rows batch by batch; yields lists of dicts."""
+    yield from iter_hot_rows(session, model, since, until, chunk_rows)
+    yield from iter_archived_rows(session, model, batch_model, since, until)
+
+
+def iter_hot_rows(session, model, since: datetime = None, until: datetime = None, chunk_rows: int = CHUNK_ROWS):
+    table = model.__table__
+    stmt = table.select().order_by(table.c.id)
+    if since:
+        stmt = stmt.where(_time_column(model) >= since)
+    if until:
+        stmt = stmt.where(_time_column(model) < until)
+    result = session.execute(stmt.execution_options(yield_per=chunk_rows))
+    for partition in result.mappings().partitions():
+        yield [dict(r) for r in partition]
+
+
+def iter_archived_rows(session, model, batch_model=None, since: datetime = None, until: datetime = None):
+    if batch_model is None:
+        return
+    batches = session.execute(
+        batch_model.__table__.select()
+        .where(batch_model.__table__.c.table_name == model.__tablename__)
+        .order_by(batch_model.__table__.c.id)
+        .execution_options(yield_per=16)
+    ).mappings()
+    for batch in batches:
+        if since and batch["newest_at"] < since or until and batch["oldest_at"] >= until:
+            continue
+        rows = decode_rows(batch["payload"], batch["codec"])
+        if since or until:
+            rows = [r for r in rows if _in_range(r[_time_column(model).name], since, until)]
+        if rows:
+            yield rows
+
+
+def _in_range(value, since, until) -> bool:
+    at = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return (not since or at >= since) and (not until or at < until)
+
+
+def stream_csv(spec: ExportSpec, chunks):
+    """Yield CSV text: the header immediately, then one string per chunk of rows."""
+    names = [name for name, _ in spec.fields]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=names, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(spec.record(r) for r in rows)
+        yield buffer.getvalue()
+
+
+class _Drain:
+    """Write-only file object pyarrow writes into; ``take()`` hands back what was written so far."""
+
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def stream_parquet(spec: ExportSpec, chunks):
+    """Yield Parquet bytes, one row group per chunk of rows."""
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet export")
+    types = {"number": pa.float64(), "bool": pa.bool_(), "text": pa.string()}
+    # Integer-valued columns (ids, counts) stay exact in float64 up to 2**53.
+    schema = pa.schema([(name, types[kind]) for name, kind in spec.fields])
+    sink = _Drain()
+    writer = pa.parquet.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    for rows in chunks:
+        records = [spec.record(r) for r in rows]
+        writer.write_table(pa.Table.from_pylist(records, schema=schema))
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
+
+
+def export(session, model, batch_model=None, fmt: str = "csv", flatten: bool = True, deidentify: bool = False,
+           pseudonym_key: bytes = b"", since: datetime = None, until: datetime = None, chunk_rows: int = CHUNK_ROWS,
+           shards=None):
+    """
+    Generator of output chunks (str for CSV, bytes for Parquet).  With
+    sharded storage (``shards``, a ``sharding.ShardSet``) the sample and the
+    hot rows are read from all shards in parallel; rows are then in id order
+    per shard, not overall.
+    """
+    spec = ExportSpec(model, flatten, deidentify, pseudonym_key)
+    if shards is None:
+        spec.plan(sample_rows(session, model) if flatten else [])
+        chunks = iter_stored_rows(session, model, batch_model, since, until, chunk_rows)
+    else:
+        spec.plan([r for rows in shards.map(lambda s: sample_rows(s, model)) for r in rows] if flatten else [])
+        chunks = itertools.chain(
+            shards.stream(lambda s: iter_hot_rows(s, model, since, until, chunk_rows)),
+            iter_archived_rows(session, model, batch_model, since, until),
+        )
+    return stream_parquet(spec, chunks) if fmt == "parquet" else stream_csv(spec, chunks)
+
+
+def run_export(table: str, out, fmt: str = "csv", flatten: bool = True, deidentify: bool = False,
+               since: datetime = None, until: datetime = None, include_archived: bool = True) -> int:
+    """Write an export to the binary file object ``out``; used by the CLI.  Returns bytes written."""
+    try:
+        from app import app, db, init_db, AssessmentResult, Level2Result, ArchiveBatch
+    except ImportError:
+        from backend.app import app, db, init_db, AssessmentResult, Level2Result, ArchiveBatch
+
+    models = {m.__tablename__: m for m in (AssessmentResult, Level2Result)}
+    init_db(app)
+    written = 0
+    with app.app_context():
+        key = os.getenv("EXPORT_PSEUDONYM_KEY", app.config["SECRET_KEY"]).encode("utf-8")
+        for chunk in export(db.session, models[table], ArchiveBatch if include_archived else None, fmt,
+                            flatten, deidentify, key, since, until, shards=app.extensions.get("shards")):
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            out.write(data)
+            written += len(data)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream assessment data to CSV or Parquet.")
+    parser.add_argument("table", choices=sorted(JSON_COLUMNS))
+    parser.add_argument("--out", default="-", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--deidentify", action="store_true", help="drop identifiers and pseudonymize user_id")
+    parser.add_argument("--no-flatten", action="store_true", help="keep JSON columns as JSON text")
+    parser.add_argument("--no-archived", action="store_true", help="skip rows moved to archive batches")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="assessed_at >= this ISO date")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="assessed_at < this ISO date")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and not parquet_available():
+        parser.error("Parquet export needs pyarrow (pip install pyarrow)")
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        written = run_export(args.table, out, args.format, not args.no_flatten, args.deidentify,
+                             args.since, args.until, not args.no_archived)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"Exported {args.table}: {written} bytes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
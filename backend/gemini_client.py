@@ -0,0 +1,596 @@
+"""
+Resilient access to the Gemini backend.
+
+Every chat turn goes through a GeminiGateway which combines:
+  * a client-side token bucket sized to our quota (requests wait for a
+    token for a bounded time instead of all hitting the API at once),
+  * retries with jittered exponential backoff that honour retry-after
+    hints from 429 responses,
+  * a circuit breaker that fails fast while the upstream is saturated.
+
+FakeGeminiClient mimics ``genai.Client`` with injectable 429s and latency
+so the behaviour can be exercised locally (``GEMINI_BACKEND=fake``).
+"""
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class GeminiUnavailable(Exception):
+    """No model produced an answer; ``status`` is the HTTP code to surface."""
+
+    def __init__(self, message: str, status: int = 500, retry_after: float = None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float, max_waiters: int = 32, clock=time.monotonic):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(capacity)
+        self.max_waiters = max_waiters
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._waiters = 0
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take one token, waiting up to ``timeout`` seconds. Returns False on timeout or a full queue."""
+        deadline = self._clock() + timeout
+        with self._cond:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            if self._waiters >= self.max_waiters:
+                return False
+            self._waiters += 1
+            try:
+                while True:
+                    needed = (1.0 - self._tokens) / self.rate
+                    remaining = deadline - self._clock()
+                    if needed > remaining:
+                        return False
+                    self._cond.wait(needed)
+                    self._refill()
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return True
+            finally:
+                self._waiters -= 1
+
+    def time_until_token(self) -> float:
+        with self._cond:
+            self._refill()
+            return max(0.0, (1.0 - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Drain the bucket so nobody calls upstream for roughly ``seconds`` (after a 429)."""
+        with self._cond:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: let a single probe through.
+            if self._probe_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def release_probe(self):
+        """The admitted half-open probe never reached upstream; let the next caller probe instead."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, open_for: float = None):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                if open_for:
+                    # Respect a longer server-provided retry-after.
+                    self._opened_at += max(0.0, open_for - self.reset_timeout)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """Full-jitter exponential backoff; a server hint is treated as a lower bound."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return max(backoff, retry_after)
+        return backoff
+
+
+_RETRY_DELAY_RE = re.compile(r"retry(?:Delay|[ _-]?after| in)['\"]?\s*[:=]?\s*['\"]?(\d+(?:\.\d+)?)\s*s", re.I)
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if code == 429:
+        return True
+    msg = str(exc)
+    return "429" in msg or "RESOURCE_EXHAUSTED" in msg
+
+
+def retry_after_hint(exc: Exception):
+    """Extract a retry-after (seconds) from an SDK error, if the upstream gave one."""
+    value = getattr(exc, "retry_after", None)
+    if value is not None:
+        return float(value)
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    match = _RETRY_DELAY_RE.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies per model."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(model_name)
+            if samples is None:
+                samples = self._samples[model_name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, model_name: str, q: float):
+        """``q`` quantile of the window, or None until ``min_samples`` calls were seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(model_name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _cancel(futures):
+    for future in futures:
+        future.cancel()
+
+
+class GeminiGateway:
+    def __init__(self, client_factory, models, limiter: TokenBucket, breaker: CircuitBreaker,
+                 retry: RetryPolicy, max_wait: float = 10.0, sleep=time.sleep,
+                 hedge: bool = False, hedge_delay: float = 2.0, hedge_percentile: float = 0.95,
+                 hedge_min_delay: float = 0.2, hedge_max_delay: float = 10.0):
+        self._client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.models = list(models)
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retry = retry
+        self.max_wait = max_wait
+        self._sleep = sleep
+
+        # Hedging: fire the next model if the primary is slower than its p95.
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedges_fired = 0
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini-hedge") if hedge else None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def _call(self, model_name: str, prompt: str) -> str:
+        started = time.monotonic()
+        response = self.client.models.generate_content(model=model_name, contents=[prompt])
+        text = getattr(response, "text", None)
+        if text:
+            self.latency.record(model_name, time.monotonic() - started)
+        return text
+
+    def hedge_delay_for(self, model_name: str) -> float:
+        observed = self.latency.percentile(model_name, self.hedge_percentile)
+        delay = self.hedge_delay if observed is None else observed
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay))
+
+    def _attempt_sequential(self, models, prompt):
+        """Try ``models`` in order. Returns ``(text, last_error, rate_limited_error)``."""
+        last_error = None
+        for model_name in models:
+            try:
+                print(f"Attempting chat with model: {model_name}")
+                text = self._call(model_name, prompt)
+            except Exception as e:
+                last_error = e
+                if is_rate_limited(e):
+                    # Models share the project quota, so falling through to the next one
+                    # only burns another request; back off and retry instead.
+                    return None, e, e
+                print(f"Model {model_name} failed: {e}")
+                continue
+            if text:
+                return text, None, None
+            print(f"Model {model_name} returned empty text.")
+        return None, last_error, None
+
+    def _attempt_hedged(self, prompt):
+        """
+        Start the primary model; if it has not answered within its adaptive
+        hedge delay, race the next model against it and keep the first answer.
+        """
+        primary, secondary = self.models[0], self.models[1]
+        print(f"Attempting chat with model: {primary}")
+        pending = {self._executor.submit(self._call, primary, prompt)}
+        secondary_started = False
+        done, _ = wait(pending, timeout=self.hedge_delay_for(primary))
+        if not done and self.limiter.acquire(0):
+            print(f"Hedging {primary} with {secondary} after {self.hedge_delay_for(primary):.2f}s")
+            pending.add(self._executor.submit(self._call, secondary, prompt))
+            secondary_started = True
+            self.hedges_fired += 1
+
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text = future.result()
+                except Exception as e:
+                    last_error = e
+                    if is_rate_limited(e):
+                        _cancel(pending)
+                        return None, e, e
+                    print(f"Hedged call failed: {e}")
+                    continue
+                if text:
+                    # The SDK call cannot be interrupted mid-flight; the loser's
+                    # result is simply discarded when it arrives.
+                    _cancel(pending)
+                    return text, None, None
+            if not pending and not secondary_started:
+                # Primary failed before the hedge fired: plain fallback.
+                print(f"Attempting chat with model: {secondary}")
+                pending = {self._executor.submit(self._call, secondary, prompt)}
+                secondary_started = True
+
+        if len(self.models) > 2:
+            return self._attempt_sequential(self.models[2:], prompt)
+        return None, last_error, None
+
+    def _check_admission(self):
+        if not self.breaker.allow():
+            raise GeminiUnavailable("AI Usage Limit Exceeded. Please wait a minute and try again.",
+                                    429, retry_after=self.breaker.retry_after())
+
+    def _busy(self) -> GeminiUnavailable:
+        return GeminiUnavailable("AI service is busy. Please try again shortly.", 429,
+                                 retry_after=1.0 / self.limiter.rate)
+
+    def _backoff_after(self, attempt: int, rate_limited: Exception):
+        """Record a 429 and return the delay before the next attempt, or None to give up."""
+        hint = retry_after_hint(rate_limited)
+        self.breaker.record_failure(open_for=hint)
+        if hint:
+            self.limiter.penalize(hint)
+        if attempt + 1 >= self.retry.max_attempts:
+            return None
+        delay = self.retry.delay(attempt, hint)
+        return None if delay > self.max_wait else delay
+
+    def _unavailable(self, last_error: Exception) -> GeminiUnavailable:
+        error_msg = str(last_error) if last_error else "Unknown error"
+        if last_error is not None and is_rate_limited(last_error):
+            return GeminiUnavailable("AI Usage Limit Exceeded. Please wait a minute and try again.",
+                                     429, retry_after=retry_after_hint(last_error))
+        return GeminiUnavailable(f"AI Service Unavailable: {error_msg}", 500)
+
+    def generate(self, prompt: str) -> str:
+        last_error = None
+        for attempt in range(self.retry.max_attempts):
+            self._check_admission()
+            if not self.limiter.acquire(self.max_wait):
+                self.breaker.release_probe()
+                raise self._busy()
+
+            if self.hedge and len(self.models) > 1:
+                text, error, rate_limited = self._attempt_hedged(prompt)
+            else:
+                text, error, rate_limited = self._attempt_sequential(self.models, prompt)
+            if text:
+                self.breaker.record_success()
+                return text
+            last_error = error or last_error
+
+            if rate_limited is None:
+                # Every model failed for a non-quota reason; retrying will not help.
+                self.breaker.record_failure()
+                break
+            delay = self._backoff_after(attempt, rate_limited)
+            if delay is None:
+                break
+            self._sleep(delay)
+
+        raise self._unavailable(last_error)
+
+    # -- asyncio variant (used by the ASGI serving mode) -------------------
+
+    async def _call_async(self, model_name: str, prompt: str) -> str:
+        started = time.monotonic()
+        aio = getattr(self.client, "aio", None)
+        if aio is not None:
+            response = await aio.models.generate_content(model=model_name, contents=[prompt])
+        else:
+            response = await asyncio.to_thread(self.client.models.generate_content,
+                                               model=model_name, contents=[prompt])
+        text = getattr(response, "text", None)
+        if text:
+            self.latency.record(model_name, time.monotonic() - started)
+        return text
+
+    async def _acquire_async(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not self.limiter.acquire(0):
+            wait_for = self.limiter.time_until_token()
+            if time.monotonic() + wait_for > deadline:
+                return False
+            await asyncio.sleep(wait_for)
+        return True
+
+    async def generate_async(self, prompt: str) -> str:
+        """Same policy as ``generate`` without holding a thread; models are tried sequentially."""
+        last_error = None
+        for attempt in range(self.retry.max_attempts):
+            self._check_admission()
+            if not await self._acquire_async(self.max_wait):
+                self.breaker.release_probe()
+                raise self._busy()
+
+            rate_limited = None
+            for model_name in self.models:
+                try:
+                    text = await self._call_async(model_name, prompt)
+                except Exception as e:
+                    last_error = e
+                    if is_rate_limited(e):
+                        rate_limited = e
+                        break
+                    print(f"Model {model_name} failed: {e}")
+                    continue
+                if text:
+                    self.breaker.record_success()
+                    return text
+
+            if rate_limited is None:
+                self.breaker.record_failure()
+                break
+            delay = self._backoff_after(attempt, rate_limited)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        raise self._unavailable(last_error)
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "models": self.models,
+            "hedging": self.hedge,
+            "hedges_fired": self.hedges_fired,
+            "hedge_delay": {m: round(self.hedge_delay_for(m), 3) for m in self.models},
+            "latency_p95": {m: self.latency.percentile(m, 0.95) for m in self.models},
+        }
+
+
+class FakeRateLimitError(Exception):
+    code = 429
+
+    def __init__(self, retry_after: float = None):
+        super().__init__(f"429 RESOURCE_EXHAUSTED (fake). retryDelay: '{retry_after or 0}s'")
+        self.retry_after = retry_after
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiClient:
+    """
+    Stand-in for ``genai.Client`` used for local testing and benchmarks.
+
+    ``quota_per_sec`` emulates the server-side quota (429 once exceeded),
+    ``error_rate`` injects random 429s and ``latency`` (seconds, or a
+    ``(low, high)`` range) delays every call.  ``model_latency`` overrides
+    the latency per model name.
+    """
+
+    def __init__(self, latency=0.0, error_rate: float = 0.0, quota_per_sec: float = None,
+                 retry_after: float = 1.0, seed: int = None, model_latency: dict = None):
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._quota = TokenBucket(quota_per_sec, max(1.0, quota_per_sec)) if quota_per_sec else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.models = self
+        self.aio = _FakeAsyncClient(self)
+
+    def _plan(self, model: str):
+        with self._lock:
+            self.calls += 1
+            inject = self._random.random() < self.error_rate
+            latency = self.model_latency.get(model, self.latency)
+            if isinstance(latency, (tuple, list)):
+                latency = self._random.uniform(*latency)
+        return latency, inject
+
+    def _respond(self, model: str, inject: bool):
+        if inject or (self._quota is not None and not self._quota.acquire(0)):
+            with self._lock:
+                self.rate_limited += 1
+            raise FakeRateLimitError(self.retry_after)
+        return _FakeResponse(f"[{model}] fake reply")
+
+    def generate_content(self, model: str, contents):
+        latency, inject = self._plan(model)
+        if latency:
+            time.sleep(latency)
+        return self._respond(model, inject)
+
+
+class _FakeAsyncClient:
+    """``client.aio`` counterpart of FakeGeminiClient (latency via asyncio.sleep)."""
+
+    def __init__(self, fake: FakeGeminiClient):
+        self._fake = fake
+        self.models = self
+
+    async def generate_content(self, model: str, contents):
+        latency, inject = self._fake._plan(model)
+        if latency:
+            await asyncio.sleep(latency)
+        return self._fake._respond(model, inject)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def build_gateway_from_env(models=None) -> GeminiGateway:
+    rpm = _env_float("GEMINI_RPM", 15)
+    if os.getenv("GEMINI_BACKEND") == "fake":
+        def client_factory():
+            return FakeGeminiClient(latency=_env_float("GEMINI_FAKE_LATENCY", 0.2),
+                                    error_rate=_env_float("GEMINI_FAKE_429_RATE", 0.0))
+    else:
+        def client_factory():
+            from google import genai
+            return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+    return GeminiGateway(
+        client_factory,
+        models or ['gemini-2.0-flash', 'gemini-flash-latest'],
+        limiter=TokenBucket(rpm / 60.0, _env_float("GEMINI_BURST", 5),
+                            max_waiters=int(_env_float("GEMINI_MAX_QUEUE", 32))),
+        breaker=CircuitBreaker(int(_env_float("GEMINI_BREAKER_THRESHOLD", 5)),
+                               _env_float("GEMINI_BREAKER_RESET", 30)),
+        retry=RetryPolicy(int(_env_float("GEMINI_MAX_RETRIES", 3)), base_delay=0.5, max_delay=8.0),
+        max_wait=_env_float("GEMINI_MAX_WAIT", 10),
+        hedge=os.getenv("GEMINI_HEDGE", "").lower() in ("1", "true", "yes"),
+        hedge_delay=_env_float("GEMINI_HEDGE_DELAY", 2.0),
+        hedge_percentile=_env_float("GEMINI_HEDGE_PERCENTILE", 0.95),
+    )
+
+
+_default_gateway = None
+_default_lock = threading.Lock()
+
+
+def get_gateway() -> GeminiGateway:
+    """Process-wide gateway so every worker thread shares one limiter and breaker."""
+    global _default_gateway
+    if _default_gateway is None:
+        with _default_lock:
+            if _default_gateway is None:
+                _default_gateway = build_gateway_from_env()
+    return _default_gateway
+
+
+if __name__ == "__main__":
+    # Simulate a burst of users against a fake upstream that allows 2 req/s.
+    from concurrent.futures import ThreadPoolExecutor
+
+    fake = FakeGeminiClient(latency=(0.05, 0.2), quota_per_sec=2, retry_after=0.5, seed=1)
+    gateway = GeminiGateway(lambda: fake, ["model-a", "model-b"],
+                            limiter=TokenBucket(2, 2), breaker=CircuitBreaker(5, 2.0),
+                            retry=RetryPolicy(3, 0.2, 2.0), max_wait=5.0)
+
+    def one(i):
+        try:
+            gateway.generate(f"hello {i}")
+            return "ok"
+        except GeminiUnavailable as e:
+            return f"{e.status}"
+
+    started = time.time()
+    with ThreadPoolExecutor(20) as pool:
+        outcomes = list(pool.map(one, range(20)))
+    print({o: outcomes.count(o) for o in set(outcomes)},
+          f"upstream calls={fake.calls} upstream 429s={fake.rate_limited} elapsed={time.time() - started:.1f}s")
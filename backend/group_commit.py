@@ -0,0 +1,148 @@
+"""
+Group commit for SQLite writes.
+
+Every ``COMMIT`` on SQLite takes the database write lock and syncs the
+journal to disk, so a burst of submissions from many threads serializes on
+the disk (and the ones that wait past the busy timeout fail with "database
+is locked").  ``GroupCommitter`` funnels those writes through one writer
+thread instead: callers hand it a unit of work (``work(session)``, which
+adds/updates rows and returns whatever the caller needs), the writer runs
+everything that queued up while the previous commit was in flight (plus up
+to ``max_wait`` seconds more, at most ``max_batch`` units) in a single
+transaction and commits once.  ``run()`` returns only after that commit,
+so a caller's confirmation always means its rows are durable.
+
+A unit that raises does not take the batch down: the batch is rolled back
+and each unit is retried in a transaction of its own, so only the failing
+one reports the error.  Units must therefore only touch the session (no
+side effects that cannot be repeated) and build their ORM objects inside
+``work`` rather than passing in instances from another session.
+
+Sessions are created with ``expire_on_commit=False`` and closed after the
+batch, so returned objects are detached but keep their loaded attributes
+(ids included).
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GroupCommitter:
+    def __init__(self, session_factory, context=None, max_batch: int = 128, max_wait: float = 0.001):
+        self.session_factory = session_factory
+        self.context = context
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self.batches = 0
+        self.units = 0
+        self.retried_batches = 0
+        self.failed_units = 0
+        self.commit_seconds = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Commit what is queued, then stop the writer."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def submit(self, work) -> Future:
+        future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def run(self, work, timeout: float = 30.0):
+        """Queue ``work(session)`` and wait until its batch has committed; returns its result."""
+        return self.submit(work).result(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: list):
+        started = time.perf_counter()
+        if self.context is not None:
+            with self.context():
+                outcomes = self._commit_batch(batch)
+        else:
+            outcomes = self._commit_batch(batch)
+        self.commit_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.units += len(batch)
+        for (_, future), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                self.failed_units += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _commit_batch(self, batch: list) -> list:
+        session = self.session_factory()
+        try:
+            try:
+                results = []
+                for work, _ in batch:
+                    results.append(work(session))
+                    session.flush()  # later units in the batch see these rows
+                session.commit()
+                return [(r, None) for r in results]
+            except Exception as e:
+                session.rollback()
+                if len(batch) == 1:
+                    return [(None, e)]
+            # Isolate the failure: one transaction per unit.
+            self.retried_batches += 1
+            outcomes = []
+            for work, _ in batch:
+                try:
+                    result = work(session)
+                    session.commit()
+                    outcomes.append((result, None))
+                except Exception as e:
+                    session.rollback()
+                    outcomes.append((None, e))
+            return outcomes
+        finally:
+            session.close()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "units": self.units,
+            "mean_batch": round(self.units / self.batches, 2) if self.batches else 0,
+            "mean_commit_ms": round(self.commit_seconds / self.batches * 1000, 3) if self.batches else 0,
+            "retried_batches": self.retried_batches,
+            "failed_units": self.failed_units,
+            "queued": self._queue.qsize(),
+        }
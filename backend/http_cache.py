@@ -0,0 +1,94 @@
+"""
+Response compression and conditional GETs for the JSON API.
+
+``init_app(app)`` registers an ``after_request`` hook that compresses
+buffered text/JSON responses of at least ``HTTP_COMPRESS_MIN_BYTES`` with
+brotli (when the ``brotli`` package is installed) or gzip, whichever the
+client's ``Accept-Encoding`` prefers.  Streamed responses (exports, files
+sent with ``send_file``) and responses that already carry a
+``Content-Encoding`` are left alone.
+
+``@conditional`` marks a read endpoint: its 200 responses get a weak ETag
+derived from the body (unless the view set its own) and a request whose
+``If-None-Match`` matches gets an empty 304 instead.  Because the tag is a
+hash of what would have been sent, it changes whenever anything in the
+payload does (new results, re-scoring, archiving, moved percentiles); the
+view still runs, the saving is the bytes on the wire and the client's parse.
+"""
+
+import functools
+import gzip
+import hashlib
+import os
+
+from flask import current_app, make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "text/")
+
+
+def _encoding(accept) -> str:
+    """Preferred supported encoding for an Accept-Encoding header (None if neither is acceptable)."""
+    offers = [("br", accept.quality("br")) if brotli is not None else ("br", 0), ("gzip", accept.quality("gzip"))]
+    best, quality = max(offers, key=lambda o: o[1])  # ties keep brotli first
+    return best if quality > 0 else None
+
+
+def compress(data: bytes, encoding: str, config) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=config["HTTP_BROTLI_QUALITY"])
+    return gzip.compress(data, compresslevel=config["HTTP_GZIP_LEVEL"], mtime=0)
+
+
+def _compress_response(response):
+    config = current_app.config
+    if (
+        not config["HTTP_COMPRESS"]
+        or request.method == "HEAD"
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < config["HTTP_COMPRESS_MIN_BYTES"]:
+        return response
+    response.set_data(compress(data, encoding, config))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)  # the bytes differ per encoding now
+    return response
+
+
+def conditional(view):
+    """Weak ETag + 304 for a GET view's successful JSON responses."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+            return response
+        if response.get_etag()[0] is None:
+            response.set_etag(hashlib.blake2b(response.get_data(), digest_size=12).hexdigest(), weak=True)
+        response.headers.setdefault("Cache-Control", "private, no-cache")
+        return response.make_conditional(request)
+    return wrapper
+
+
+def init_app(app):
+    app.config.setdefault("HTTP_COMPRESS", os.getenv("HTTP_COMPRESS", "1") not in ("0", "false", "no"))
+    app.config.setdefault("HTTP_COMPRESS_MIN_BYTES", int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024")))
+    app.config.setdefault("HTTP_GZIP_LEVEL", int(os.getenv("HTTP_GZIP_LEVEL", "4")))
+    app.config.setdefault("HTTP_BROTLI_QUALITY", int(os.getenv("HTTP_BROTLI_QUALITY", "4")))
+    app.after_request(_compress_response)
@@ -0,0 +1,334 @@
+"""
+Local background job queue for CogniWise Scan.
+
+Jobs are persisted in a small SQLite database and executed by a pool of
+worker threads inside the API process, so slow work (Gemini calls, PDF
+rendering, PDF parsing) does not have to hold a request thread.  No
+external broker is needed: the SQLite file is the queue.
+
+Workers periodically requeue jobs whose lease has lapsed (a crashed
+process, or a handler hung past ``lease_seconds``) and delete finished
+jobs older than ``retention_seconds``, so uploaded PDFs and rendered
+reports do not stay in the file indefinitely.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after REAL NOT NULL,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_ready ON jobs (status, job_type, priority DESC, run_after);
+"""
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot help (bad input, missing record)."""
+
+
+class JobQueue:
+    def __init__(self, db_path: str, workers: int = 4, poll_interval: float = 0.5,
+                 lease_seconds: float = 300.0, context_factory=None, retention_seconds: float = 86400.0):
+        self.db_path = db_path
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds  # 0 or less keeps finished jobs forever
+        self.maintenance_interval = min(30.0, lease_seconds)
+        self._next_maintenance = 0.0
+        # Called around each job, e.g. ``app.app_context`` so handlers can use the ORM.
+        self.context_factory = context_factory
+
+        self._handlers = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._stopping = False
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    # -- registration -----------------------------------------------------
+
+    def register(self, job_type: str, handler, concurrency: int = 1,
+                 max_attempts: int = 3, backoff_base: float = 2.0, backoff_max: float = 300.0,
+                 internal: bool = False):
+        """
+        Register ``handler(payload) -> result`` for ``job_type``.  ``internal``
+        jobs are left out of ``public_job_types`` (enqueued by the app itself only).
+        """
+        self._handlers[job_type] = {
+            "handler": handler,
+            "internal": internal,
+            "concurrency": max(1, int(concurrency)),
+            "max_attempts": max(1, int(max_attempts)),
+            "backoff_base": backoff_base,
+            "backoff_max": backoff_max,
+        }
+        self._running.setdefault(job_type, 0)
+
+    def job_types(self):
+        return sorted(self._handlers)
+
+    def public_job_types(self):
+        return sorted(t for t, spec in self._handlers.items() if not spec["internal"])
+
+    # -- public API -------------------------------------------------------
+
+    def enqueue(self, job_type: str, payload: dict, priority: int = 0, max_attempts: int = None,
+                delay: float = 0.0) -> str:
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        spec = self._handlers[job_type]
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, job_type, payload, priority, status, attempts, max_attempts,"
+                " run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (job_id, job_type, json.dumps(payload), int(priority), STATUS_QUEUED,
+                 int(max_attempts or spec["max_attempts"]), now + delay, now, now),
+            )
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """Status and result of a job (its payload stays internal to the workers)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_dict(row, payload=False) if row else None
+
+    def wait(self, job_id: str, timeout: float = 30.0, interval: float = 0.05):
+        """Block until the job finishes (or ``timeout``); returns the job dict."""
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+        while job and job["status"] in (STATUS_QUEUED, STATUS_RUNNING) and time.time() < deadline:
+            time.sleep(interval)
+            job = self.get(job_id)
+        return job
+
+    def is_pending(self, job_type: str, key: str, value) -> bool:
+        """Whether a queued or running ``job_type`` job has ``payload[key] == value``."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN (?, ?) AND job_type = ? AND json_extract(payload, ?) = ?"
+                " LIMIT 1",
+                (STATUS_QUEUED, STATUS_RUNNING, job_type, f"$.{key}", value),
+            ).fetchone()
+        return row is not None
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT job_type, status, COUNT(*) FROM jobs GROUP BY job_type, status").fetchall()
+        out = {}
+        for job_type, status, count in rows:
+            out.setdefault(job_type, {})[status] = count
+        return out
+
+    # -- worker pool ------------------------------------------------------
+
+    def start(self):
+        """Start worker threads; safe to call repeatedly."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _worker_loop(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    if self._stopping:
+                        return
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            try:
+                self._execute(job)
+            finally:
+                with self._wakeup:
+                    self._running[job["job_type"]] -= 1
+                    self._wakeup.notify()
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            if now >= self._next_maintenance:
+                self._next_maintenance = now + self.maintenance_interval
+                self._requeue_expired(now)
+                self._purge_finished(now)
+            free_types = [t for t, spec in self._handlers.items() if self._running[t] < spec["concurrency"]]
+            if not free_types:
+                return None
+            placeholders = ",".join("?" for _ in free_types)
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND run_after <= ? AND job_type IN ({placeholders})"
+                " ORDER BY priority DESC, run_after ASC LIMIT 1",
+                (STATUS_QUEUED, now, *free_types),
+            ).fetchone()
+            if row is None:
+                return None
+            # Compare-and-set so several processes sharing the file never run a job twice.
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = ?",
+                (STATUS_RUNNING, now + self.lease_seconds, now, row["id"], STATUS_QUEUED),
+            ).rowcount
+            conn.commit()
+            if not claimed:
+                return None
+            self._running[row["job_type"]] += 1
+        job = _row_to_dict(row, payload=True)
+        job["attempts"] += 1
+        return job
+
+    def _execute(self, job: dict):
+        spec = self._handlers[job["job_type"]]
+        try:
+            if self.context_factory is not None:
+                with self.context_factory():
+                    result = spec["handler"](job["payload"])
+            else:
+                result = spec["handler"](job["payload"])
+        except PermanentJobError as e:
+            self._finish(job, STATUS_FAILED, error=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            if job["attempts"] >= job["max_attempts"]:
+                self._finish(job, STATUS_FAILED, error=str(e))
+            else:
+                delay = min(spec["backoff_max"], spec["backoff_base"] * (2 ** (job["attempts"] - 1)))
+                delay *= random.uniform(0.8, 1.2)
+                self._retry(job, delay, str(e))
+        else:
+            self._finish(job, STATUS_SUCCEEDED, result=result)
+
+    # The updates below only apply to the attempt that claimed the job: once a
+    # lapsed lease has been requeued and claimed again, a late finish is dropped.
+
+    def _finish(self, job: dict, status: str, result=None, error: str = None):
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ?"
+            " WHERE id = ? AND attempts = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job["id"],
+             job["attempts"]),
+        )
+        conn.commit()
+
+    def _retry(self, job: dict, delay: float, error: str):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, run_after = ?, error = ?, lease_expires_at = NULL, updated_at = ?"
+            " WHERE id = ? AND attempts = ?",
+            (STATUS_QUEUED, now + delay, error, now, job["id"], job["attempts"]),
+        )
+        conn.commit()
+
+    def _requeue_expired(self, now: float):
+        # Jobs left "running" by a crashed process or a hung handler go back to the
+        # queue once their lease lapses, or fail once they are out of attempts.
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL, updated_at = ?"
+            " WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts",
+            (STATUS_FAILED, "Lease expired", now, STATUS_RUNNING, now),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL, updated_at = ?"
+            " WHERE status = ? AND lease_expires_at < ?",
+            (STATUS_QUEUED, "Lease expired", now, STATUS_RUNNING, now),
+        )
+        conn.commit()
+
+    def _purge_finished(self, now: float):
+        if self.retention_seconds <= 0:
+            return
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (STATUS_SUCCEEDED, STATUS_FAILED, now - self.retention_seconds),
+        )
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+
+def _row_to_dict(row, payload: bool) -> dict:
+    job = {
+        "id": row["id"],
+        "job_type": row["job_type"],
+        "priority": row["priority"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "created_at": datetime.utcfromtimestamp(row["created_at"]).isoformat(),
+        "updated_at": datetime.utcfromtimestamp(row["updated_at"]).isoformat(),
+    }
+    if payload:
+        job["payload"] = json.loads(row["payload"])
+    return job
+
+
+def default_jobs_db_path() -> str:
+    path = os.getenv("JOBS_DB_PATH")
+    if path:
+        return path
+    if os.getenv("VERCEL") or os.getenv("VERCEL_ENV"):
+        return "/tmp/jobs.db"
+    return os.path.join(os.path.dirname(__file__), "jobs.db")
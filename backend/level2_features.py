@@ -0,0 +1,255 @@
+"""
+Level-2 game metrics computed from raw telemetry (see telemetry.py).
+
+The metrics ``calculate_level2_score`` reads are derived from per-trial
+events with NumPy: every session in a call is concatenated into one set of
+arrays, sorted once by (session, t), and each metric is a handful of
+vectorized group reductions over (session, game, trial).  A single
+submission and a batch of thousands of stored sessions go through the same
+code path.
+
+Event conventions per game (``game`` is 1-3 in play order, ``trial`` groups
+one stimulus with its responses; gaze ``value`` is an area-of-interest code,
+1 = target/face, 2 = distractor/toy/irrelevant):
+
+child
+  1 Face vs Toy      gaze samples      -> fixation_face_pct, gaze_stability
+  2 Emotion Balloon  tap, value 1/0    -> emotion_accuracy
+  3 Sensory Maze     error = a stop    -> sensory_overload_stops, maze_completion_time
+adult
+  1 CPT              stimulus value 1 = target / 0 = no-go, rt value in ms
+                                       -> rt_variability, omission_errors, commission_errors
+  2 Anti-Saccade     stimulus x = cue position, gaze samples
+                                       -> anti_saccade_error_rate
+  3 Virtual Office   stimulus value = task rule, rt in ms, gaze samples
+                                       -> executive_task_switching_cost, distraction_fixation_pct
+elderly
+  1 Memory Tray      tap, value 1/0    -> memory_recall_accuracy
+  2 Clock            stimulus value = target angle, tap value = placed angle (degrees)
+                                       -> clock_hand_placement_error
+  3 Scene            rt value = detection time in ms, gaze samples
+                                       -> scene_danger_detection_time, irrelevant_fixations
+
+A metric without enough events (e.g. the game was skipped) is left out, so
+the scorer falls back to its defaults for it.
+"""
+
+import numpy as np
+
+try:
+    from telemetry import COLUMNS, EVENT_TYPES, event_count
+except ImportError:
+    from backend.telemetry import COLUMNS, EVENT_TYPES, event_count
+
+RT, GAZE, TAP, STIMULUS, ERROR = (EVENT_TYPES.index(name) for name in ("rt", "gaze", "tap", "stimulus", "error"))
+AOI_TARGET, AOI_DISTRACTOR = 1, 2
+SACCADE_THRESHOLD = 0.15  # horizontal gaze offset from centre that counts as a saccade
+GAZE_STABILITY_SCALE = 0.05  # mean sample-to-sample gaze jump giving stability 0
+
+COUNT_METRICS = {"omission_errors", "commission_errors", "sensory_overload_stops", "irrelevant_fixations"}
+
+
+class _Events:
+    """All events of several sessions as flat arrays sorted by (session, t), with trial ids."""
+
+    def __init__(self, column_sets: list):
+        counts = np.array([event_count(c) for c in column_sets], dtype=np.int64)
+        self.sessions = len(column_sets)
+        session = np.repeat(np.arange(self.sessions), counts)
+        raw = {
+            name: np.concatenate([np.frombuffer(c[name], dtype=np.dtype(code)) for c in column_sets])
+            if column_sets else np.empty(0, dtype=np.dtype(code))
+            for name, code in COLUMNS
+        }
+        order = np.lexsort((raw["t"], session))
+        self.session = session[order]
+        self.t = raw["t"][order].astype(np.int64)
+        self.type = raw["type"][order]
+        self.game = raw["game"][order]
+        self.x = raw["x"][order].astype(np.float64)
+        self.y = raw["y"][order].astype(np.float64)
+        self.value = raw["value"][order].astype(np.float64)
+        key = (self.session << 24) | (self.game.astype(np.int64) << 16) | raw["trial"][order].astype(np.int64)
+        keys, self.trial = np.unique(key, return_inverse=True)
+        self.trials = len(keys)
+        self.trial_session = keys >> 24
+
+    def mask(self, game: int, kind: int = None) -> np.ndarray:
+        m = self.game == game
+        return m if kind is None else m & (self.type == kind)
+
+    def first_per_trial(self, mask: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Value of the earliest masked event in each trial (NaN where a trial has none)."""
+        out = np.full(self.trials, np.nan)
+        trial = self.trial[mask]
+        if len(trial):
+            # events are in t order within a session, so the first occurrence is the earliest
+            ids, first = np.unique(trial, return_index=True)
+            out[ids] = values[mask][first]
+        return out
+
+    def per_session(self, sessions: np.ndarray, weights: np.ndarray = None) -> np.ndarray:
+        return np.bincount(sessions, weights=weights, minlength=self.sessions).astype(np.float64)
+
+
+def _mean(ev: _Events, sessions, values) -> np.ndarray:
+    n = ev.per_session(sessions)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, ev.per_session(sessions, values) / n, np.nan)
+
+
+def _stdev(ev: _Events, sessions, values) -> np.ndarray:
+    n = ev.per_session(sessions)
+    mean = _mean(ev, sessions, values)
+    squares = ev.per_session(sessions, (values - mean[sessions]) ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 1, np.sqrt(squares / (n - 1)), np.nan)
+
+
+def _count(ev: _Events, mask) -> np.ndarray:
+    """Per-session event counts; NaN for sessions that never played the game."""
+    return ev.per_session(ev.session[mask])
+
+
+def _played(ev: _Events, game: int) -> np.ndarray:
+    return ev.per_session(ev.session[ev.mask(game)]) > 0
+
+
+def _aoi_share(ev: _Events, game: int, aoi: int, among=(AOI_TARGET, AOI_DISTRACTOR)) -> np.ndarray:
+    gaze = ev.mask(game, GAZE)
+    aois = ev.value[gaze]
+    sessions = ev.session[gaze]
+    considered = np.isin(aois, among)
+    return _mean(ev, sessions[considered], (aois[considered] == aoi).astype(np.float64))
+
+
+def _gaze_stability(ev: _Events, game: int) -> np.ndarray:
+    gaze = ev.mask(game, GAZE) & ~np.isnan(ev.x) & ~np.isnan(ev.y)
+    sessions, x, y = ev.session[gaze], ev.x[gaze], ev.y[gaze]
+    same = sessions[1:] == sessions[:-1]
+    jumps = np.hypot(np.diff(x), np.diff(y))[same]
+    return np.clip(1.0 - _mean(ev, sessions[1:][same], jumps) / GAZE_STABILITY_SCALE, 0.0, 1.0)
+
+
+def _accuracy(ev: _Events, game: int) -> np.ndarray:
+    taps = ev.mask(game, TAP) & ~np.isnan(ev.value)
+    return _mean(ev, ev.session[taps], (ev.value[taps] >= 0.5).astype(np.float64))
+
+
+def _child(ev: _Events) -> dict:
+    maze = ev.mask(3)
+    span = np.full(ev.sessions, np.nan)
+    if maze.any():
+        sessions, t = ev.session[maze], ev.t[maze]
+        starts = np.r_[0, np.flatnonzero(np.diff(sessions)) + 1]
+        # t is sorted within each session, so first/last event per session bound the run
+        ends = np.r_[starts[1:], len(t)] - 1
+        span[sessions[starts]] = (t[ends] - t[starts]) / 1000.0
+    stops = _count(ev, ev.mask(3, ERROR))
+    return {
+        "fixation_face_pct": _aoi_share(ev, 1, AOI_TARGET),
+        "gaze_stability": _gaze_stability(ev, 1),
+        "emotion_accuracy": _accuracy(ev, 2),
+        "sensory_overload_stops": np.where(_played(ev, 3), stops, np.nan),
+        "maze_completion_time": span,
+    }
+
+
+def _adult(ev: _Events) -> dict:
+    # CPT: go trials without a response are omissions, responses to no-go trials commissions
+    target = ev.first_per_trial(ev.mask(1, STIMULUS), ev.value)
+    rt = ev.first_per_trial(ev.mask(1, RT), ev.value)
+    go, nogo, responded = target >= 0.5, target < 0.5, ~np.isnan(rt)
+    cpt_trial = ~np.isnan(target)
+    cpt_sessions = ev.per_session(ev.trial_session[cpt_trial]) > 0
+    omissions = ev.per_session(ev.trial_session[go & ~responded])
+    commissions = ev.per_session(ev.trial_session[nogo & responded])
+    hits = go & responded
+    rt_variability = _stdev(ev, ev.trial_session[hits], rt[hits])
+
+    # Anti-saccade: the first saccade of a trial is an error if it goes towards the cue
+    cue = ev.first_per_trial(ev.mask(2, STIMULUS), ev.x)
+    saccades = ev.mask(2, GAZE) & (np.abs(ev.x - 0.5) > SACCADE_THRESHOLD)
+    first_look = ev.first_per_trial(saccades, ev.x)
+    judged = ~np.isnan(cue) & ~np.isnan(first_look)
+    wrong = (np.sign(first_look - 0.5) == np.sign(cue - 0.5))[judged]
+    anti_saccade = _mean(ev, ev.trial_session[judged], wrong.astype(np.float64))
+
+    # Task switching: mean RT on trials whose rule differs from the previous trial's, minus repeats
+    rule = ev.first_per_trial(ev.mask(3, STIMULUS), ev.value)
+    switch_rt = ev.first_per_trial(ev.mask(3, RT), ev.value)
+    ruled = np.flatnonzero(~np.isnan(rule))  # trial ids sort by (session, game, trial number)
+    sessions = ev.trial_session[ruled]
+    follows = np.r_[False, sessions[1:] == sessions[:-1]]
+    switched = np.r_[False, rule[ruled][1:] != rule[ruled][:-1]] & follows
+    timed = follows & ~np.isnan(switch_rt[ruled])
+    rts = switch_rt[ruled]
+    switch_cost = (_mean(ev, sessions[timed & switched], rts[timed & switched])
+                   - _mean(ev, sessions[timed & ~switched], rts[timed & ~switched]))
+
+    return {
+        "rt_variability": rt_variability,
+        "omission_errors": np.where(cpt_sessions, omissions, np.nan),
+        "commission_errors": np.where(cpt_sessions, commissions, np.nan),
+        "anti_saccade_error_rate": anti_saccade,
+        "executive_task_switching_cost": switch_cost,
+        "distraction_fixation_pct": _aoi_share(ev, 3, AOI_DISTRACTOR),
+    }
+
+
+def _elderly(ev: _Events) -> dict:
+    target = ev.first_per_trial(ev.mask(2, STIMULUS), ev.value)
+    placed = ev.first_per_trial(ev.mask(2, TAP), ev.value)
+    both = ~np.isnan(target) & ~np.isnan(placed)
+    angle_error = np.abs((placed[both] - target[both] + 180.0) % 360.0 - 180.0)
+
+    detection = ev.mask(3, RT) & ~np.isnan(ev.value)
+
+    # Entering an irrelevant area counts once per visit, not once per gaze sample
+    gaze = ev.mask(3, GAZE)
+    sessions, aoi = ev.session[gaze], ev.value[gaze]
+    inside = aoi == AOI_DISTRACTOR
+    entered = inside & ~np.r_[False, inside[:-1] & (sessions[1:] == sessions[:-1])]
+    visits = ev.per_session(sessions[entered])
+
+    return {
+        "memory_recall_accuracy": _accuracy(ev, 1),
+        "clock_hand_placement_error": _mean(ev, ev.trial_session[both], angle_error),
+        "scene_danger_detection_time": _mean(ev, ev.session[detection], ev.value[detection]) / 1000.0,
+        "irrelevant_fixations": np.where(ev.per_session(sessions) > 0, visits, np.nan),
+    }
+
+
+EXTRACTORS = {"child": _child, "adult": _adult, "elderly": _elderly}
+
+
+def _to_metrics(values: dict, index: int) -> dict:
+    metrics = {}
+    for name, column in values.items():
+        value = column[index]
+        if np.isnan(value):
+            continue
+        metrics[name] = int(value) if name in COUNT_METRICS else round(float(value), 2)
+    return metrics
+
+
+def extract_batch(sessions: list) -> list:
+    """
+    Metrics for many sessions: ``sessions`` is ``[(age_group, columns), ...]``;
+    returns one metrics dict per session, in order (empty for unknown age groups).
+    """
+    results = [{} for _ in sessions]
+    by_group = {}
+    for i, (age_group, columns) in enumerate(sessions):
+        if age_group in EXTRACTORS:
+            by_group.setdefault(age_group, []).append(i)
+    for age_group, indexes in by_group.items():
+        values = EXTRACTORS[age_group](_Events([sessions[i][1] for i in indexes]))
+        for position, i in enumerate(indexes):
+            results[i] = _to_metrics(values, position)
+    return results
+
+
+def extract_features(age_group: str, columns: dict) -> dict:
+    """Metrics for one session's telemetry columns."""
+    return extract_batch([(age_group, columns)])[0]
@@ -0,0 +1,23 @@
+"""
+Tiny metrics registry for the admin metrics endpoint.
+
+Subsystems register a zero-argument provider returning a JSON-serialisable
+dict; ``collect()`` calls each of them (inside the request's app context)
+and reports provider failures inline instead of failing the whole call.
+"""
+
+_providers = {}
+
+
+def register(name: str, provider):
+    _providers[name] = provider
+
+
+def collect() -> dict:
+    out = {}
+    for name, provider in sorted(_providers.items()):
+        try:
+            out[name] = provider()
+        except Exception as e:
+            out[name] = {"error": str(e)}
+    return out
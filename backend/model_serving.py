@@ -0,0 +1,316 @@
+"""
+In-process Level-1 risk inference on the scalers shipped in
+``supabase/functions/ml-models`` (one sklearn StandardScaler per condition,
+saved with joblib).
+
+The pickles are read with a restricted unpickler that only resolves the
+handful of classes a joblib-saved StandardScaler references, so neither
+sklearn nor joblib is needed and nothing else in a pickle can execute.
+Each condition becomes a ``ConditionModel``: a fixed feature order (the
+scaler's ``feature_names_in_``), its mean/scale vectors (read-only, loaded
+once per process, so workers forked after ``preload()`` share the pages)
+and a risk head:
+
+* ``LinearHead``: logistic regression over the standardized features,
+  loaded from ``<Condition>_model.json`` (``{"coef": [...], "intercept": x}``
+  in feature order) when one is deployed next to the scaler;
+* ``AnswerMeanHead`` otherwise: the mean of the answered items mapped 1..5 to
+  0..100%, i.e. the rule ``calculate_risk`` applies, evaluated on the fixed
+  vector (keys outside the model's features are ignored).
+
+Risk bands and the Level-2 threshold come from the scoring spec (scoring.py).
+
+``MicroBatcher`` coalesces concurrent requests into one vectorized call.
+"""
+
+import io
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+try:
+    from scoring import current_spec
+except ImportError:
+    from backend.scoring import current_spec
+
+MODELS_DIR = os.getenv("ML_MODELS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supabase", "functions", "ml-models")
+CONDITIONS = {"adhd": "ADHD", "asd": "ASD", "dementia": "Dementia"}
+
+
+class ModelLoadError(Exception):
+    """A model file is missing or is not a supported StandardScaler pickle."""
+
+
+class _State:
+    """Stand-in for the pickled classes: keeps the state dict BUILD hands over."""
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+def _reconstruct(subtype, shape, dtype):
+    return np.ndarray.__new__(subtype, shape, dtype)
+
+
+def _scalar(dtype, data):
+    return np.frombuffer(data, dtype=dtype, count=1)[0]
+
+
+# Everything a joblib-saved StandardScaler references (numpy 1.x and 2.x module paths)
+_ALLOWED_GLOBALS = {
+    ("sklearn.preprocessing._data", "StandardScaler"): _State,
+    ("numpy", "ndarray"): np.ndarray,
+    ("numpy", "dtype"): np.dtype,
+    ("numpy.core.multiarray", "_reconstruct"): _reconstruct,
+    ("numpy._core.multiarray", "_reconstruct"): _reconstruct,
+    ("numpy.core.multiarray", "scalar"): _scalar,
+    ("numpy._core.multiarray", "scalar"): _scalar,
+}
+
+
+def load_scaler(path: str) -> dict:
+    """Read a joblib-pickled StandardScaler; returns its attributes with arrays resolved."""
+    try:
+        with open(path, "rb") as f:
+            # BytesIO rather than the buffered file: the unpickler must not read ahead,
+            # joblib stores array bytes inline right after each wrapper object.
+            stream = io.BytesIO(f.read())
+    except OSError as e:
+        raise ModelLoadError(f"{path}: {e}")
+
+    class ArrayWrapper:
+        """joblib's NumpyArrayWrapper: the array data follows in the stream."""
+
+        def __setstate__(self, state):
+            dtype, shape = state["dtype"], state["shape"]
+            if dtype.hasobject:
+                self.array = _ScalerUnpickler(stream).load()
+                return
+            if state.get("numpy_array_alignment_bytes") is not None:
+                stream.read(stream.read(1)[0])  # alignment padding
+            count = int(np.prod(shape))
+            data = stream.read(count * dtype.itemsize)
+            order = "F" if state.get("order") == "F" else "C"
+            self.array = np.frombuffer(data, dtype=dtype, count=count).reshape(shape, order=order)
+
+    class _ScalerUnpickler(pickle.Unpickler):
+        allowed = {**_ALLOWED_GLOBALS, ("joblib.numpy_pickle", "NumpyArrayWrapper"): ArrayWrapper}
+
+        def find_class(self, module, name):
+            try:
+                return self.allowed[(module, name)]
+            except KeyError:
+                raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a model file")
+
+    try:
+        scaler = _ScalerUnpickler(stream).load()
+    except (pickle.UnpicklingError, EOFError, KeyError, IndexError, ValueError, TypeError) as e:
+        raise ModelLoadError(f"{path}: {e}")
+    if not isinstance(scaler, _State):
+        raise ModelLoadError(f"{path}: not a StandardScaler")
+    return {key: getattr(value, "array", value) for key, value in scaler.__dict__.items()}
+
+
+def _number(value) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return value if value == value and abs(value) != np.inf else np.nan
+
+
+class AnswerMeanHead:
+    name = "answer_mean"
+
+    def __init__(self, feature_names):
+        self.columns = np.array([n != "age" for n in feature_names])
+
+    def predict(self, raw: np.ndarray, standardized: np.ndarray) -> np.ndarray:
+        answers = raw[:, self.columns]
+        answered = ~np.isnan(answers)
+        counts = answered.sum(axis=1)
+        totals = np.where(answered, answers, 0.0).sum(axis=1)
+        means = np.divide(totals, counts, out=np.zeros(len(raw)), where=counts > 0)
+        return np.clip(means / 5.0 * 100.0, 0.0, 100.0)
+
+
+class LinearHead:
+    name = "linear"
+
+    def __init__(self, coef, intercept: float):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.coef.flags.writeable = False
+        self.intercept = float(intercept)
+
+    def predict(self, raw: np.ndarray, standardized: np.ndarray) -> np.ndarray:
+        # missing answers sit at the training mean (z = 0)
+        logits = np.nan_to_num(standardized, nan=0.0) @ self.coef + self.intercept
+        return 100.0 / (1.0 + np.exp(-logits))
+
+
+class ConditionModel:
+    def __init__(self, condition: str, scaler: dict, head=None):
+        self.condition = condition
+        self.feature_names = [str(n) for n in scaler["feature_names_in_"]]
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+        self.mean = np.array(scaler["mean_"], dtype=np.float64)
+        self.scale = np.array(scaler["scale_"], dtype=np.float64)
+        self.mean.flags.writeable = False
+        self.scale.flags.writeable = False
+        self.head = head or AnswerMeanHead(self.feature_names)
+
+    @classmethod
+    def load(cls, condition: str, models_dir: str = MODELS_DIR):
+        base = os.path.join(models_dir, CONDITIONS[condition])
+        model = cls(condition, load_scaler(base + "_scaler.pkl"))
+        if os.path.exists(base + "_model.json"):
+            with open(base + "_model.json") as f:
+                spec = json.load(f)
+            if len(spec["coef"]) != len(model.feature_names):
+                raise ModelLoadError(f"{base}_model.json: expected {len(model.feature_names)} coefficients")
+            model.head = LinearHead(spec["coef"], spec.get("intercept", 0.0))
+        return model
+
+    def vectorize(self, features_list: list) -> np.ndarray:
+        """Fixed-order float matrix; unanswered or non-numeric items are NaN."""
+        names = self.feature_names
+        return np.array([[_number(features.get(name)) for name in names] for features in features_list],
+                        dtype=np.float64).reshape(len(features_list), len(names))
+
+    def scores(self, features_list: list) -> np.ndarray:
+        raw = self.vectorize(features_list)
+        return self.head.predict(raw, (raw - self.mean) / self.scale)
+
+    def predict(self, features_list: list) -> list:
+        """Risk dicts shaped like ``calculate_risk``'s, banded by the current scoring spec."""
+        spec = current_spec()
+        ordered = spec.level1_bands[::-1]  # ascending minimums
+        edges = np.array([minimum for minimum, _, _ in ordered], dtype=np.float64)
+        bands = [spec.level1_default_band] + [(level, label) for _, level, label in ordered]
+        scores = self.scores(features_list)
+        return [
+            {"risk_score": score, "risk_level": bands[band][0], "risk_label": bands[band][1],
+             "requires_level2": score >= spec.level2_threshold, "spec_version": spec.version}
+            for score, band in zip(scores.tolist(), np.searchsorted(edges, scores, side="right").tolist())
+        ]
+
+
+class MicroBatcher:
+    """
+    Answers concurrent ``submit(condition, features)`` calls with one
+    vectorized ``predict`` per condition for everything queued while the
+    previous batch ran (up to ``max_batch``; ``max_wait`` > 0 additionally
+    waits that long for a batch to fill, trading latency for batch size).
+    """
+
+    def __init__(self, models: dict, max_batch: int = 64, max_wait: float = 0.0):
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="model-batcher", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, condition: str, features: dict) -> Future:
+        future = Future()
+        self._queue.put((condition, features, future))
+        return future
+
+    def predict(self, condition: str, features: dict, timeout: float = 5.0) -> dict:
+        return self.submit(condition, features).result(timeout)
+
+    def _run(self):
+        while True:
+            # Take whatever queued up while the previous batch ran; optionally linger for more.
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batches += 1
+            self.requests += len(batch)
+            by_condition = {}
+            for item in batch:
+                by_condition.setdefault(item[0], []).append(item)
+            for condition, items in by_condition.items():
+                try:
+                    results = self.models[condition].predict([features for _, features, _ in items])
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), result in zip(items, results):
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0,
+            "queued": self._queue.qsize(),
+        }
+
+
+_models = None
+_engine = None
+_engine_pid = None
+_lock = threading.Lock()
+
+
+def get_models(models_dir: str = None) -> dict:
+    """condition -> ConditionModel, loaded once per process (or inherited from the parent on fork)."""
+    global _models
+    if _models is None:
+        with _lock:
+            if _models is None:
+                _models = {c: ConditionModel.load(c, models_dir or MODELS_DIR) for c in CONDITIONS}
+    return _models
+
+
+def get_engine() -> MicroBatcher:
+    """This process's batcher (threads do not survive a fork, so each worker starts its own)."""
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        models = get_models()
+        with _lock:
+            if _engine is None or _engine_pid != os.getpid():
+                _engine = MicroBatcher(
+                    models,
+                    max_batch=int(os.getenv("MODEL_BATCH_MAX", "64")),
+                    max_wait=float(os.getenv("MODEL_BATCH_WAIT_MS", "0")) / 1000.0,
+                )
+                _engine_pid = os.getpid()
+    return _engine
+
+
+def preload() -> dict:
+    """Load the models in the parent process (e.g. gunicorn --preload) so forked workers share them."""
+    return get_models()
+
+
+def engine_stats() -> dict:
+    if _models is None:
+        return {"loaded": False}
+    stats = {"loaded": True, "heads": {c: m.head.name for c, m in _models.items()}}
+    if _engine is not None and _engine_pid == os.getpid():
+        stats.update(_engine.stats())
+    return stats
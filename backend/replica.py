@@ -0,0 +1,218 @@
+"""
+Read/write routing between the primary database and a read replica.
+
+The replica is the ``replica`` entry of ``SQLALCHEMY_BINDS``
+(``REPLICA_DATABASE_URL``): a Postgres streaming replica in production,
+or locally a SQLite file that ``sqlite_backup`` refreshes from the
+primary (``flask replica-sync``, or a thread with ``REPLICA_SYNC_SECONDS``)::
+
+    # two Postgres containers (replica set up with pg_basebackup / primary_conninfo)
+    DATABASE_URL=postgresql://app@localhost:5432/cogniwise \\
+    REPLICA_DATABASE_URL=postgresql://app@localhost:5433/cogniwise flask run
+
+    # SQLite copy refreshed every 2 s
+    REPLICA_DATABASE_URL=sqlite:////tmp/replica.db REPLICA_SYNC_SECONDS=2 flask run
+
+Only views marked ``@reads_from_replica`` are routed, and within them only
+plain reads: ``RoutingSession.get_bind`` sends flushes and DML to the
+primary, and once a request has written anything its later reads stay on
+the primary too.
+
+Read-your-writes: a successful write request records the time of the write
+for its user (in-process) and in a cookie (so it also holds when the next
+read lands on another worker).  Reads for that user go to the primary
+until the replica is known to include the write (the SQLite sync tracks
+when its last snapshot was taken) or, when that is unknown, for
+``READ_YOUR_WRITES_SECONDS``.
+"""
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session as FlaskSession
+
+STICKY_COOKIE = "cw_last_write"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class ReadRouter:
+    def __init__(self, window: float = 5.0):
+        self.window = window
+        self.replica_as_of = None  # wall time of the replica's snapshot, when a local sync knows it
+        self._last_write = {}
+        self._lock = threading.Lock()
+        self.replica_views = 0
+        self.sticky_views = 0
+
+    def note_write(self, user_id: str, at: float):
+        if not user_id:
+            return
+        with self._lock:
+            self._last_write[user_id] = at
+            if len(self._last_write) > 10000:
+                horizon = self.replica_as_of if self.replica_as_of is not None else at - self.window
+                self._last_write = {u: t for u, t in self._last_write.items() if t >= horizon}
+
+    def needs_primary(self, user_id: str, cookie_value: float = None) -> bool:
+        last = max(self._last_write.get(user_id, 0.0) if user_id else 0.0, cookie_value or 0.0)
+        if not last:
+            return False
+        if self.replica_as_of is not None:
+            return last >= self.replica_as_of
+        return time.time() - last < self.window
+
+    def stats(self) -> dict:
+        as_of = self.replica_as_of
+        return {
+            "replica_views": self.replica_views,
+            "sticky_views": self.sticky_views,
+            "replica_lag_seconds": round(time.time() - as_of, 3) if as_of is not None else None,
+            "sticky_users": len(self._last_write),
+            "window_seconds": self.window,
+        }
+
+
+def request_user_id():
+    """The user a request is about: ``user_id`` in the URL, query string or (for writes) the body."""
+    user_id = (request.view_args or {}).get("user_id") or request.args.get("user_id")
+    if user_id is None and request.method in WRITE_METHODS:
+        if request.is_json:
+            user_id = (request.get_json(silent=True) or {}).get("user_id")
+        elif request.form:
+            user_id = request.form.get("user_id")
+    return user_id
+
+
+def reads_from_replica(view):
+    """Serve this (read-only) view from the replica unless the user has a write the replica may lack."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        router = _router()
+        if router is not None:
+            try:
+                cookie = float(request.cookies.get(STICKY_COOKIE) or 0)
+            except ValueError:
+                cookie = 0.0
+            g.db_replica = not router.needs_primary(request_user_id(), cookie)
+            if g.db_replica:
+                router.replica_views += 1
+            else:
+                router.sticky_views += 1
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def use_primary():
+    """Send the rest of this request's queries to the primary (e.g. a long poll waiting for new rows)."""
+    if has_request_context():
+        g.db_replica = False
+
+
+def _router():
+    from flask import current_app
+    return current_app.extensions.get("read_router")
+
+
+class RoutingSession(FlaskSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get("db_replica"):
+            replica = self._db.engines.get("replica")
+            if self._flushing or getattr(clause, "is_dml", False) or replica is None:
+                g.db_replica = False  # this request writes: read its own writes from here on
+            else:
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def track_writes(response):
+    """after_request: remember successful writes for read-your-writes."""
+    router = _router()
+    if router is None or request.method not in WRITE_METHODS or response.status_code >= 400:
+        return response
+    now = time.time()
+    router.note_write(request_user_id(), now)
+    response.set_cookie(STICKY_COOKIE, f"{now:.3f}", max_age=3600, httponly=True, samesite="Lax")
+    return response
+
+
+def sqlite_path(uri: str):
+    if not uri or not uri.startswith("sqlite:///") or uri.endswith(":memory:"):
+        return None
+    return uri[len("sqlite:///"):]
+
+
+def sqlite_backup(primary_path: str, replica_path: str) -> float:
+    """
+    Copy the primary into the replica file with SQLite's online backup API;
+    returns the wall time the copied snapshot corresponds to.  The replica
+    is kept in WAL mode so its readers are not blocked while it is replaced.
+    """
+    taken = time.time()
+    src = sqlite3.connect(primary_path, timeout=30)
+    dst = sqlite3.connect(replica_path, timeout=30)
+    try:
+        dst.execute("PRAGMA journal_mode=WAL")
+        src.backup(dst)  # one step: a stepped copy restarts whenever the primary is written
+        dst.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        dst.close()
+        src.close()
+    return taken
+
+
+class ReplicaSync:
+    """Background thread refreshing a SQLite replica every ``interval`` seconds."""
+
+    def __init__(self, primary_path: str, replica_path: str, interval: float, router: ReadRouter = None):
+        self.primary_path = primary_path
+        self.replica_path = replica_path
+        self.interval = interval
+        self.router = router
+        self.syncs = 0
+        self.last_seconds = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+
+    def start(self):
+        self.sync()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def sync(self):
+        started = time.perf_counter()
+        taken = sqlite_backup(self.primary_path, self.replica_path)
+        self.last_seconds = time.perf_counter() - started
+        self.syncs += 1
+        if self.router is not None:
+            self.router.replica_as_of = taken
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except sqlite3.Error as e:
+                print(f"Replica sync failed: {e}")
+
+
+def init_app(app):
+    """Enable routing when a replica bind is configured."""
+    replica_url = app.config.get("SQLALCHEMY_BINDS", {}).get("replica")
+    if not replica_url:
+        return None
+    router = ReadRouter(float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")))
+    app.extensions["read_router"] = router
+    app.after_request(track_writes)
+
+    interval = float(os.getenv("REPLICA_SYNC_SECONDS", "0"))
+    primary, replica = sqlite_path(app.config["SQLALCHEMY_DATABASE_URI"]), sqlite_path(replica_url)
+    if interval > 0 and primary and replica:
+        app.extensions["replica_sync"] = ReplicaSync(primary, replica, interval, router)
+    return router
+
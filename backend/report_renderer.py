@@ -0,0 +1,221 @@
+"""
+PDF report rendering off the request thread.
+
+``render`` lays out one assessment report with reportlab.  The paragraph
+styles and table styles every report shares are built once per process
+(``templates()``) instead of on every call.
+
+``RenderPool`` runs ``render`` in a pool of worker processes that are
+started and warmed up (reportlab imported, templates built, one throwaway
+page rendered so the font metrics are cached) before the first report is
+handed to them, so layout no longer holds the GIL of the web worker.  At
+most ``max_pending`` reports may be queued or rendering at once; beyond
+that ``ReportPoolBusy`` is raised right away (the endpoint answers 503
+with Retry-After) instead of letting requests pile up.  A caller waits at
+most ``timeout`` seconds (``ReportTimeout``); the slot is only released
+when the worker is really done, so a stuck renderer keeps counting
+against the limit.
+
+Workers use the ``spawn`` start method: forking a web worker that already
+runs background threads (job queue, group commit, replica sync) is unsafe.
+As with any spawned process, a script that starts the pool must keep its
+top-level code under ``if __name__ == "__main__":``.
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+SKIPPED_FIELDS = frozenset(["raw_metrics", "questionnaire_responses", "ml_features", "domain_scores",
+                            "level2_conditions", "level3_conditions"])
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+class ReportPoolBusy(Exception):
+    """Too many reports are queued; the client should retry later."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Report renderer busy")
+        self.retry_after = retry_after
+
+
+class ReportTimeout(Exception):
+    """A report took longer than the pool's timeout to render."""
+
+
+def templates() -> dict:
+    """reportlab classes and the shared styles, built once per process."""
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                # imported here so the app still starts when reportlab is not
+                # available in the environment (e.g. minimal Vercel lambda)
+                try:
+                    from reportlab.lib import colors
+                    from reportlab.lib.pagesizes import letter
+                    from reportlab.lib.styles import getSampleStyleSheet
+                    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+                except ImportError as e:
+                    raise RuntimeError("PDF generation library missing: %s" % e)
+                styles = getSampleStyleSheet()
+                _templates = {
+                    "doc": SimpleDocTemplate, "pagesize": letter, "Paragraph": Paragraph, "Spacer": Spacer,
+                    "Table": Table,
+                    "title": styles["Title"],
+                    "heading": styles["Heading2"],
+                    "info_table": TableStyle([
+                        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+                        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+                        ('FONTSIZE', (0, 0), (-1, -1), 10),
+                        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+                        ('BACKGROUND', (1, 0), (1, -1), colors.whitesmoke),
+                        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                    ]),
+                    "scores_table": TableStyle([
+                        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                    ]),
+                }
+    return _templates
+
+
+def render(data: dict, title: str) -> bytes:
+    """The PDF for one report: a title, the scalar fields as a table and the domain scores."""
+    t = templates()
+    buffer = io.BytesIO()
+    doc = t["doc"](buffer, pagesize=t["pagesize"])
+    story = [t["Paragraph"](title, t["title"]), t["Spacer"](1, 20)]
+
+    rows = [
+        [key.replace('_', ' ').title(), str(value)]
+        for key, value in data.items()
+        if key not in SKIPPED_FIELDS and not isinstance(value, (dict, list))
+    ]
+    if rows:
+        table = t["Table"](rows, colWidths=[200, 300])
+        table.setStyle(t["info_table"])
+        story += [table, t["Spacer"](1, 20)]
+
+    if "domain_scores" in data:
+        story += [t["Paragraph"]("Detailed Domain Scores", t["heading"]), t["Spacer"](1, 10)]
+        scores = [[k.replace('_', ' ').title(), f"{v*100:.1f}%"] for k, v in data["domain_scores"].items()]
+        table = t["Table"](scores, colWidths=[200, 100])
+        table.setStyle(t["scores_table"])
+        story.append(table)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _warm_worker():
+    render({"warm_up": 1, "domain_scores": {"x": 0.5}}, "warm-up")
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+class RenderPool:
+    def __init__(self, workers: int, max_pending: int = None, timeout: float = 30.0):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.restarts = 0
+        self.render_seconds = 0.0
+
+    def start(self):
+        """Start every worker process and wait until each has warmed up."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+        # one task per worker at once, so all of them are spawned (and run the initializer) now
+        for future in [executor.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+        return self
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_warm_worker)
+
+    def _retry_after(self) -> float:
+        per_report = self.render_seconds / self.rendered if self.rendered else 1.0
+        return max(1.0, per_report * self._pending / self.workers)
+
+    def render(self, data: dict, title: str) -> bytes:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ReportPoolBusy(self._retry_after())
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            future = executor.submit(render, data, title)
+        except BrokenProcessPool:
+            self._release(None)
+            self._restart(executor)
+            raise RuntimeError("Report renderer restarted, try again")
+        future.add_done_callback(self._release)
+        try:
+            pdf = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.timeouts += 1
+            future.cancel()  # only takes effect if it has not started yet
+            raise ReportTimeout(f"Report rendering took longer than {self.timeout:g}s")
+        except BrokenProcessPool:
+            self.failed += 1
+            self._restart(executor)
+            raise RuntimeError("Report renderer crashed, try again")
+        self.rendered += 1
+        self.render_seconds += time.perf_counter() - started
+        return pdf
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _restart(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = self._new_executor()
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "render_ms_avg": round(self.render_seconds / self.rendered * 1000, 2) if self.rendered else None,
+        }
@@ -0,0 +1,228 @@
+"""
+Scoring rules for Level-1 and Level-2 results, loaded from a versioned JSON
+spec (``scoring_spec.json``, or ``SCORING_SPEC_PATH``).
+
+The spec is compiled once into plain closures (a term is
+``(value - offset) / scale``, clamped, optionally ``1 - x``; a domain is the
+mean of its terms; the final risk is the weighted sum of domains), so
+scoring a result costs a few function calls and no spec lookups.
+
+``current_spec()`` re-checks the file's mtime at most every
+``SCORING_SPEC_CHECK_SECONDS`` and swaps in the recompiled spec when it
+changed; a spec that fails to compile is reported and the previous one
+stays in use.  Listeners registered with ``on_reload`` are told about
+version changes (the app uses this to queue a re-score of stored results).
+"""
+
+import json
+import os
+import threading
+import time
+
+SPEC_PATH = os.getenv("SCORING_SPEC_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "scoring_spec.json")
+CHECK_SECONDS = float(os.getenv("SCORING_SPEC_CHECK_SECONDS", "2"))
+
+
+class ScoringSpecError(ValueError):
+    """The scoring spec is malformed."""
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) or (isinstance(value, str) and value.replace(".", "", 1).isdigit())
+
+
+def _answer_mean(rule: dict):
+    max_answer = float(rule.get("max_answer", 5))
+
+    def score(values: list) -> float:
+        if not values:
+            return 0.0
+        # high answers mean high risk: max_answer scores 100%
+        return min(100.0, max(0.0, (sum(values) / len(values) / max_answer) * 100.0))
+    return score
+
+
+def _inverse_mean(rule: dict):
+    max_answer = float(rule.get("max_answer", 10))
+    factor = 100.0 / max_answer
+
+    def score(values: list) -> float:
+        if not values:
+            return 0.0
+        avg = sum(values) / len(values)
+        if max(values) <= max_answer:
+            # high answers mean low risk
+            return max(0.0, min(100.0, 100.0 - avg * factor))
+        # time-based or mixed scales: normalise by the largest value
+        return round(min(avg / max(values), 1.0) * 100.0, 1)
+    return score
+
+
+LEVEL1_RULES = {"answer_mean": _answer_mean, "inverse_mean": _inverse_mean}
+
+
+def _compile_term(term: dict):
+    metric = term["metric"]
+    default = float(term.get("default", 0.0))
+    offset = float(term.get("offset", 0.0))
+    scale = float(term.get("scale", 1.0))
+    low, high = term.get("min"), term.get("max")
+    invert = bool(term.get("invert", False))
+    if scale == 0:
+        raise ScoringSpecError(f"term {metric}: scale must not be 0")
+
+    def value(metrics: dict) -> float:
+        v = (float(metrics.get(metric, default)) - offset) / scale
+        if low is not None:
+            v = max(low, v)
+        if high is not None:
+            v = min(high, v)
+        return 1.0 - v if invert else v
+    return value
+
+
+def _compile_age_group(domains: list, round_first: bool, clamp_final: bool):
+    compiled = []
+    for domain in domains:
+        terms = [_compile_term(t) for t in domain["terms"]]
+        if not terms:
+            raise ScoringSpecError(f"domain {domain['domain']} has no terms")
+        compiled.append((domain["domain"], float(domain["weight"]), terms))
+
+    def score(metrics: dict) -> tuple:
+        scores, final = {}, None
+        for name, weight, terms in compiled:
+            risk = terms[0](metrics) if len(terms) == 1 else sum(t(metrics) for t in terms) / len(terms)
+            scores[name] = round(risk, 2)
+            weighted = (scores[name] if round_first else risk) * weight
+            final = weighted if final is None else final + weighted
+        final = final or 0.0
+        if clamp_final:
+            final = max(0.0, min(1.0, final))
+        return scores, final
+    return score
+
+
+class ScoringSpec:
+    def __init__(self, raw: dict, path: str = None, mtime: float = None):
+        self.raw = raw
+        self.path = path
+        self.mtime = mtime
+        try:
+            self.version = str(raw["version"])
+            self._compile_level1(raw["level1"])
+            self._compile_level2(raw["level2"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ScoringSpecError(f"invalid scoring spec: {e!r}")
+
+    def _compile_level1(self, spec: dict):
+        self.level1_bands = [(float(b["min"]), b["level"], b["label"])
+                             for b in sorted(spec["bands"], key=lambda b: -float(b["min"]))]
+        self.level1_default_band = (spec["default_band"]["level"], spec["default_band"]["label"])
+        self.level2_threshold = float(spec["level2_threshold"])
+        self._exclude = frozenset(spec.get("exclude_features", ["age"]))
+        self._level1_rules = {c: LEVEL1_RULES[r["rule"]](r) for c, r in spec["conditions"].items()}
+        self._level1_fallback = LEVEL1_RULES[spec["fallback"]["rule"]](spec["fallback"])
+
+    def _compile_level2(self, spec: dict):
+        self.level3_threshold = float(spec["level3_threshold_percent"])
+        self._level2 = {}
+        for mode in ("game_scores", "metrics"):
+            section = spec[mode]
+            self._level2[mode] = {
+                age_group: _compile_age_group(domains, bool(section.get("round_domains_before_weighting")),
+                                              bool(section.get("clamp_final")))
+                for age_group, domains in section["age_groups"].items()
+            }
+
+    def level1_band(self, score: float) -> tuple:
+        for minimum, level, label in self.level1_bands:
+            if score >= minimum:
+                return level, label
+        return self.level1_default_band
+
+    def score_level1(self, condition: str, features: dict) -> dict:
+        exclude = self._exclude
+        values = [float(v) for k, v in features.items() if k not in exclude and _is_number(v)]
+        risk = float(self._level1_rules.get(condition, self._level1_fallback)(values))
+        level, label = self.level1_band(risk)
+        return {
+            "risk_score": risk,
+            "risk_level": level,
+            "risk_label": label,
+            "requires_level2": risk >= self.level2_threshold,
+            "spec_version": self.version,
+        }
+
+    def score_level2(self, age_group: str, metrics: dict) -> dict:
+        # "is_real_data" marks the normalized game1..game3 scores sent by the frontend games
+        mode = self._level2["game_scores" if metrics.get("is_real_data") else "metrics"]
+        scorer = mode.get(age_group)
+        scores, final = scorer(metrics) if scorer else ({}, 0.0)
+        return {
+            "domain_scores": scores,
+            "final_risk_score": round(final, 2),
+            "final_risk_percent": round(final * 100, 1),
+            "spec_version": self.version,
+        }
+
+    def level3_unlocked(self, final_risk_percent: float) -> bool:
+        return final_risk_percent >= self.level3_threshold
+
+
+def load_spec(path: str = SPEC_PATH) -> ScoringSpec:
+    with open(path) as f:
+        raw = json.load(f)
+    return ScoringSpec(raw, path, os.path.getmtime(path))
+
+
+_spec = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_listeners = []
+
+
+def on_reload(listener):
+    """Call ``listener(old_version, new_spec)`` whenever a reload changes the spec version."""
+    _listeners.append(listener)
+    return listener
+
+
+def current_spec() -> ScoringSpec:
+    """The compiled spec, reloaded if the file changed since the last check."""
+    global _spec, _checked_at
+    now = time.monotonic()
+    if _spec is not None and now - _checked_at < CHECK_SECONDS:
+        return _spec
+    with _lock:
+        if _spec is not None and now - _checked_at < CHECK_SECONDS:
+            return _spec
+        _checked_at = now
+        if _spec is None:
+            _spec = load_spec()
+            return _spec
+        try:
+            changed = os.path.getmtime(_spec.path) != _spec.mtime
+        except OSError:
+            changed = False
+        if not changed:
+            return _spec
+        try:
+            new = load_spec(_spec.path)
+        except (OSError, ValueError) as e:
+            print(f"Scoring spec reload failed, keeping version {_spec.version}: {e}")
+            try:
+                _spec.mtime = os.path.getmtime(_spec.path)  # don't retry until the file changes again
+            except OSError:
+                pass
+            return _spec
+        old, _spec = _spec, new
+        print(f"Scoring spec reloaded: {old.version} -> {new.version}")
+    if old.version != new.version:
+        for listener in _listeners:
+            try:
+                listener(old.version, new)
+            except Exception as e:
+                print(f"Scoring spec reload listener failed: {e}")
+    return new
@@ -0,0 +1,474 @@
+"""
+Optional sharded storage for the per-user tables.
+
+With ``SHARD_COUNT=N`` the tables in ``SHARDED_TABLES`` live in N SQLite
+files (``SHARD_DIR/shard-<i>.db``, default a ``shards/`` directory next to
+the primary database): assessment and Level-2 results, level progress,
+trend state and chat history.  Everything else, including the population
+norms aggregated over all users, stays on the primary.  All of a
+user's rows are on one shard, picked by a jump consistent hash of
+``user_id``, so going from 4 to 8 shards moves only the half of the users
+that must move::
+
+    SHARD_COUNT=8 flask --app backend.app shard-rebalance   # once, app stopped
+    SHARD_COUNT=8 flask --app backend.app run
+
+``ShardedSession.get_bind`` picks the shard for the sharded tables:
+
+* requests are scoped to the shard of the user they name (``user_id`` in
+  the URL, query string or body; see ``replica.request_user_id``), and
+  background work uses ``for_user``;
+* a flush goes to the shard of the rows it writes (by their ``user_id``);
+* admin-wide listings and exports run once per shard in parallel
+  (``ShardSet.map`` / ``ShardSet.stream``) and merge the results, while
+  maintenance jobs walk the shards one after another (``each_shard``).
+
+A query on a sharded table outside all of these raises ``ShardingError``
+instead of quietly reading the primary.  Raw SQL is routed by passing
+``bind_arguments={"mapper": Model}``.
+
+Ids stay unique across shards: shard tables are AUTOINCREMENT tables
+started at a per-shard range (``id_base``).  Every rebalance moves all
+shards to the ranges of a new generation above every id handed out so far,
+so moved rows keep their ids (report links, chat summaries and Level-2
+metric rows keep pointing at them) and a user's ids keep increasing (chat
+cursors).
+
+The read replica (replica.py) only mirrors the primary, so sharded tables
+are always read from their shard.
+"""
+
+import contextlib
+import contextvars
+import glob
+import hashlib
+import itertools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context
+
+try:
+    from replica import RoutingSession, request_user_id, sqlite_path
+except ImportError:
+    from backend.replica import RoutingSession, request_user_id, sqlite_path
+
+SHARDED_TABLES = ("assessment_results", "level2_results", "user_level_progress", "user_trends", "chat_messages")
+AUTOINCREMENT_TABLES = ("assessment_results", "level2_results", "chat_messages")
+KEYED_TABLES = {"user_level_progress": ("user_id",), "user_trends": ("user_id", "series")}  # one row per key
+MAX_SHARDS = 64
+ID_SPAN = 1 << 32                         # ids per shard and generation
+GENERATION_SPAN = ID_SPAN * MAX_SHARDS    # 2**38: ids stay below 2**53 (exact in JavaScript) for 32k rebalances
+
+_shard = contextvars.ContextVar("cogniwise_shard", default=None)
+
+
+class ShardingError(RuntimeError):
+    pass
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash of a 64-bit key into ``buckets``."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_for_user(user_id, count: int) -> int:
+    if count <= 1:
+        return 0
+    digest = hashlib.blake2b(str(user_id or "").encode("utf-8"), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), count)
+
+
+def id_base(generation: int, shard: int) -> int:
+    return generation * GENERATION_SPAN + (shard + 1) * ID_SPAN
+
+
+def bind_key(shard: int) -> str:
+    return f"shard_{shard}"
+
+
+def shard_file(shard_dir: str, shard: int) -> str:
+    return os.path.join(shard_dir, f"shard-{shard}.db")
+
+
+# --- scoping ---
+
+def current_shard():
+    return _shard.get()
+
+
+@contextlib.contextmanager
+def using_shard(shard: int):
+    token = _shard.set(shard)
+    try:
+        yield shard
+    finally:
+        _shard.reset(token)
+
+
+def _shards():
+    return current_app.extensions.get("shards") if has_app_context() else None
+
+
+def for_user(user_id):
+    """Scope the enclosed queries to ``user_id``'s shard (no-op when storage is not sharded)."""
+    shards = _shards()
+    if shards is None:
+        return contextlib.nullcontext()
+    return using_shard(shards.shard_for(user_id))
+
+
+def each_shard():
+    """Iterate the shards with each one in scope in turn; yields None once when storage is not sharded."""
+    shards = _shards()
+    if shards is None:
+        yield None
+        return
+    for shard in range(shards.count):
+        with using_shard(shard):
+            yield shard
+
+
+def carry_scope(work):
+    """Wrap ``work(session)`` to run in the caller's shard scope on another thread (group commit)."""
+    shard = _shard.get()
+    if shard is None:
+        return work
+
+    def scoped(session):
+        with using_shard(shard):
+            return work(session)
+    return scoped
+
+
+def _sharded_table(mapper, clause):
+    table = None
+    if mapper is not None:
+        table = sa.inspect(mapper).local_table
+    elif isinstance(clause, sa.Table):
+        table = clause
+    elif isinstance(clause, sa.sql.dml.UpdateBase):
+        table = clause.table
+    elif isinstance(clause, sa.Select):
+        table = next((f for f in clause.get_final_froms()
+                      if isinstance(f, sa.Table) and f.name in SHARDED_TABLES), None)
+    if isinstance(table, sa.Table) and table.name in SHARDED_TABLES:
+        return table.name
+    return None
+
+
+class ShardedSession(RoutingSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shards = _shards()
+            table = _sharded_table(mapper, clause) if shards is not None else None
+            if table is not None:
+                return shards.engine(self._shard_for(shards, table, mapper))
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+    def _shard_for(self, shards, table: str, mapper) -> int:
+        if self._flushing and mapper is not None:
+            cls = sa.inspect(mapper).class_
+            pending = {shards.shard_for(obj.user_id)
+                       for obj in itertools.chain(self.new, self.dirty, self.deleted) if isinstance(obj, cls)}
+            if len(pending) > 1:
+                raise ShardingError(f"one flush writes {table} rows of users on different shards; flush them separately")
+            if pending:
+                return pending.pop()
+        shard = _shard.get()
+        if shard is None:
+            raise ShardingError(f"{table} is sharded by user_id: scope the query with sharding.for_user() "
+                                "or run it on every shard")
+        return shard
+
+
+# --- the shard set ---
+
+class ShardSet:
+    def __init__(self, app, db, paths: list):
+        self.app = app
+        self.db = db
+        self.paths = paths
+        self.count = len(paths)
+        self._pool = ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="shard")
+        self.fan_outs = 0
+        self.fan_out_seconds = 0.0
+
+    def shard_for(self, user_id) -> int:
+        return shard_for_user(user_id, self.count)
+
+    def engine(self, shard: int):
+        return self.db.engines[bind_key(shard)]
+
+    def _call(self, shard: int, fn):
+        with self.app.app_context(), using_shard(shard):
+            return fn(self.db.session)
+
+    def map(self, fn) -> list:
+        """
+        ``[fn(session) for each shard]``, run in parallel, each on its own
+        session scoped to one shard.  Returned ORM objects are detached with
+        their loaded attributes.  Not re-entrant: ``fn`` must not fan out.
+        """
+        started = time.perf_counter()
+        futures = [self._pool.submit(self._call, shard, fn) for shard in range(self.count)]
+        results = [f.result() for f in futures]
+        self.fan_outs += 1
+        self.fan_out_seconds += time.perf_counter() - started
+        return results
+
+    def stream(self, fn, prefetch: int = 2):
+        """
+        Chunks yielded by the generator ``fn(session)`` on every shard,
+        read in parallel (each shard keeps up to ``prefetch`` chunks ahead),
+        in the order they arrive.
+        """
+        out = queue.Queue(maxsize=max(1, prefetch) * self.count)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce(shard):
+            try:
+                with self.app.app_context(), using_shard(shard):
+                    for chunk in fn(self.db.session):
+                        if not put(chunk):
+                            return
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        for shard in range(self.count):
+            threading.Thread(target=produce, args=(shard,), name=f"shard-stream-{shard}", daemon=True).start()
+        self.fan_outs += 1
+        remaining = self.count
+        try:
+            while remaining:
+                item = out.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+    def create_all(self):
+        """Create the sharded tables on every shard and start fresh shards at their id range."""
+        tables = [self.db.metadata.tables[name] for name in SHARDED_TABLES]
+        generation = current_generation(self.paths)
+        for shard in range(self.count):
+            create_shard_tables(self.engine(shard), tables, shard, generation)
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.count,
+            "fan_outs": self.fan_outs,
+            "fan_out_ms_avg": round(self.fan_out_seconds / self.fan_outs * 1000, 2) if self.fan_outs else None,
+            "shard_bytes": [os.path.getsize(p) if os.path.exists(p) else 0 for p in self.paths],
+        }
+
+
+def create_shard_tables(engine, tables: list, shard: int, generation: int = 0):
+    metadata = sa.MetaData()
+    for table in tables:
+        copy = table.to_metadata(metadata)
+        copy.dialect_options["sqlite"]["autoincrement"] = True
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        for name in AUTOINCREMENT_TABLES:
+            # one statement, so concurrently starting workers cannot both seed
+            connection.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (name, id_base(generation, shard), name),
+            )
+
+
+def current_generation(paths: list) -> int:
+    """Id generation the existing shard files are in (0 when there are none)."""
+    top = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            row = conn.execute("SELECT MAX(seq) FROM sqlite_sequence").fetchone()
+        except sqlite3.OperationalError:  # no AUTOINCREMENT table yet
+            row = None
+        finally:
+            conn.close()
+        if row and row[0]:
+            top = max(top, row[0])
+    return top // GENERATION_SPAN
+
+
+# --- rebalancing ---
+
+def _columns(conn, schema: str, table: str) -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def rebalance(primary_path: str, shard_dir: str, count: int, batch_users: int = 500,
+              dry_run: bool = False) -> dict:
+    """
+    Move every row of the sharded tables to the shard its user hashes to
+    under ``count`` shards, reading from the primary (rows stored before
+    sharding was enabled) and from every ``shard-<i>.db`` in ``shard_dir``,
+    including files left over from a larger layout (which end up empty).
+    The target shards must exist (the app creates them on start).
+
+    Each batch of users is copied and deleted in one transaction and
+    copies are ``INSERT OR IGNORE`` by id, so an interrupted run can simply
+    be repeated.  For per-user state (``KEYED_TABLES``) the newer row wins.
+    """
+    started = time.perf_counter()
+    targets = [shard_file(shard_dir, shard) for shard in range(count)]
+    missing = [p for p in targets if not os.path.exists(p)]
+    if missing:
+        raise ShardingError(f"missing shard files {missing}; start the app once with SHARD_COUNT={count}")
+    sources = [(None, primary_path)] + sorted(
+        (int(os.path.basename(p)[6:-3]), p) for p in glob.glob(os.path.join(shard_dir, "shard-*.db"))
+        if os.path.basename(p)[6:-3].isdigit()
+    )
+    moved_users = set()
+    stats = {"shards": count, "dry_run": dry_run, "rows_moved": {t: 0 for t in SHARDED_TABLES},
+             "leftover_files": [p for shard, p in sources if shard is not None and shard >= count]}
+
+    for source_shard, source_path in sources:
+        conn = sqlite3.connect(source_path, timeout=60, isolation_level=None)
+        try:
+            present = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS moving (user_id TEXT PRIMARY KEY)")
+            for table in SHARDED_TABLES:
+                if table not in present:
+                    continue
+                by_target = {}
+                for (user_id,) in conn.execute(f"SELECT DISTINCT user_id FROM {table}"):
+                    target = shard_for_user(user_id, count)
+                    if target != source_shard:
+                        by_target.setdefault(target, []).append(user_id)
+                for target, users in sorted(by_target.items()):
+                    moved = _move_users(conn, table, targets[target], users, batch_users, dry_run)
+                    stats["rows_moved"][table] += moved
+                    moved_users.update((source_shard, u) for u in users)
+        finally:
+            conn.close()
+
+    stats["users_moved"] = len({u for _, u in moved_users})
+    if not dry_run and any(stats["rows_moved"].values()):
+        generation = current_generation(targets) + 1
+        for shard, path in enumerate(targets):
+            conn = sqlite3.connect(path, timeout=60)
+            try:
+                with conn:
+                    for name in AUTOINCREMENT_TABLES:
+                        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?",
+                                     (id_base(generation, shard), name))
+            finally:
+                conn.close()
+        stats["generation"] = generation
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def _move_users(conn, table: str, target_path: str, users: list, batch_users: int, dry_run: bool) -> int:
+    moved = 0
+    conn.execute("ATTACH DATABASE ? AS dst", (target_path,))
+    try:
+        columns = [c for c in _columns(conn, "main", table) if c in set(_columns(conn, "dst", table))]
+        cols = ", ".join(columns)
+        nulls = None in users
+        users = [u for u in users if u is not None]
+        batches = [users[i:i + batch_users] for i in range(0, len(users), batch_users)]
+        if nulls:
+            batches.append([])
+        for batch in batches:
+            where = "user_id IN (SELECT user_id FROM temp.moving)" if batch else "user_id IS NULL"
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM temp.moving")
+                conn.executemany("INSERT INTO temp.moving (user_id) VALUES (?)", [(u,) for u in batch])
+                if dry_run:
+                    moved += conn.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {where}").fetchone()[0]
+                    conn.execute("ROLLBACK")
+                    continue
+                if table in KEYED_TABLES:
+                    same_key = " AND ".join(f"s.{k} = dst.{table}.{k}" for k in KEYED_TABLES[table])
+                    conn.execute(
+                        f"DELETE FROM dst.{table} WHERE {where} AND updated_at < "
+                        f"(SELECT s.updated_at FROM main.{table} s WHERE {same_key})"
+                    )
+                moved += conn.execute(
+                    f"INSERT OR IGNORE INTO dst.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {where}"
+                ).rowcount
+                conn.execute(f"DELETE FROM main.{table} WHERE {where}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.execute("DETACH DATABASE dst")
+    return moved
+
+
+# --- setup ---
+
+def configure(app) -> list:
+    """Add one bind per shard to the app config (before ``db.init_app``); returns the shard files."""
+    count = int(os.getenv("SHARD_COUNT", "0"))
+    if count <= 0:
+        return []
+    if count > MAX_SHARDS:
+        raise ShardingError(f"SHARD_COUNT can be at most {MAX_SHARDS}")
+    primary = sqlite_path(app.config["SQLALCHEMY_DATABASE_URI"])
+    shard_dir = os.getenv("SHARD_DIR") or os.path.join(os.path.dirname(os.path.abspath(primary or ".")), "shards")
+    os.makedirs(shard_dir, exist_ok=True)
+    paths = [shard_file(shard_dir, shard) for shard in range(count)]
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    binds.update({bind_key(shard): f"sqlite:///{path}" for shard, path in enumerate(paths)})
+    app.config["SHARD_DIR"] = shard_dir
+    return paths
+
+
+def _scope_request():
+    user_id = request_user_id()
+    if user_id is not None:
+        g.shard_token = _shard.set(current_app.extensions["shards"].shard_for(user_id))
+
+
+def _unscope_request(exc):
+    token = g.pop("shard_token", None)
+    if token is not None:
+        _shard.reset(token)
+
+
+def init_app(app, db, paths: list):
+    """Enable sharded storage when ``configure`` set up shards."""
+    if not paths:
+        return None
+    shards = ShardSet(app, db, paths)
+    app.extensions["shards"] = shards
+    app.before_request(_scope_request)
+    app.teardown_request(_unscope_request)
+    return shards
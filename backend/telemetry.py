@@ -0,0 +1,245 @@
+"""
+Raw Level-2 game telemetry: per-trial reaction times, gaze samples, taps.
+
+Events are kept columnar end to end.  A batch is a set of packed arrays
+(one per field below) rather than one object per event; it is buffered
+in memory per session and a background flusher appends it to the database
+as a compressed chunk.  Storage is append-only and costs a few bytes per
+event, and a request only parses and appends, it never waits on the
+database.
+
+Wire formats accepted by the ingestion endpoint:
+
+* NDJSON, one event per line::
+
+    {"t": 1532, "type": "rt", "game": 1, "trial": 4, "value": 412.5}
+    {"t": 1540, "type": "gaze", "x": 0.41, "y": 0.63}
+
+* Binary (``application/x-cogniwise-telemetry``), columnar and
+  little-endian: ``b"CWT1"``, ``uint32`` event count, then each column in
+  ``COLUMNS`` order as a packed array of that length.
+
+Missing ``x``/``y``/``value`` are stored as NaN, missing integers as 0.
+"""
+
+import json
+import math
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+# (field, array typecode): t = ms since session start, trial index, screen x/y in 0..1,
+# value = the measurement (reaction time in ms, pupil size, ...)
+COLUMNS = (("t", "I"), ("type", "B"), ("game", "B"), ("trial", "H"), ("x", "f"), ("y", "f"), ("value", "f"))
+EVENT_TYPES = ("other", "rt", "gaze", "tap", "stimulus", "error")
+_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+MAGIC = b"CWT1"
+_COUNT = struct.Struct("<I")
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+class TelemetryFormatError(ValueError):
+    """The request body is not a valid telemetry batch."""
+
+
+class TelemetryBackpressure(Exception):
+    """Too many events are waiting to be written; the client should retry later."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Telemetry buffer full")
+        self.retry_after = retry_after
+
+
+def new_columns() -> dict:
+    return {name: array(code) for name, code in COLUMNS}
+
+
+def event_count(columns: dict) -> int:
+    return len(columns["t"])
+
+
+def _game_code(game) -> int:
+    if isinstance(game, str):
+        game = game.lower().replace("game", "")
+    return int(game or 0)
+
+
+def parse_ndjson(body: bytes) -> dict:
+    columns = new_columns()
+    t, kind, game, trial = columns["t"], columns["type"], columns["game"], columns["trial"]
+    x, y, value = columns["x"], columns["y"], columns["value"]
+    nan = math.nan
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+            t.append(int(event.get("t", 0)))
+            kind.append(_TYPE_CODES.get(event.get("type"), 0))
+            game.append(_game_code(event.get("game")))
+            trial.append(int(event.get("trial", 0)))
+            x.append(float(event.get("x", nan)))
+            y.append(float(event.get("y", nan)))
+            value.append(float(event.get("value", nan)))
+        except (ValueError, TypeError, AttributeError, OverflowError) as e:
+            raise TelemetryFormatError(f"line {number}: {e}")
+    return columns
+
+
+def parse_binary(body: bytes) -> dict:
+    if len(body) < 8 or body[:4] != MAGIC:
+        raise TelemetryFormatError("binary batch must start with CWT1 and an event count")
+    (count,) = _COUNT.unpack_from(body, 4)
+    columns = new_columns()
+    expected = 8 + count * sum(columns[name].itemsize for name, _ in COLUMNS)
+    if len(body) != expected:
+        raise TelemetryFormatError(f"binary batch of {count} events must be {expected} bytes, got {len(body)}")
+    offset = 8
+    for name, _ in COLUMNS:
+        arr = columns[name]
+        size = count * arr.itemsize
+        arr.frombytes(body[offset: offset + size])
+        offset += size
+        if _BIG_ENDIAN:
+            arr.byteswap()
+    return columns
+
+
+def encode_binary(columns: dict) -> bytes:
+    """Inverse of ``parse_binary`` (used by clients, tests and the benchmark)."""
+    parts = [MAGIC, _COUNT.pack(event_count(columns))]
+    for name, _ in COLUMNS:
+        arr = columns[name]
+        if _BIG_ENDIAN:
+            arr = array(arr.typecode, arr)
+            arr.byteswap()
+        parts.append(arr.tobytes())
+    return b"".join(parts)
+
+
+def encode_chunk(columns: dict) -> bytes:
+    # Storing chunks in the wire layout means column bytes compress well together.
+    return zlib.compress(encode_binary(columns), 6)
+
+
+def decode_chunk(payload: bytes) -> dict:
+    return parse_binary(zlib.decompress(payload))
+
+
+def concat(column_sets) -> dict:
+    out = new_columns()
+    for columns in column_sets:
+        for name, _ in COLUMNS:
+            out[name].extend(columns[name])
+    return out
+
+
+class TelemetryWriter:
+    """
+    Per-session in-memory buffers drained by a background thread.
+
+    ``write_chunks(items)`` receives ``[(session_id, user_id, columns)]`` and
+    must persist them; it runs on the flusher thread (or inline for
+    ``flush()``), never on the request path.
+    """
+
+    def __init__(self, write_chunks, flush_interval: float = 1.0, flush_events: int = 20000,
+                 max_buffered_events: int = 2_000_000, background: bool = True):
+        self.write_chunks = write_chunks
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.max_buffered_events = max_buffered_events
+        self.background = background
+        self._pending = {}  # session_id -> (user_id, [columns, ...], events)
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.accepted = 0
+        self.written = 0
+        self.rejected_batches = 0
+        self.flush_errors = 0
+
+    def start(self):
+        if self.background and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def append(self, session_id: str, user_id: str, columns: dict) -> int:
+        count = event_count(columns)
+        if not count:
+            return 0
+        with self._lock:
+            if self._buffered + count > self.max_buffered_events:
+                self.rejected_batches += 1
+                raise TelemetryBackpressure(retry_after=self.flush_interval)
+            owner, batches, events = self._pending.get(session_id, (user_id, [], 0))
+            batches.append(columns)
+            self._pending[session_id] = (owner or user_id, batches, events + count)
+            self._buffered += count
+            self.accepted += count
+            full = self._buffered >= self.flush_events
+        if not self.background:
+            self.flush()
+        elif full:
+            self._wake.set()
+        return count
+
+    def flush(self, session_id: str = None) -> int:
+        """Write pending events (all sessions, or just one) and return how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                if session_id is None:
+                    taken, self._pending = self._pending, {}
+                else:
+                    taken = {session_id: self._pending.pop(session_id)} if session_id in self._pending else {}
+                events = sum(e for _, _, e in taken.values())
+                self._buffered -= events
+            if not taken:
+                return 0
+            items = [(sid, user_id, concat(batches)) for sid, (user_id, batches, _) in taken.items()]
+            try:
+                self.write_chunks(items)
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Telemetry flush failed, requeueing {events} events: {e}")
+                with self._lock:
+                    for sid, user_id, columns in items:
+                        owner, batches, count = self._pending.get(sid, (user_id, [], 0))
+                        self._pending[sid] = (owner, [columns] + batches, count + event_count(columns))
+                    self._buffered += events
+                return 0
+            self.written += events
+            return events
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buffered_events": self._buffered,
+                "buffered_sessions": len(self._pending),
+                "accepted_events": self.accepted,
+                "written_events": self.written,
+                "rejected_batches": self.rejected_batches,
+                "flush_errors": self.flush_errors,
+                "background": self.background,
+            }
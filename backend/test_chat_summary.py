@@ -0,0 +1,123 @@
+"""
+Rolling chat summaries end to end on a temporary SQLite database, with the
+deterministic stub summarizer (``CHAT_SUMMARY_BACKEND=stub``).
+
+    python -m pytest -q backend/test_chat_summary.py
+"""
+
+import contextlib
+import importlib
+import io
+import os
+
+import pytest
+
+from backend.job_queue import STATUS_QUEUED, STATUS_SUCCEEDED, JobQueue
+
+KEEP_RECENT = 4
+THRESHOLD_CHARS = 2000
+
+
+@pytest.fixture(scope="module")
+def A(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("chat-summary")
+    env = {"DATABASE_URL": f"sqlite:///{tmp / 'chat.db'}", "JOBS_DB_PATH": str(tmp / "jobs.db"),
+           "CHAT_SUMMARY_BACKEND": "stub"}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module = importlib.import_module("backend.app")
+    yield app_module
+    for k, v in saved.items():
+        if v is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = v
+
+
+@pytest.fixture
+def ctx(A, monkeypatch):
+    monkeypatch.setattr(A.chat_summary, "THRESHOLD_CHARS", THRESHOLD_CHARS)
+    monkeypatch.setattr(A.chat_summary, "KEEP_RECENT", KEEP_RECENT)
+    with A.app.app_context():
+        yield
+
+
+def save_turns(A, user_id: str, count: int, start: int = 0) -> list:
+    ids = []
+    for i in range(start, start + count):
+        role = "user" if i % 2 == 0 else "assistant"
+        # every fourth turn is long enough to be stored compressed
+        text = f"turn {i} " + ("about attention and memory " * (30 if i % 4 == 3 else 3))
+        ids.append(A.save_chat_message(user_id, role, text).id)
+    return ids
+
+
+def test_compaction_waits_for_the_threshold(A, ctx):
+    save_turns(A, "short-chat", KEEP_RECENT + 2)
+    assert A.compact_chat_history("short-chat") == {"compacted": 0}
+    assert A.db.session.get(A.ChatSummary, "short-chat") is None
+
+
+def test_compaction_advances_summary_and_prompt_context(A, ctx):
+    user_id = "long-chat"
+    ids = save_turns(A, user_id, 20)
+
+    result = A.compact_chat_history(user_id)
+    assert result["compacted"] == 20 - KEEP_RECENT
+    row = A.db.session.get(A.ChatSummary, user_id)
+    assert row.summarized_through_id == ids[-KEEP_RECENT - 1]
+    assert row.summarized_messages == 20 - KEEP_RECENT
+    assert row.summary.startswith("- User: turn 0 ")
+    assert "- Model: turn 15 " in row.summary and "turn 16 " not in row.summary
+
+    summary, history = A.chat_prompt_context(user_id, [{"role": "user", "content": "ignored"}])
+    assert summary == row.summary
+    assert [m["content"].split(" about")[0] for m in history] == [f"turn {i}" for i in range(16, 20)]
+
+    # Already compact: running again is a no-op.
+    assert A.compact_chat_history(user_id) == {"compacted": 0}
+
+    # More turns: the next pass folds the kept turns in and moves the cut-off forward.
+    ids += save_turns(A, user_id, 20, start=20)
+    A.compact_chat_history(user_id)
+    row = A.db.session.get(A.ChatSummary, user_id)
+    assert row.summarized_through_id == ids[-KEEP_RECENT - 1]
+    assert row.summarized_messages == 40 - KEEP_RECENT
+    assert "- Model: turn 35 " in row.summary and "turn 36 " not in row.summary
+    assert len(row.summary) <= A.chat_summary.MAX_SUMMARY_CHARS  # oldest lines dropped first
+    summary, history = A.chat_prompt_context(user_id, [])
+    assert summary == row.summary
+    assert len(history) == KEEP_RECENT
+    assert history[-1]["content"].startswith("turn 39 ")
+
+
+def test_schedule_compaction_enqueues_one_summary_job(A, ctx, monkeypatch, tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), context_factory=A.app.app_context)
+    queue.register("chat_summary", A.run_chat_summary_job, internal=True)
+    monkeypatch.setattr(queue, "start", lambda: None)  # jobs are run by hand below
+    monkeypatch.setattr(A, "get_job_queue", lambda app: queue)
+
+    def summary_jobs(status):
+        return queue.stats().get("chat_summary", {}).get(status, 0)
+
+    save_turns(A, "scheduled-chat", KEEP_RECENT + 2)
+    A.maybe_schedule_compaction(A.app, "scheduled-chat")
+    assert summary_jobs(STATUS_QUEUED) == 0
+
+    # Every turn past the threshold checks again, but only one job is queued.
+    for start in range(KEEP_RECENT + 2, KEEP_RECENT + 22, 2):
+        save_turns(A, "scheduled-chat", 2, start=start)
+        A.maybe_schedule_compaction(A.app, "scheduled-chat")
+    save_turns(A, "other-chat", 20)
+    A.maybe_schedule_compaction(A.app, "other-chat")
+    assert summary_jobs(STATUS_QUEUED) == 2
+
+    while (job := queue._claim()) is not None:
+        queue._execute(job)
+        queue._running[job["job_type"]] -= 1
+    assert summary_jobs(STATUS_SUCCEEDED) == 2
+    assert A.db.session.get(A.ChatSummary, "scheduled-chat").summarized_messages == 22
+
+    A.maybe_schedule_compaction(A.app, "scheduled-chat")
+    assert summary_jobs(STATUS_QUEUED) == 0
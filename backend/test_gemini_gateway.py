@@ -0,0 +1,151 @@
+"""
+GeminiGateway admission, circuit breaker and retry-after handling against
+FakeGeminiClient, mostly on an injected clock (only the retry-after test sleeps, 0.2s).
+
+    python -m pytest -q backend/test_gemini_gateway.py
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from backend.gemini_client import (CircuitBreaker, FakeGeminiClient, GeminiGateway, GeminiUnavailable,
+                                   RetryPolicy, TokenBucket)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def make_gateway(clock, fake, failure_threshold=1, reset_timeout=5.0, max_attempts=1, max_wait=0.0,
+                 rate=1.0, sleep=None):
+    return GeminiGateway(lambda: fake, ["gemini-test"],
+                         limiter=TokenBucket(rate, capacity=1, clock=clock),
+                         breaker=CircuitBreaker(failure_threshold, reset_timeout, clock=clock),
+                         retry=RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=0.05),
+                         max_wait=max_wait, sleep=sleep or (lambda s: None))
+
+
+def open_breaker(gateway, fake):
+    fake.error_rate = 1.0
+    with pytest.raises(GeminiUnavailable) as e:
+        gateway.generate("hello")
+    assert e.value.status == 429
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_busy_limiter_releases_half_open_probe(use_async):
+    clock = FakeClock()
+    fake = FakeGeminiClient(retry_after=None, seed=1)
+    gateway = make_gateway(clock, fake)
+    generate = (lambda p: asyncio.run(gateway.generate_async(p))) if use_async else gateway.generate
+    open_breaker(gateway, fake)
+
+    clock.advance(5.0)
+    assert gateway.limiter.acquire(0)  # someone else takes the token the probe would need
+    with pytest.raises(GeminiUnavailable) as e:
+        generate("hello")
+    assert e.value.message.startswith("AI service is busy")
+    assert fake.calls == 1  # turned away before reaching upstream
+
+    # The probe slot must be free again, or the breaker never closes.
+    clock.advance(1.0)
+    fake.error_rate = 0.0
+    assert generate("hello") == "[gemini-test] fake reply"
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_open_half_open_closed():
+    clock = FakeClock()
+    fake = FakeGeminiClient(retry_after=None, seed=1)
+    gateway = make_gateway(clock, fake, failure_threshold=2, reset_timeout=10.0, rate=100.0)
+    fake.error_rate = 1.0
+    with pytest.raises(GeminiUnavailable):
+        gateway.generate("hello")
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+    clock.advance(1.0)
+    open_breaker(gateway, fake)
+
+    # Open: fail fast without calling upstream.
+    calls = fake.calls
+    clock.advance(4.0)
+    with pytest.raises(GeminiUnavailable) as e:
+        gateway.generate("hello")
+    assert e.value.retry_after == pytest.approx(6.0)
+    assert fake.calls == calls
+
+    # Half-open: a failed probe opens it again for the full timeout.
+    clock.advance(6.0)
+    assert gateway.breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(GeminiUnavailable):
+        gateway.generate("hello")
+    assert fake.calls == calls + 1
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+    assert gateway.breaker.retry_after() == pytest.approx(10.0)
+
+    # Half-open: a successful probe closes it.
+    clock.advance(10.0)
+    fake.error_rate = 0.0
+    assert gateway.generate("hello") == "[gemini-test] fake reply"
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_admits_a_single_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(1, reset_timeout=5.0, clock=clock)
+    breaker.record_failure()
+    clock.advance(5.0)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_retry_waits_at_least_retry_after():
+    slept = []
+    fake = FakeGeminiClient(retry_after=0.2, seed=1)
+    fake.error_rate = 1.0
+
+    def sleep(seconds):
+        slept.append(seconds)
+        fake.error_rate = 0.0  # the quota has recovered by the next attempt
+        time.sleep(seconds)
+
+    gateway = GeminiGateway(lambda: fake, ["gemini-test"], limiter=TokenBucket(50, capacity=1),
+                            breaker=CircuitBreaker(5, reset_timeout=1.0),
+                            retry=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05),
+                            max_wait=2.0, sleep=sleep)
+    started = time.monotonic()
+    assert gateway.generate("hello") == "[gemini-test] fake reply"
+    assert slept and slept[0] >= 0.2
+    assert time.monotonic() - started >= 0.2
+    assert fake.calls == 2
+
+
+def test_retry_after_beyond_max_wait_opens_breaker_for_the_hint():
+    clock = FakeClock()
+    slept = []
+    fake = FakeGeminiClient(retry_after=30.0, seed=1)
+    gateway = make_gateway(clock, fake, reset_timeout=5.0, max_attempts=3, max_wait=10.0,
+                           sleep=slept.append)
+    fake.error_rate = 1.0
+    with pytest.raises(GeminiUnavailable) as e:
+        gateway.generate("hello")
+    assert e.value.status == 429
+    assert e.value.retry_after == 30.0
+    assert slept == []  # waiting 30s is longer than the caller may wait
+    assert gateway.breaker.retry_after() == pytest.approx(30.0)
+
+    clock.advance(29.0)
+    assert not gateway.breaker.allow()
+    clock.advance(1.0)
+    assert gateway.breaker.allow()
@@ -0,0 +1,95 @@
+"""
+JobQueue lease recovery and retention on a temporary SQLite file.
+
+    python -m pytest -q backend/test_job_queue.py
+"""
+
+import threading
+import time
+
+from backend.job_queue import STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, STATUS_SUCCEEDED, JobQueue
+
+
+def make_queue(tmp_path, **kwargs):
+    kwargs.setdefault("poll_interval", 0.02)
+    return JobQueue(str(tmp_path / "jobs.db"), workers=2, **kwargs)
+
+
+def test_hung_handler_is_requeued_and_late_finish_is_dropped(tmp_path):
+    release = threading.Event()
+    runs = []
+
+    def handler(payload):
+        runs.append(payload["n"])
+        if len(runs) == 1:
+            release.wait(5)  # hangs past its lease
+            return "late"
+        return "on time"
+
+    queue = make_queue(tmp_path, lease_seconds=0.2)
+    queue.register("work", handler, concurrency=2, max_attempts=3)
+    job_id = queue.enqueue("work", {"n": 1})
+    try:
+        job = queue.wait(job_id, timeout=5)
+        assert job["status"] == STATUS_SUCCEEDED and job["result"] == "on time"
+        assert job["attempts"] == 2
+        release.set()
+        time.sleep(0.1)
+        assert queue.get(job_id)["result"] == "on time"
+    finally:
+        release.set()
+        queue.stop()
+
+
+def test_lease_left_by_a_dead_process_is_reclaimed(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.2)
+    queue.register("work", lambda payload: "done")
+    job_id = queue.enqueue("work", {})
+    assert queue.wait(job_id, timeout=5)["status"] == STATUS_SUCCEEDED
+    queue.stop()
+
+    # Another process crashed while running this job: status running, live lease.
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET status = ?, attempts = 1, lease_expires_at = ?, result = NULL WHERE id = ?",
+                 (STATUS_RUNNING, time.time() + 0.3, job_id))
+    conn.commit()
+
+    restarted = make_queue(tmp_path, lease_seconds=0.2)
+    restarted.register("work", lambda payload: "redone")
+    restarted.start()
+    try:
+        job = restarted.wait(job_id, timeout=5)
+        assert job["status"] == STATUS_SUCCEEDED and job["result"] == "redone"
+    finally:
+        restarted.stop()
+
+
+def test_expired_lease_without_attempts_left_fails(tmp_path):
+    release = threading.Event()
+    queue = make_queue(tmp_path, lease_seconds=0.2)
+    queue.register("work", lambda payload: release.wait(5), max_attempts=1)
+    job_id = queue.enqueue("work", {})
+    try:
+        job = queue.wait(job_id, timeout=5)
+        assert job["status"] == STATUS_FAILED and job["error"] == "Lease expired"
+    finally:
+        release.set()
+        queue.stop()
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.2, retention_seconds=0.3)
+    queue.register("work", lambda payload: {"pdf_base64": "x" * 1000})
+    job_id = queue.enqueue("work", {"file_base64": "y" * 1000})
+    try:
+        job = queue.wait(job_id, timeout=5)
+        assert job["status"] == STATUS_SUCCEEDED
+        assert "payload" not in job  # uploads are not echoed back
+        queued = queue.enqueue("work", {}, delay=60)
+        deadline = time.time() + 5
+        while queue.get(job_id) is not None and time.time() < deadline:
+            time.sleep(0.05)
+        assert queue.get(job_id) is None
+        assert queue.get(queued)["status"] == STATUS_QUEUED  # unfinished jobs are kept
+    finally:
+        queue.stop()
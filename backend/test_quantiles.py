@@ -0,0 +1,133 @@
+"""
+KLL sketch accuracy against the exact sorted data, plus merge and
+serialization.  Seeded, so the results are deterministic.
+
+    python -m pytest -q backend/test_quantiles.py
+"""
+
+import random
+import struct
+import zlib
+from bisect import bisect_right
+
+import pytest
+
+from backend.quantiles import KLLSketch, percentile_from_table, percentile_table
+
+K = 200
+RANK_ERROR = 2 * 1.7 / K  # twice the expected normalized rank error, for headroom
+FRACTIONS = [i / 100 for i in range(1, 100)]
+
+DISTRIBUTIONS = {
+    "risk_rounded": lambda rng: round(rng.betavariate(2, 5), 2),  # many ties
+    "uniform": lambda rng: rng.random(),
+    "lognormal": lambda rng: rng.lognormvariate(0, 1),
+}
+
+
+def sample(name: str, n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [DISTRIBUTIONS[name](rng) for _ in range(n)]
+
+
+def build(values, seed: int = 1) -> KLLSketch:
+    sketch = KLLSketch(k=K, rng=random.Random(seed))
+    for v in values:
+        sketch.update(v)
+    return sketch
+
+
+def max_rank_error(sketch: KLLSketch, exact: list) -> float:
+    """Largest distance between ``q`` and the true rank interval of the sketch's ``q``-quantile."""
+    n = len(exact)
+    worst = 0.0
+    for q, estimate in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+        low = bisect_right(exact, estimate - 1e-12) / n  # ties: any rank in [low, high] is right
+        high = bisect_right(exact, estimate) / n
+        worst = max(worst, low - q if q < low else q - high if q > high else 0.0)
+    return worst
+
+
+@pytest.mark.parametrize("name", sorted(DISTRIBUTIONS))
+@pytest.mark.parametrize("sorted_input", [False, True])
+def test_quantiles_within_rank_error(name, sorted_input):
+    values = sample(name, 50000, seed=7)
+    exact = sorted(values)
+    sketch = build(exact if sorted_input else values)
+    assert sketch.n == len(values)
+    assert sum(w for _, w in sketch.weighted_items()) == sketch.n
+    assert max_rank_error(sketch, exact) <= RANK_ERROR
+
+
+@pytest.mark.parametrize("name", sorted(DISTRIBUTIONS))
+def test_percentile_table_matches_exact_percentiles(name):
+    values = sample(name, 50000, seed=11)
+    exact = sorted(values)
+    table = percentile_table(build(values))
+    assert len(table) == 101 and table == sorted(table)
+    for q in FRACTIONS:
+        probe = exact[int(q * (len(exact) - 1))]
+        expected = 100.0 * bisect_right(exact, probe) / len(exact)
+        assert percentile_from_table(table, probe) == pytest.approx(expected, abs=2.5)
+
+
+def test_percentile_from_table_edges():
+    table = [float(i) for i in range(101)]
+    assert percentile_from_table([], 1.0) is None
+    assert percentile_from_table(table, -1.0) == 0.0
+    assert percentile_from_table(table, 1000.0) == 100.0
+    assert percentile_from_table(table, 42.5) == 42.5
+
+
+def test_merge_matches_a_single_sketch():
+    values = sample("lognormal", 60000, seed=3)
+    exact = sorted(values)
+    merged = KLLSketch(k=K, rng=random.Random(5))
+    for part in range(4):
+        merged.merge(build(values[part::4], seed=part))
+    assert merged.n == len(values)
+    assert sum(w for _, w in merged.weighted_items()) == merged.n
+    assert merged._size < merged._max_size  # compacted back under its memory bound
+    assert max_rank_error(merged, exact) <= RANK_ERROR
+
+
+def test_merge_into_empty_and_with_empty():
+    values = sample("uniform", 5000, seed=4)
+    sketch = build(values)
+    before = sketch.quantiles(FRACTIONS)
+    sketch.merge(KLLSketch(k=K))
+    assert sketch.quantiles(FRACTIONS) == before
+
+    empty = KLLSketch(k=K)
+    empty.merge(sketch)
+    assert empty.n == sketch.n
+    assert empty.quantiles(FRACTIONS) == before
+
+
+def test_serialization_round_trip():
+    sketch = build(sample("risk_rounded", 20000, seed=9))
+    restored = KLLSketch.from_bytes(sketch.to_bytes())
+    assert (restored.k, restored.n) == (sketch.k, sketch.n)
+    assert restored.compactors == sketch.compactors
+    assert restored.quantiles(FRACTIONS) == sketch.quantiles(FRACTIONS)
+    assert len(sketch.to_bytes()) < 16 * 1024
+
+    # A restored sketch keeps accepting updates and stays mergeable.
+    for v in sample("risk_rounded", 20000, seed=10):
+        restored.update(v)
+    assert restored.n == 40000
+    assert sum(w for _, w in restored.weighted_items()) == restored.n
+
+
+def test_empty_sketch():
+    sketch = KLLSketch.from_bytes(KLLSketch(k=K).to_bytes())
+    assert sketch.n == 0
+    assert sketch.quantiles([0.5]) == [None]
+    assert sketch.rank(1.0) == 0.0
+
+
+def test_unknown_version_is_rejected():
+    raw = zlib.decompress(KLLSketch(k=K).to_bytes())
+    bumped = struct.pack("<B", 99) + raw[1:]
+    with pytest.raises(ValueError):
+        KLLSketch.from_bytes(zlib.compress(bumped))
@@ -0,0 +1,33 @@
+"""
+Import footprint of the Flask app: heavy optional modules must stay out of
+``import backend.app`` so cold starts do not pay for them (see
+bench_startup.py for the timings).
+
+    python -m pytest -q backend/test_startup.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ("numpy", "pyarrow", "google.genai", "reportlab")
+
+# Runs in a fresh interpreter, so modules imported by other tests do not count.
+CHILD = r"""
+import contextlib, io, json, sys
+with contextlib.redirect_stdout(io.StringIO()):
+    import backend.app
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_app_import_leaves_heavy_modules_unloaded(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DB_INIT="skip", DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}",
+               JOBS_DB_PATH=str(tmp_path / "jobs.db"), PYTHONPATH=root)
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=root, env=env, capture_output=True, text=True,
+                         timeout=120)
+    assert out.returncode == 0, out.stderr
+    loaded = json.loads(out.stdout.strip().splitlines()[-1])
+    assert [m for m in loaded if m in HEAVY_MODULES or m.startswith(tuple(h + "." for h in HEAVY_MODULES))] == []
@@ -0,0 +1,126 @@
+"""
+Incremental per-user trend aggregates.
+
+Each (user, series) pair keeps a small JSON state that is updated in O(1)
+per new score:
+  * the last ``WINDOW`` points (the series returned by the API),
+  * an exponentially weighted moving average,
+  * Welford running mean / variance,
+  * least-squares sums over (days since first point, value) for the slope,
+  * a two-sided CUSUM on standardized scores that flags sustained shifts
+    away from the user's own baseline as change points; the baseline then
+    restarts from the new level so one shift is reported once.
+
+Nothing here reads history, so the trends endpoint costs the same after
+three screenings or three hundred.
+"""
+
+import math
+import os
+from datetime import datetime
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+WINDOW = int(_env_float("TREND_WINDOW", 20))
+SMA_POINTS = int(_env_float("TREND_SMA_POINTS", 5))
+EWMA_ALPHA = _env_float("TREND_EWMA_ALPHA", 0.3)
+CUSUM_K = _env_float("TREND_CUSUM_K", 0.5)      # slack, in standard deviations
+CUSUM_H = _env_float("TREND_CUSUM_H", 3.0)      # decision threshold, in standard deviations
+MIN_BASELINE = int(_env_float("TREND_MIN_BASELINE", 3))
+MIN_SPAN_DAYS = _env_float("TREND_MIN_SPAN_DAYS", 1.0)  # no slope for screenings all on one day
+MIN_SIGMA_FRACTION = 0.02  # noise floor as a fraction of the score scale
+MAX_CHANGE_POINTS = 10
+
+
+def new_state() -> dict:
+    return {
+        "n": 0, "first_at": None, "last_at": None,
+        "ewma": None, "mean": 0.0, "m2": 0.0,
+        "sum_t": 0.0, "sum_v": 0.0, "sum_tt": 0.0, "sum_tv": 0.0,
+        "base_n": 0, "base_mean": 0.0, "base_m2": 0.0, "cusum_pos": 0.0, "cusum_neg": 0.0,
+        "recent": [], "change_points": [],
+    }
+
+
+def _days_between(start: str, end: datetime) -> float:
+    return (end - datetime.fromisoformat(start)).total_seconds() / 86400.0
+
+
+def update(state: dict, at: datetime, value: float, scale: float = 1.0) -> dict:
+    """Fold one ``(at, value)`` observation into ``state`` (in place) and return it."""
+    value = float(value)
+    if state["first_at"] is None:
+        state["first_at"] = at.isoformat()
+
+    # CUSUM against the baseline *before* this point is folded in.
+    if state["base_n"] >= MIN_BASELINE:
+        sigma = max(math.sqrt(state["base_m2"] / (state["base_n"] - 1)), MIN_SIGMA_FRACTION * scale)
+        z = (value - state["base_mean"]) / sigma
+        state["cusum_pos"] = max(0.0, state["cusum_pos"] + z - CUSUM_K)
+        state["cusum_neg"] = max(0.0, state["cusum_neg"] - z - CUSUM_K)
+        direction = "up" if state["cusum_pos"] > CUSUM_H else "down" if state["cusum_neg"] > CUSUM_H else None
+        if direction:
+            state["change_points"] = (state["change_points"] + [
+                {"at": at.isoformat(), "value": value, "direction": direction,
+                 "baseline": round(state["base_mean"], 4)}
+            ])[-MAX_CHANGE_POINTS:]
+            state["cusum_pos"] = state["cusum_neg"] = 0.0
+            state["base_n"], state["base_mean"], state["base_m2"] = 0, 0.0, 0.0
+
+    state["n"], state["mean"], state["m2"] = _welford(state["n"], state["mean"], state["m2"], value)
+    state["base_n"], state["base_mean"], state["base_m2"] = _welford(
+        state["base_n"], state["base_mean"], state["base_m2"], value)
+
+    t = _days_between(state["first_at"], at)
+    state["sum_t"] += t
+    state["sum_v"] += value
+    state["sum_tt"] += t * t
+    state["sum_tv"] += t * value
+
+    state["ewma"] = value if state["ewma"] is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * state["ewma"]
+    state["last_at"] = at.isoformat()
+    state["recent"] = (state["recent"] + [[at.isoformat(), value]])[-WINDOW:]
+    return state
+
+
+def _welford(n: int, mean: float, m2: float, value: float) -> tuple:
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    return n, mean, m2 + delta * (value - mean)
+
+
+def slope_per_day(state: dict):
+    n = state["n"]
+    if n < 2 or _days_between(state["first_at"], datetime.fromisoformat(state["last_at"])) < MIN_SPAN_DAYS:
+        return None
+    denominator = n * state["sum_tt"] - state["sum_t"] ** 2
+    if denominator <= 1e-12:
+        return None
+    return (n * state["sum_tv"] - state["sum_t"] * state["sum_v"]) / denominator
+
+
+def summarize(state: dict) -> dict:
+    recent = state["recent"]
+    sma_values = [v for _, v in recent[-SMA_POINTS:]]
+    slope = slope_per_day(state)
+    window_start = recent[0][0] if recent else None
+    return {
+        "count": state["n"],
+        "points": [{"at": at, "value": v} for at, v in recent],
+        "latest": recent[-1][1] if recent else None,
+        "moving_average": sum(sma_values) / len(sma_values) if sma_values else None,
+        "ewma": state["ewma"],
+        "mean": state["mean"] if state["n"] else None,
+        "stdev": math.sqrt(state["m2"] / (state["n"] - 1)) if state["n"] > 1 else None,
+        "slope_per_30_days": slope * 30 if slope is not None else None,
+        "change_points": state["change_points"],
+        # a shift detected within the returned window
+        "change_flag": bool(window_start and any(cp["at"] >= window_start for cp in state["change_points"])),
+    }
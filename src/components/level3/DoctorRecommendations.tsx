@@ -2,7 +2,7 @@
 import { useEffect, useState } from "react";
 import { Stethoscope, Star, Phone } from "lucide-react";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
-import { buildApiUrl } from "@/lib/api";
+import { buildApiUrl, locationQuery } from "@/lib/api";
 import { Button } from "@/components/ui/button";
 
 interface Doctor {
@@ -19,7 +19,7 @@ const DoctorRecommendations = () => {
     useEffect(() => {
         const fetchDoctors = async () => {
             try {
-                const res = await fetch(buildApiUrl("/api/level3/find_doctors"));
+                const res = await fetch(buildApiUrl(`/api/level3/find_doctors${await locationQuery()}`));
                 if (res.ok) {
                     const data = await res.json();
                     setDoctors(data);
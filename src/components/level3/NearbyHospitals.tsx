@@ -2,7 +2,7 @@
 import { useEffect, useState } from "react";
 import { MapPin, Navigation, Phone } from "lucide-react";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
-import { buildApiUrl } from "@/lib/api";
+import { buildApiUrl, locationQuery } from "@/lib/api";
 import { Button } from "@/components/ui/button";
 
 interface Hospital {
@@ -19,7 +19,7 @@ const NearbyHospitals = () => {
     useEffect(() => {
         const fetchHospitals = async () => {
             try {
-                const res = await fetch(buildApiUrl("/api/level3/find_hospitals"));
+                const res = await fetch(buildApiUrl(`/api/level3/find_hospitals${await locationQuery()}`));
                 if (res.ok) {
                     const data = await res.json();
                     setHospitals(data);
@@ -3,4 +3,17 @@ export const API_BASE_URL: string = "";
 export const buildApiUrl = (path: string): string => {
   const normalizedPath = path.startsWith("/") ? path : `/${path}`;
   return `${API_BASE_URL}${normalizedPath}`;
-};
\ No newline at end of file
+};
+// "?lat=..&lon=.." for the browser's position, or "" when it is unavailable or denied
+export const locationQuery = (timeoutMs = 5000): Promise<string> =>
+  new Promise((resolve) => {
+    if (typeof navigator === "undefined" || !navigator.geolocation) {
+      resolve("");
+      return;
+    }
+    navigator.geolocation.getCurrentPosition(
+      (pos) => resolve(`?lat=${pos.coords.latitude.toFixed(5)}&lon=${pos.coords.longitude.toFixed(5)}`),
+      () => resolve(""),
+      { timeout: timeoutMs, maximumAge: 600000 }
+    );
+  });